@@ -0,0 +1,192 @@
+"""
+Shared helpers for the benchmark scripts in this directory.
+
+The scripts are run directly (``python benchmarks/<name>.py``) from the
+project root and use the database configured in settings, so run
+``python manage.py migrate`` first.
+"""
+
+import asyncio
+import contextlib
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+
+def setup_django():
+    sys.path.insert(0, str(BASE_DIR))
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "glucosnap_project.settings")
+    import django
+
+    django.setup()
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies, elapsed, errors=0):
+    latencies = sorted(latencies)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+    }
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@contextlib.contextmanager
+def serve(args, port, env=None, timeout=30):
+    """Start a server subprocess and wait until it accepts connections."""
+    process = subprocess.Popen(
+        args,
+        cwd=BASE_DIR,
+        env={**os.environ, **(env or {})},
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        deadline = time.monotonic() + timeout
+        while True:
+            if process.poll() is not None:
+                raise RuntimeError(f"{args[0]} exited with code {process.returncode}")
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=1).close()
+                break
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"{args[0]} did not start listening on {port}")
+                time.sleep(0.1)
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+async def fake_openai(scope, receive, send):
+    """
+    ASGI app that answers like chat/completions after FAKE_OPENAI_DELAY
+    seconds. Serve it with ``uvicorn _common:fake_openai --app-dir benchmarks``
+    and point OPENAI_API_BASE at it.
+    """
+    if scope["type"] != "http":
+        return
+    while (await receive()).get("more_body"):
+        pass
+    await asyncio.sleep(float(os.environ.get("FAKE_OPENAI_DELAY", "0")))
+    content = json.dumps({"description": "Pasta", "calories": 600, "carbs": 80, "components": []})
+    body = json.dumps({"choices": [{"message": {"content": content}}]}).encode()
+    await send({"type": "http.response.start", "status": 200,
+                "headers": [(b"content-type", b"application/json")]})
+    await send({"type": "http.response.body", "body": body})
+
+
+def fake_openai_command(port):
+    return ["uvicorn", "_common:fake_openai", "--app-dir", str(BASE_DIR / "benchmarks"),
+            "--port", str(port), "--log-level", "warning"]
+
+
+def jpeg_bytes(size=(640, 480)):
+    import io
+
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new("RGB", size, "orange").save(buffer, "JPEG")
+    return buffer.getvalue()
+
+
+def reset_user_data(user, readings=120, meals=90):
+    """Replace ``user``'s readings and meals with a fixed synthetic month."""
+    from datetime import timedelta
+
+    from django.utils import timezone
+
+    from glucose_tracker.models import GlucoseReading, Meal
+
+    GlucoseReading.objects.filter(user=user).delete()
+    Meal.objects.filter(user=user).delete()
+    now = timezone.now()
+    GlucoseReading.objects.bulk_create(
+        GlucoseReading(user=user, timestamp=now - timedelta(hours=6 * i),
+                       glucose_level=90 + (i * 37) % 120, measurement_type="fasting")
+        for i in range(readings)
+    )
+    Meal.objects.bulk_create(
+        Meal(user=user, timestamp=now - timedelta(hours=8 * i), meal_type="lunch",
+             description="Pasta", photo="meals/bench.jpg")
+        for i in range(meals)
+    )
+
+
+def session_cookies(username="bench"):
+    """Return cookies for a logged-in session of ``username``, creating the user."""
+    from django.conf import settings
+    from django.contrib.auth.models import User
+    from django.test import Client
+
+    user, _ = User.objects.get_or_create(username=username)
+    client = Client()
+    client.force_login(user)
+    return user, {settings.SESSION_COOKIE_NAME: client.cookies[settings.SESSION_COOKIE_NAME].value}
+
+
+async def run_load(send, concurrency, total):
+    """
+    Call ``await send(i)`` ``total`` times with at most ``concurrency`` in flight.
+    ``send`` returns True on success. Returns (latencies, elapsed, errors).
+    """
+    latencies = []
+    errors = 0
+    counter = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            start = time.perf_counter()
+            try:
+                ok = await send(i)
+            except Exception:
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - start)
+            else:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, time.perf_counter() - start, errors
+
+
+def print_table(rows, columns):
+    widths = [max(len(str(c)), *(len(_fmt(r.get(c))) for r in rows)) for c in columns]
+    print("  ".join(str(c).rjust(w) for c, w in zip(columns, widths)))
+    for row in rows:
+        print("  ".join(_fmt(row.get(c)).rjust(w) for c, w in zip(columns, widths)))
+
+
+def _fmt(value):
+    if isinstance(value, float):
+        return f"{value:.1f}"
+    return "-" if value is None else str(value)
@@ -0,0 +1,134 @@
+"""
+Cost of the glucose alert rules per reading, alone and under batch ingest.
+
+    python benchmarks/alert_rules.py
+    python benchmarks/alert_rules.py --readings 50000 --batch-sizes 1,100,5000
+
+A CGM-like series of ``--readings`` 5-minute readings (a random walk with
+meal peaks and the occasional low) is checked:
+
+- rules: ``Rules.check`` alone on the in-memory state, no database;
+- requery: what the rules would cost if each reading re-read the history
+  they need (the previous reading and the current high streak);
+- ingest_N: readings inserted with bulk_create in batches of N, then
+  ``process_readings`` on each batch; reported per reading, excluding the
+  insert itself. N=1 is what a signal pays on every saved reading.
+"""
+
+import argparse
+import logging
+import time
+from datetime import timedelta
+
+from _common import print_table, setup_django
+
+USERNAME = "alert_bench"
+
+
+def synthetic_levels(count, seed=43):
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    steps = rng.normal(0, 3, count)
+    meals = np.zeros(count)
+    meals[rng.choice(count, count // 60, replace=False)] = rng.uniform(40, 120, count // 60)
+    kernel = np.exp(-((np.arange(36) - 10) ** 2) / 40)
+    curve = 110 + np.cumsum(steps) * 0.2 + np.convolve(meals, kernel)[:count]
+    return np.clip(curve, 40, 400).astype(int).tolist()
+
+
+def reset(user):
+    from glucose_tracker.models import AlertState, GlucoseAlert, GlucoseReading
+
+    GlucoseAlert.objects.filter(user=user).delete()
+    AlertState.objects.filter(user=user).delete()
+    GlucoseReading.objects.filter(user=user)._raw_delete(GlucoseReading.objects.db)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--readings", type=int, default=20000)
+    parser.add_argument("--batch-sizes", default="1,10,100,1000")
+    args = parser.parse_args()
+
+    setup_django()
+    from django.contrib.auth.models import User
+    from django.db import connection, reset_queries
+    from django.test.utils import CaptureQueriesContext, override_settings
+    from django.utils import timezone
+
+    from glucose_tracker.models import AlertState, GlucoseReading, UserProfile
+    from glucose_tracker.utils.alerts import Rules, logger, process_readings
+
+    # The default notifier still formats every alert, without printing it
+    logger.addHandler(logging.NullHandler())
+    logger.propagate = False
+
+    user, _created = User.objects.get_or_create(username=USERNAME)
+    UserProfile.objects.get_or_create(user=user)
+    levels = synthetic_levels(args.readings)
+    start = timezone.now() - timedelta(minutes=5 * args.readings)
+    times = [start + timedelta(minutes=5 * i) for i in range(args.readings)]
+    results = []
+
+    rules = Rules(70, 180)
+    state = AlertState(user=user)
+    fired = 0
+    began = time.perf_counter()
+    for timestamp, level in zip(times, levels):
+        fired += len(rules.check(state, timestamp, level, "night"))
+    elapsed = time.perf_counter() - began
+    results.append({"method": "rules", "alerts": fired, "queries": 0, "us_per_reading": elapsed / len(levels) * 1e6})
+
+    # The same rules, re-reading the history on each reading
+    reset(user)
+    GlucoseReading.objects.bulk_create(
+        GlucoseReading(user=user, timestamp=t, glucose_level=level, measurement_type="night")
+        for t, level in zip(times, levels)
+    )
+    sample = range(0, len(levels), max(1, len(levels) // 2000))
+    with CaptureQueriesContext(connection) as queries:
+        began = time.perf_counter()
+        for i in sample:
+            history = GlucoseReading.objects.filter(user=user, timestamp__lt=times[i])
+            history.order_by("-timestamp").values_list("timestamp", "glucose_level").first()
+            last_in_range = history.filter(glucose_level__lte=180).order_by("-timestamp").values("timestamp")[:1]
+            history.filter(timestamp__gt=last_in_range).order_by("timestamp").values_list("timestamp").first()
+        elapsed = time.perf_counter() - began
+    results.append({
+        "method": "requery",
+        "alerts": "",
+        "queries": len(queries) // len(sample),
+        "us_per_reading": elapsed / len(sample) * 1e6,
+    })
+
+    with override_settings(ALERT_NOTIFIER="glucose_tracker.utils.alerts.LogNotifier", ALERT_MAX_AGE_MINUTES=10**7):
+        for size in (int(value) for value in args.batch_sizes.split(",")):
+            reset(user)
+            count = min(len(levels), size * 200)
+            elapsed, fired, query_count = 0.0, 0, 0
+            for offset in range(0, count, size):
+                batch = GlucoseReading.objects.bulk_create(
+                    GlucoseReading(user=user, timestamp=times[i], glucose_level=levels[i], measurement_type="night")
+                    for i in range(offset, min(offset + size, count))
+                )
+                reset_queries()  # the query log keeps at most 9000 entries
+                with CaptureQueriesContext(connection) as queries:
+                    began = time.perf_counter()
+                    fired += len(process_readings(user.id, batch))
+                    elapsed += time.perf_counter() - began
+                query_count += len(queries)
+            results.append({
+                "method": f"ingest_{size}",
+                "alerts": fired,
+                "queries": round(query_count / (count / size), 1),
+                "us_per_reading": elapsed / count * 1e6,
+            })
+    reset(user)
+
+    print(f"{connection.vendor}: {args.readings:,} readings")
+    print_table(results, ["method", "alerts", "queries", "us_per_reading"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Load test of the async dashboard/add_meal views under uvicorn (ASGI)
+versus gunicorn (WSGI) while the AI upstream is slow.
+
+    pip install gunicorn uvicorn
+    python manage.py migrate
+    python benchmarks/async_load.py --delay 2 --concurrency 64 --requests 256
+
+A fake OpenAI endpoint that answers after ``--delay`` seconds is started
+locally and the app is pointed at it through ``OPENAI_API_BASE``. Both
+servers get the same number of worker processes; gunicorn uses the gthread
+worker with ``--threads`` threads each, which bounds how many AI calls it
+can wait on at once.
+
+The dashboard's queries are not run concurrently: Django's async ORM sends
+every query to one shared sync thread, so they would queue there however
+they were awaited. The view makes all of them in a single ``sync_to_async``
+call instead, and what ASGI gains on it is that waiting on the database
+never holds the event loop.
+"""
+
+import argparse
+import asyncio
+
+from _common import (
+    fake_openai_command, free_port, jpeg_bytes, print_table, run_load, serve, session_cookies,
+    setup_django, summarize,
+)
+
+
+async def drive(base_url, cookies, view, concurrency, total):
+    import httpx
+
+    photo = jpeg_bytes()
+    async with httpx.AsyncClient(base_url=base_url, cookies=cookies, timeout=120) as client:
+        await client.get("/add-meal/")  # sets the csrftoken cookie
+        csrf = client.cookies.get("csrftoken", "")
+
+        async def send(i):
+            if view == "dashboard":
+                response = await client.get("/")
+                return response.status_code == 200
+            response = await client.post(
+                "/add-meal/",
+                headers={"X-CSRFToken": csrf},
+                data={"meal_type": "lunch", "timestamp": "2025-01-01T12:00"},
+                files={"photo": ("meal.jpg", photo, "image/jpeg")},
+            )
+            return response.status_code == 302
+
+        return await run_load(send, concurrency, total)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--delay", type=float, default=2.0, help="AI upstream delay (s)")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--requests", type=int, default=256)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=8, help="gunicorn threads per worker")
+    args = parser.parse_args()
+
+    setup_django()
+    from glucose_tracker.models import Meal
+
+    user, cookies = session_cookies()
+
+    upstream_port = free_port()
+    env = {"OPENAI_API_KEY": "bench", "OPENAI_API_BASE": f"http://127.0.0.1:{upstream_port}/v1"}
+
+    servers = {
+        "wsgi (gunicorn gthread)": lambda port: [
+            "gunicorn", "glucosnap_project.wsgi", "-b", f"127.0.0.1:{port}",
+            "-w", str(args.workers), "-k", "gthread", "--threads", str(args.threads),
+        ],
+        "asgi (uvicorn)": lambda port: [
+            "uvicorn", "glucosnap_project.asgi:application", "--port", str(port),
+            "--workers", str(args.workers), "--log-level", "warning",
+        ],
+    }
+
+    rows = []
+    with serve(fake_openai_command(upstream_port), upstream_port,
+               env={"FAKE_OPENAI_DELAY": str(args.delay)}):
+        for name, command in servers.items():
+            port = free_port()
+            with serve(command(port), port, env=env) as base_url:
+                for view in ("dashboard", "add_meal"):
+                    result = asyncio.run(
+                        drive(base_url, cookies, view, args.concurrency, args.requests)
+                    )
+                    rows.append({"server": name, "view": view, **summarize(*result)})
+
+    Meal.objects.filter(user=user).delete()
+    print(f"AI upstream delay {args.delay}s, concurrency {args.concurrency}, "
+          f"{args.workers} workers")
+    print_table(rows, ["server", "view", "requests", "errors", "rps", "p50_ms", "p99_ms"])
+
+
+if __name__ == "__main__":
+    main()
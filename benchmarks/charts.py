@@ -0,0 +1,96 @@
+"""
+Server-side SVG chart cost: rendering time and size by period length, and
+the dashboard with and without the chart cache.
+
+    python benchmarks/charts.py
+    python benchmarks/charts.py --days 730 --periods 7,90,730
+
+A synthetic user with ``--days`` of 5-minute readings is generated with the
+seed_synthetic command. For each period the readings are fetched once and
+the trend, AGP and time-in-range charts are rendered from the arrays
+(best of ``--repeat``). The dashboard is then requested cold (the data
+version just bumped, so its charts are rebuilt) and warm (served from the
+cache).
+"""
+
+import argparse
+import time
+from datetime import timedelta
+
+from _common import print_table, setup_django
+
+USERNAME = "charts_bench_0"
+
+
+def best(run, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = run()
+        times.append(time.perf_counter() - start)
+    return min(times) * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--periods", default="7,14,90,365")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.contrib.auth.models import User
+    from django.core.management import call_command
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import CaptureQueriesContext, override_settings
+    from django.utils import timezone
+
+    from glucose_tracker.utils import charts
+
+    call_command("seed_synthetic", users=1, days=args.days, seed=47, prefix="charts_bench_", replace=True)
+    user = User.objects.get(username=USERNAME)
+    now = timezone.now()
+
+    results = []
+    for days in (int(value) for value in args.periods.split(",")):
+        fetch_ms, (times, levels) = best(lambda: charts.fetch_series(user.id, now - timedelta(days=days)), args.repeat)
+        end = int(now.timestamp())
+        row = {"period": f"{days}d", "readings": len(times), "fetch_ms": fetch_ms}
+        for name, render in [
+            ("trend", lambda: charts.trend_svg(times, levels, end - days * 86400, end)),
+            ("agp", lambda: charts.agp_svg(times, levels)),
+            ("tir", lambda: charts.tir_svg(levels)),
+        ]:
+            row[f"{name}_ms"], svg = best(render, args.repeat)
+            row[f"{name}_bytes"] = len(svg or "")
+        results.append(row)
+    print(f"{connection.vendor}: {args.days} days of readings")
+    columns = ["period", "readings", "fetch_ms"]
+    columns += [f"{name}_{unit}" for name in ("trend", "agp", "tir") for unit in ("ms", "bytes")]
+    print_table(results, columns)
+
+    requests = []
+    with override_settings(ALLOWED_HOSTS=["testserver"]):
+        client = Client()
+        client.force_login(user)
+        for state in ("cold", "warm"):
+            timings = []
+            for _ in range(args.repeat):
+                if state == "cold":
+                    charts.bump_version(user.id)
+                with CaptureQueriesContext(connection) as queries:
+                    start = time.perf_counter()
+                    response = client.get("/")
+                    timings.append(time.perf_counter() - start)
+                assert response.status_code == 200
+            requests.append({
+                "dashboard": state, "queries": len(queries), "best_ms": min(timings) * 1000,
+                "html_bytes": len(response.content),
+            })
+    print()
+    print_table(requests, ["dashboard", "queries", "best_ms", "html_bytes"])
+
+
+if __name__ == "__main__":
+    main()
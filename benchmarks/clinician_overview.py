@@ -0,0 +1,123 @@
+"""
+Clinician overview cost against the number of assigned patients.
+
+    python benchmarks/clinician_overview.py
+    python benchmarks/clinician_overview.py --patients 10,100,500 --days 30
+
+``--patients`` synthetic users (the largest count given) with ``--days`` of
+readings every ``--interval`` minutes are generated with the seed_synthetic
+command, and a staff user is assigned the first N of them for each count.
+The overview view is requested for its first and its last page (50 patients
+each, keyset by username); both must run the same queries whatever N is.
+For comparison, ``per_patient`` computes the same page the way the per-user
+dashboard code would, with a handful of queries for each patient.
+"""
+
+import argparse
+import time
+from datetime import timedelta
+
+from _common import print_table, setup_django
+
+PREFIX = "overview_bench_"
+CLINICIAN = "overview_clinician"
+
+
+def best(run, repeat):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    times = []
+    for _ in range(repeat):
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            run()
+            times.append(time.perf_counter() - start)
+    return min(times) * 1000, len(queries)
+
+
+def per_patient(clinician, limit):
+    """The first page with one set of queries per patient."""
+    from django.contrib.auth.models import User
+    from django.db.models import Avg, Count
+    from django.utils import timezone
+
+    from glucose_tracker.models import GlucoseReading, Meal, UserProfile
+
+    since = timezone.now() - timedelta(days=14)
+    rows = []
+    for patient in User.objects.filter(care_team__clinician=clinician).order_by("username")[:limit]:
+        profile = UserProfile.objects.filter(user=patient).first()
+        recent = GlucoseReading.objects.filter(user=patient, timestamp__gte=since)
+        stats = recent.aggregate(average=Avg("glucose_level"), readings=Count("id"))
+        in_range = recent.filter(
+            glucose_level__gte=profile.target_glucose_min, glucose_level__lte=profile.target_glucose_max
+        ).count()
+        last = GlucoseReading.objects.filter(user=patient).order_by("-timestamp").first()
+        meal = Meal.objects.filter(user=patient).order_by("-created_at").first()
+        rows.append((patient, stats, in_range, last, meal))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--patients", default="10,100,400")
+    parser.add_argument("--days", type=int, default=14)
+    parser.add_argument("--interval", type=int, default=15)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.contrib.auth.models import User
+    from django.core.management import call_command
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import override_settings
+
+    from glucose_tracker.models import CareAssignment
+    from glucose_tracker.utils.overview import OVERVIEW_PAGE_SIZE, patient_overview
+
+    counts = [int(value) for value in args.patients.split(",")]
+    call_command(
+        "seed_synthetic", users=max(counts), days=args.days, interval=args.interval, seed=50,
+        prefix=PREFIX, replace=True,
+    )
+    clinician, _ = User.objects.update_or_create(username=CLINICIAN, defaults={"is_staff": True})
+    patients = list(User.objects.filter(username__startswith=PREFIX).order_by("username"))
+
+    results = []
+    with override_settings(ALLOWED_HOSTS=["testserver"]):
+        client = Client()
+        client.force_login(clinician)
+        for count in counts:
+            CareAssignment.objects.filter(clinician=clinician).delete()
+            CareAssignment.objects.bulk_create(
+                CareAssignment(clinician=clinician, patient=patient) for patient in patients[:count]
+            )
+            # The last page starts after the last patient of the page before it
+            last_start = (count - 1) // OVERVIEW_PAGE_SIZE * OVERVIEW_PAGE_SIZE
+            after = patients[last_start - 1].username if last_start else ""
+            first_ms, first_queries = best(lambda: client.get("/clinician/"), args.repeat)
+            last_ms, last_queries = best(lambda: client.get("/clinician/", {"after": after}), args.repeat)
+            query_ms, _ = best(lambda: patient_overview(clinician), args.repeat)
+            naive_ms, naive_queries = best(lambda: per_patient(clinician, OVERVIEW_PAGE_SIZE), args.repeat)
+            results.append({
+                "patients": count,
+                "queries": first_queries,
+                "first_page_ms": first_ms,
+                "last_page_queries": last_queries,
+                "last_page_ms": last_ms,
+                "query_ms": query_ms,
+                "per_patient_queries": naive_queries,
+                "per_patient_ms": naive_ms,
+            })
+    CareAssignment.objects.filter(clinician=clinician).delete()
+    print(f"{connection.vendor}: {args.days} days of readings every {args.interval} minutes")
+    print_table(results, [
+        "patients", "queries", "first_page_ms", "last_page_queries", "last_page_ms", "query_ms",
+        "per_patient_queries", "per_patient_ms",
+    ])
+
+
+if __name__ == "__main__":
+    main()
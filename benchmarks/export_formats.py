@@ -0,0 +1,99 @@
+"""
+Size, export time and load time of the CSV export against the columnar
+Parquet and Arrow IPC exports.
+
+    python benchmarks/export_formats.py --days 365
+    python benchmarks/export_formats.py --days 730 --repeat 5
+
+A synthetic user with ``--days`` of 5-minute readings is generated with the
+seed_synthetic command. Export time is measured through the view with the
+test client; load time is what an analyst pays to get typed columns back:
+parsing the CSV readings section and its date/time text into Python values,
+versus ``pyarrow.parquet.read_table`` / ``pyarrow.ipc.open_stream``.
+"""
+
+import argparse
+import csv
+import io
+import time
+from datetime import datetime
+
+from _common import print_table, setup_django
+
+USERNAME = "export_bench_0"
+
+
+def load_csv(data):
+    """Parse the readings section of the CSV export into typed values."""
+    rows = []
+    reader = csv.reader(io.StringIO(data.decode()))
+    next(reader)  # section title
+    next(reader)  # header
+    for row in reader:
+        if not row:
+            break
+        rows.append((datetime.fromisoformat(f"{row[0]} {row[1]}"), int(row[2]), row[3], row[4]))
+    return len(rows)
+
+
+def load_parquet(data):
+    import pyarrow.parquet as pq
+
+    return pq.read_table(io.BytesIO(data)).num_rows
+
+
+def load_arrow(data):
+    import pyarrow as pa
+
+    return pa.ipc.open_stream(data).read_all().num_rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per format; the best is reported.")
+    args = parser.parse_args()
+
+    setup_django()
+    from django.contrib.auth.models import User
+    from django.core.management import call_command
+    from django.test import Client
+    from django.test.utils import override_settings
+
+    call_command("seed_synthetic", users=1, days=args.days, seed=36, prefix="export_bench_", replace=True)
+    client = Client(HTTP_HOST="localhost")
+    client.force_login(User.objects.get(username=USERNAME))
+
+    formats = [
+        ("csv", "?format=csv", load_csv),
+        ("parquet", "?format=parquet&table=readings", load_parquet),
+        ("arrow", "?format=arrow&table=readings", load_arrow),
+    ]
+    results = []
+    with override_settings(ALLOWED_HOSTS=["localhost"]):
+        for name, query, load in formats:
+            export_times, load_times = [], []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                response = client.get("/export/" + query)
+                data = b"".join(response.streaming_content) if response.streaming else response.content
+                export_times.append(time.perf_counter() - start)
+
+                start = time.perf_counter()
+                rows = load(data)
+                load_times.append(time.perf_counter() - start)
+            results.append(
+                {
+                    "format": name,
+                    "rows": rows,
+                    "size_kb": len(data) / 1024,
+                    "export_ms": min(export_times) * 1000,
+                    "load_ms": min(load_times) * 1000,
+                }
+            )
+
+    print_table(results, ["format", "rows", "size_kb", "export_ms", "load_ms"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Latency of the local food table lookups that run before the vision API.
+
+    python benchmarks/food_lookup.py
+    python benchmarks/food_lookup.py --repeat 100000
+
+Reports the one-off index build (per process, on first use) and the
+per-call cost of a fuzzy match, a prefix suggestion and a full estimate of
+typed dishes, exact and misspelled, single and multi-component.
+"""
+
+import argparse
+import time
+
+from _common import percentile, print_table, setup_django
+
+DISHES = [
+    "pizza margherita",
+    "Pizza Margarita",
+    "spagheti carbonara",
+    "cornetto e cappuccino",
+    "160 g pasta, insalata mista, 1 birra",
+    "something not in the table",
+]
+
+
+def time_calls(call, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        call()
+        times.append(time.perf_counter() - start)
+    return sorted(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=20000)
+    args = parser.parse_args()
+
+    setup_django()
+    from glucose_tracker.utils.food_index import FoodIndex
+
+    start = time.perf_counter()
+    index = FoodIndex.from_csv()
+    build_ms = (time.perf_counter() - start) * 1000
+    print(f"Index of {len(index.foods)} foods, {len(index.names)} names, {len(index.postings)} trigrams built in {build_ms:.1f} ms")
+
+    results = []
+    for dish in DISHES:
+        for operation, call in [
+            ("match", lambda: index.match(dish)),
+            ("suggest", lambda: index.suggest(dish[:3])),
+            ("estimate", lambda: index.estimate(dish, "it", 0.5)),
+        ]:
+            times = time_calls(call, args.repeat)
+            results.append(
+                {
+                    "input": dish,
+                    "operation": operation,
+                    "p50_us": percentile(times, 50) * 1e6,
+                    "p99_us": percentile(times, 99) * 1e6,
+                }
+            )
+    print_table(results, ["input", "operation", "p50_us", "p99_us"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+Full-text search against a LIKE scan, on a large meal table.
+
+    python benchmarks/meal_search.py                      # 1M meals, 1000 users
+    python benchmarks/meal_search.py --meals 200000 --users 200 --repeat 20
+
+Meals with random Italian/English dish descriptions are inserted for
+``--users`` users (``search_bench_*``, replaced on each run; pass
+``--keep`` to reuse them). For each query the first page for one user is
+timed through ``glucose_tracker.utils.search`` and through the
+``icontains`` filter the app would otherwise need, which must scan every
+row of the user, or the whole table without a usable (user, ...) index.
+Insert throughput with the index triggers in place is reported too.
+"""
+
+import argparse
+import random
+import time
+from datetime import timedelta
+
+from _common import percentile, print_table, setup_django
+
+PREFIX = "search_bench_"
+DISHES = [
+    "pizza margherita", "pizza diavola", "pasta al pomodoro", "spaghetti carbonara",
+    "lasagne", "risotto ai funghi", "insalata mista", "minestrone", "pollo arrosto",
+    "salmone alla griglia", "grilled chicken salad", "cheeseburger", "fries",
+    "oatmeal with berries", "greek yogurt", "toast with jam", "cappuccino e cornetto",
+    "biscotti", "gelato al cioccolato", "apple pie", "banana", "rice and beans",
+    "sushi", "ramen", "tacos", "panino al prosciutto", "frittata di zucchine",
+]
+NOTES = ["", "", "", "mangiato fuori", "porzione abbondante", "half portion", "shared with friends", "dopo palestra"]
+# A tenth of the meals name one of many restaurants: real vocabularies have
+# a long tail of rare words, where the index beats a scan the most.
+RESTAURANTS = 500
+QUERIES = ["pizza", "pizze", "funghi", "chicken salad", "gelato cioccolato", "sushi", "osteria 242"]
+
+
+def insert_meals(users, count, batch_size, rng):
+    from django.db import connection, transaction
+    from django.utils import timezone
+
+    from glucose_tracker.models import Meal
+
+    table = Meal._meta.db_table
+    sql = (
+        f"INSERT INTO {table} (user_id, timestamp, meal_type, description, photo, "
+        f"manual_notes, updated_at) VALUES (%s, %s, %s, %s, %s, %s, %s)"
+    )
+    now = timezone.now()
+    adapt = connection.ops.adapt_datetimefield_value
+    stamp = adapt(now)
+    meal_types = ["breakfast", "lunch", "dinner", "snack"]
+    start = time.perf_counter()
+    for offset in range(0, count, batch_size):
+        rows = []
+        for i in range(offset, min(offset + batch_size, count)):
+            description = " ".join(rng.sample(DISHES, rng.randint(1, 3)))
+            notes = rng.choice(NOTES)
+            if rng.random() < 0.1:
+                notes = f"osteria {rng.randrange(RESTAURANTS)}"
+            rows.append((
+                users[i % len(users)], adapt(now - timedelta(minutes=i)), rng.choice(meal_types),
+                description, "meals/synthetic/placeholder.jpg", notes, stamp,
+            ))
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.executemany(sql, rows)
+    return time.perf_counter() - start
+
+
+def time_calls(call, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        call()
+        times.append(time.perf_counter() - start)
+    return sorted(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--meals", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--batch-size", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=10, help="Timed runs per query and method.")
+    parser.add_argument("--keep", action="store_true", help="Reuse the meals of a previous run.")
+    args = parser.parse_args()
+
+    setup_django()
+    from django.contrib.auth.models import User
+    from django.db import connection
+    from django.db.models import Q
+
+    from glucose_tracker.models import Meal
+    from glucose_tracker.utils import search
+
+    rng = random.Random(39)
+    existing = User.objects.filter(username__startswith=PREFIX)
+    if not args.keep or not existing.exists():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {Meal._meta.db_table} WHERE user_id IN "
+                f"(SELECT id FROM auth_user WHERE username LIKE %s)",
+                [PREFIX + "%"],
+            )
+        existing.delete()
+        User.objects.bulk_create(User(username=f"{PREFIX}{i}") for i in range(args.users))
+        users = list(User.objects.filter(username__startswith=PREFIX).values_list("id", flat=True))
+        elapsed = insert_meals(users, args.meals, args.batch_size, rng)
+        print(f"Inserted {args.meals} meals in {elapsed:.1f}s ({args.meals / elapsed:,.0f} rows/s, index triggers included)")
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute(f"ANALYZE {Meal._meta.db_table}")
+
+    user = User.objects.filter(username__startswith=PREFIX).first()
+    print(f"{connection.vendor}: {Meal.objects.count():,} meals in total, {Meal.objects.filter(user=user).count():,} for the searched user")
+
+    def like(query):
+        queryset = Meal.objects.filter(user=user)
+        for word in query.split():
+            queryset = queryset.filter(Q(description__icontains=word) | Q(manual_notes__icontains=word))
+        return list(queryset.order_by("-timestamp")[:20])
+
+    def like_all_users(query):
+        queryset = Meal.objects.all()
+        for word in query.split():
+            queryset = queryset.filter(Q(description__icontains=word) | Q(manual_notes__icontains=word))
+        return queryset.count()
+
+    results = []
+    for query in QUERIES:
+        hits, cursor = search.search(user, "meals", query, "it")
+        for method, call in [
+            ("fts", lambda: search.search(user, "meals", query, "it")),
+            ("fts_page2", lambda: search.search(user, "meals", query, "it", cursor=cursor)),
+            ("like_user", lambda: like(query)),
+            ("like_table", lambda: like_all_users(query)),
+        ]:
+            if method == "fts_page2" and not cursor:
+                continue
+            times = time_calls(call, args.repeat if method != "like_table" else max(1, args.repeat // 5))
+            results.append(
+                {
+                    "query": query,
+                    "method": method,
+                    "hits": len(hits),
+                    "p50_ms": percentile(times, 50) * 1000,
+                    "p95_ms": percentile(times, 95) * 1000,
+                }
+            )
+
+    print_table(results, ["query", "method", "hits", "p50_ms", "p95_ms"])
+
+
+if __name__ == "__main__":
+    main()
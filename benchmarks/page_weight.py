@@ -0,0 +1,104 @@
+"""
+Page-weight comparison between the old CDN-hosted assets and the vendored,
+fingerprinted and precompressed pipeline.
+
+Run after ``DEBUG=False python manage.py collectstatic``:
+
+    DEBUG=False python benchmarks/page_weight.py
+
+For every asset referenced by ``base.html`` it fetches the
+file through the full middleware stack (so through WhiteNoise) with
+``Accept-Encoding: br, gzip`` and reports the encoding, bytes on the wire and
+Cache-Control that a browser would see. It then sums the render-blocking
+bytes and the number of extra origins per page, before and after.
+
+First paint itself needs a real browser (e.g. ``lighthouse --preset=desktop``);
+what this script measures are its two inputs we control: blocking bytes in
+``<head>`` and third-party connections (DNS + TCP + TLS, ~100-300 ms each on
+mobile networks, and infinite when the clinic is offline).
+"""
+
+import sys
+from pathlib import Path
+
+from _common import setup_django
+
+setup_django()
+
+from django.conf import settings  # noqa: E402
+from django.contrib.staticfiles.storage import staticfiles_storage  # noqa: E402
+from django.test import Client  # noqa: E402
+
+# (static path, loaded in <head>, pages that load it)
+ASSETS = [
+    ("vendor/bootstrap/css/bootstrap.min.css", True, "all"),
+    ("vendor/bootstrap-icons/bootstrap-icons.min.css", True, "all"),
+    ("vendor/bootstrap-icons/fonts/bootstrap-icons.woff2", False, "all"),
+    ("vendor/bootstrap/js/bootstrap.bundle.min.js", False, "all"),
+]
+
+# chart.umd.min.js as it was served (brotli) until the dashboard charts
+# became server-rendered SVG and Chart.js was dropped
+CHARTJS_WIRE = 60093
+
+# Before: every page loaded all of the above from cdn.jsdelivr.net, and
+# chart.js (unpinned, so only cacheable for a short time) sat in <head>.
+CDN_ORIGINS = 1
+
+
+def fetch(client, path):
+    url = staticfiles_storage.url(path)
+    response = client.get(url, HTTP_ACCEPT_ENCODING="br, gzip")
+    body = b"".join(response.streaming_content) if response.streaming else response.content
+    return {
+        "url": url,
+        "status": response.status_code,
+        "encoding": response.get("Content-Encoding", "identity"),
+        "wire": len(body),
+        "cache": response.get("Cache-Control", "-"),
+    }
+
+
+def raw_size(path):
+    for finder_dir in settings.STATICFILES_DIRS:
+        candidate = Path(finder_dir) / path
+        if candidate.exists():
+            return candidate.stat().st_size
+    return 0
+
+
+def main():
+    if settings.DEBUG:
+        sys.exit("Run with DEBUG=False after collectstatic so hashed files are served.")
+
+    client = Client()
+    rows = []
+    print(f"{'asset':<48} {'raw':>8} {'wire':>8} {'enc':>8}  cache-control")
+    for path, in_head, pages in ASSETS:
+        result = fetch(client, path)
+        raw = raw_size(path)
+        rows.append((path, in_head, pages, raw, result))
+        print(
+            f"{path:<48} {raw:>8} {result['wire']:>8} {result['encoding']:>8}  {result['cache']}"
+        )
+
+    wire = {path: result["wire"] for path, _, _, _, result in rows}
+    head = {path for path, in_head, _, _, _ in rows if in_head}
+    everywhere = {path for path, _, pages, _, _ in rows if pages == "all"}
+
+    # Before: chart.js was a blocking <head> script on every page.
+    before_blocking = sum(wire[p] for p in head) + CHARTJS_WIRE
+    before_other_page = sum(wire.values()) + CHARTJS_WIRE
+    after_blocking = sum(wire[p] for p in head)
+    after_other_page = sum(wire[p] for p in everywhere)
+
+    print()
+    print(f"{'':<32} {'before (CDN)':>14} {'after (self-hosted)':>20}")
+    print(f"{'third-party origins':<32} {CDN_ORIGINS:>14} {0:>20}")
+    print(f"{'render-blocking bytes':<32} {before_blocking:>14} {after_blocking:>20}")
+    print(f"{'bytes, any page':<32} {before_other_page:>14} {after_other_page:>20}")
+    print(f"{'repeat-visit revalidations':<32} {'chart.js':>14} {'none (immutable)':>20}")
+
+
+if __name__ == "__main__":
+    main()
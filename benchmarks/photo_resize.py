@@ -0,0 +1,121 @@
+"""
+Meal photos shrunk before upload against full-size originals: bytes sent and
+end-to-end time for the add meal form.
+
+    python benchmarks/photo_resize.py
+    python benchmarks/photo_resize.py --megapixels 12,48 --mbps 5
+
+For each size a photo-like JPEG (smooth colour areas with sensor-like
+noise, about 3 MB at 12 MP) is sent through the resumable upload and the
+add meal form to a uvicorn server, whose AI analysis goes to a stub that
+answers at once. "original" sends the photo as taken. "resized" sends it
+shrunk to PHOTO_MAX_MEGAPIXELS at PHOTO_JPEG_QUALITY, as the add meal page
+does. The resize here uses Pillow as a stand-in for the browser's canvas,
+so ``resize_ms`` only hints at the cost on a phone. Reported: upload size,
+end-to-end time on the local connection, the share of it the server spent
+preparing the photo for the model (``encode_ms``, measured separately on
+the same bytes), and the transfer time the upload would take at ``--mbps``.
+"""
+
+import argparse
+import io
+import time
+
+from _common import fake_openai_command, free_port, print_table, serve, session_cookies, setup_django
+from photo_upload import Uploader
+
+USERNAME = "resize_bench"
+
+
+def photo_jpeg(megapixels, seed=49):
+    import numpy as np
+    from PIL import Image
+
+    rng = np.random.default_rng(seed)
+    width = int((megapixels * 1e6 * 4 / 3) ** 0.5)
+    height = int(megapixels * 1e6 / width)
+    base = Image.fromarray(rng.integers(0, 256, (36, 48, 3), dtype=np.uint8)).resize((width, height), Image.BICUBIC)
+    pixels = np.asarray(base, dtype=np.int16) + rng.normal(0, 4, (height, width, 1)).astype(np.int16)
+    output = io.BytesIO()
+    Image.fromarray(pixels.clip(0, 255).astype(np.uint8)).save(output, "JPEG", quality=92)
+    return output.getvalue()
+
+
+def presize(photo, max_megapixels, quality):
+    """What the add meal page does to a photo, with Pillow in place of a canvas."""
+    from PIL import Image
+
+    image = Image.open(io.BytesIO(photo))
+    scale = min(1.0, (max_megapixels * 1e6 / (image.width * image.height)) ** 0.5)
+    size = (int(image.width * scale), int(image.height * scale))
+    image.draft("RGB", size)
+    output = io.BytesIO()
+    image.resize(size, Image.Resampling.LANCZOS).save(output, "JPEG", quality=quality)
+    return output.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--megapixels", default="12,48")
+    parser.add_argument("--mbps", type=float, default=10.0, help="Uplink speed for the transfer estimate")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    setup_django()
+    import httpx
+    from django.conf import settings
+
+    from glucose_tracker.models import Meal
+    from glucose_tracker.utils.ai_analyzer import _encode_image
+
+    user, cookies = session_cookies(USERNAME)
+    upstream_port = free_port()
+    port = free_port()
+    env = {
+        "OPENAI_API_KEY": "bench",
+        "OPENAI_API_BASE": f"http://127.0.0.1:{upstream_port}/v1",
+        "PHOTO_UPLOAD_MAX_BYTES": str(1 << 30),
+    }
+    command = ["uvicorn", "glucosnap_project.asgi:application", "--port", str(port), "--log-level", "warning"]
+
+    results = []
+    try:
+        with serve(fake_openai_command(upstream_port), upstream_port, env={"FAKE_OPENAI_DELAY": "0"}), \
+                serve(command, port, env=env) as base_url, \
+                httpx.Client(base_url=base_url, cookies=cookies, timeout=120) as client:
+            client.get("/add-meal/")  # sets the csrftoken cookie
+            client.headers["X-CSRFToken"] = client.cookies.get("csrftoken", "")
+            uploader = Uploader(client, 1024 * 1024)
+            for megapixels in (float(value) for value in args.megapixels.split(",")):
+                original = photo_jpeg(megapixels)
+                start = time.perf_counter()
+                resized = presize(original, settings.PHOTO_MAX_MEGAPIXELS, settings.PHOTO_JPEG_QUALITY)
+                resize_ms = (time.perf_counter() - start) * 1000
+                for name, photo in [("original", original), ("resized", resized)]:
+                    timings = []
+                    for _ in range(args.repeat):
+                        start = time.perf_counter()
+                        uploader.resumable(photo)
+                        timings.append(time.perf_counter() - start)
+                    start = time.perf_counter()
+                    _encode_image(io.BytesIO(photo))
+                    encode_ms = (time.perf_counter() - start) * 1000
+                    results.append({
+                        "photo": f"{megapixels:g} MP",
+                        "sent": name,
+                        "upload_kb": len(photo) // 1024,
+                        "resize_ms": resize_ms if name == "resized" else None,
+                        "end_to_end_ms": min(timings) * 1000,
+                        "encode_ms": encode_ms,
+                        "link_s": len(photo) * 8 / (args.mbps * 1e6),
+                    })
+    finally:
+        for meal in Meal.objects.filter(user=user):
+            meal.photo.delete(save=False)
+        Meal.objects.filter(user=user).delete()
+    print(f"transfer estimate at {args.mbps:g} Mbit/s")
+    print_table(results, ["photo", "sent", "upload_kb", "resize_ms", "end_to_end_ms", "encode_ms", "link_s"])
+
+
+if __name__ == "__main__":
+    main()
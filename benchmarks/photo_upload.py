@@ -0,0 +1,184 @@
+"""
+Meal photo upload: one multipart form post against the resumable upload
+endpoint followed by a form post that names the upload.
+
+    python benchmarks/photo_upload.py
+    python benchmarks/photo_upload.py --megabytes 4,10,20 --chunk-kb 512
+
+For each size a noise JPEG (which barely compresses) of about that many
+megabytes is generated and the add meal form is submitted both ways to a
+fresh uvicorn process, with the AI analysis switched off and no upload size
+limit. Reported: wall time, requests, and how far the server's peak resident
+memory rose during the upload, after a warm-up with a small photo both ways.
+``lost_mb`` is what has to be sent again after the connection drops 60% of
+the way through: everything sent so far for the form post, what the server
+had not stored for the resumable upload (read back with a HEAD request).
+"""
+
+import argparse
+import base64
+import hashlib
+import io
+import os
+import time
+
+from _common import free_port, jpeg_bytes, print_table, serve, session_cookies, setup_django
+
+USERNAME = "upload_bench"
+
+
+def noise_jpeg(megabytes):
+    import numpy as np
+    from PIL import Image
+
+    # Quality 95 noise is about 1.1 bytes per pixel
+    pixels = int(megabytes * 1024 * 1024 / 1.1)
+    width = int((pixels * 4 / 3) ** 0.5)
+    height = pixels // width
+    rng = np.random.default_rng(48)
+    image = Image.fromarray(rng.integers(0, 256, (height, width, 3), dtype=np.uint8))
+    output = io.BytesIO()
+    image.save(output, "JPEG", quality=95)
+    return output.getvalue()
+
+
+def peak_rss_mb(pid):
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def server_pid(port):
+    """The uvicorn process started for ``port``, found by its command line."""
+    for pid in filter(str.isdigit, os.listdir("/proc")):
+        try:
+            with open(f"/proc/{pid}/cmdline", "rb") as f:
+                args = f.read().split(b"\0")
+        except OSError:
+            continue
+        if b"uvicorn" in args[0] + (args[1] if len(args) > 1 else b"") and str(port).encode() in args:
+            return int(pid)
+    raise RuntimeError(f"no server process for port {port}")
+
+
+class Uploader:
+    def __init__(self, client, chunk_size):
+        self.client = client
+        self.chunk_size = chunk_size
+        self.meal = {"meal_type": "lunch", "timestamp": "2026-01-10T13:00"}
+
+    def form_post(self, photo):
+        response = self.client.post("/add-meal/", data=self.meal, files={"photo": ("meal.jpg", photo, "image/jpeg")})
+        assert response.status_code == 302, response.status_code
+        return 1
+
+    def create(self, photo):
+        filename = base64.b64encode(b"meal.jpg").decode()
+        response = self.client.post(
+            "/uploads/", headers={"Upload-Length": str(len(photo)), "Upload-Metadata": f"filename {filename}"}
+        )
+        assert response.status_code == 201, response.text
+        return response.headers["Location"]
+
+    def patch(self, url, chunk, offset):
+        digest = base64.b64encode(hashlib.sha256(chunk).digest()).decode()
+        response = self.client.patch(url, content=chunk, headers={
+            "Content-Type": "application/offset+octet-stream",
+            "Upload-Offset": str(offset),
+            "Upload-Checksum": f"sha256 {digest}",
+        })
+        assert response.status_code == 204, response.text
+        return int(response.headers["Upload-Offset"])
+
+    def resumable(self, photo):
+        url = self.create(photo)
+        offset = 0
+        requests = 1
+        while offset < len(photo):
+            offset = self.patch(url, photo[offset:offset + self.chunk_size], offset)
+            requests += 1
+        response = self.client.post("/add-meal/", data={**self.meal, "upload": url.strip("/").split("/")[-1]})
+        assert response.status_code == 302, response.status_code
+        return requests + 1
+
+    def lost_after_drop(self, photo):
+        url = self.create(photo)
+        drop = int(len(photo) * 0.6)
+        offset = 0
+        while offset + self.chunk_size <= drop:
+            offset = self.patch(url, photo[offset:offset + self.chunk_size], offset)
+
+        def cut_short():
+            yield photo[offset:drop]
+            raise ConnectionAbortedError
+
+        try:
+            self.client.patch(url, content=cut_short(), headers={
+                "Content-Type": "application/offset+octet-stream", "Upload-Offset": str(offset),
+            })
+        except Exception:
+            pass
+        stored = int(self.client.head(url).headers["Upload-Offset"])
+        self.client.delete(url)
+        return drop - stored
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--megabytes", default="2,5,10")
+    parser.add_argument("--chunk-kb", type=int, default=1024)
+    args = parser.parse_args()
+
+    setup_django()
+    import httpx
+
+    from glucose_tracker.models import Meal, PhotoUpload
+
+    user, cookies = session_cookies(USERNAME)
+    command = lambda port: [
+        "uvicorn", "glucosnap_project.asgi:application", "--port", str(port), "--log-level", "warning",
+    ]
+
+    small = jpeg_bytes()
+    results = []
+    try:
+        for megabytes in (float(value) for value in args.megabytes.split(",")):
+            photo = noise_jpeg(megabytes)
+            for name in ("form post", "resumable"):
+                port = free_port()
+                with serve(command(port), port, env={"OPENAI_API_KEY": "", "PHOTO_UPLOAD_MAX_BYTES": str(1 << 30)}) as base_url, \
+                        httpx.Client(base_url=base_url, cookies=cookies, timeout=60) as client:
+                    client.get("/add-meal/")  # sets the csrftoken cookie
+                    client.headers["X-CSRFToken"] = client.cookies.get("csrftoken", "")
+                    uploader = Uploader(client, args.chunk_kb * 1024)
+                    # Warm both paths up, so first-use imports are not counted
+                    uploader.form_post(small)
+                    uploader.resumable(small)
+                    pid = server_pid(port)
+                    idle = peak_rss_mb(pid)
+                    start = time.perf_counter()
+                    requests = uploader.form_post(photo) if name == "form post" else uploader.resumable(photo)
+                    elapsed = time.perf_counter() - start
+                    peak = peak_rss_mb(pid) - idle
+                    drop = int(len(photo) * 0.6) if name == "form post" else uploader.lost_after_drop(photo)
+                results.append({
+                    "photo_mb": len(photo) / 1024 / 1024,
+                    "upload": name,
+                    "requests": requests,
+                    "ms": elapsed * 1000,
+                    "server_peak_mb": peak,
+                    "lost_mb": drop / 1024 / 1024,
+                })
+    finally:
+        for meal in Meal.objects.filter(user=user):
+            meal.photo.delete(save=False)
+        Meal.objects.filter(user=user).delete()
+        PhotoUpload.objects.filter(user=user).delete()
+    print(f"{args.chunk_kb} KB chunks")
+    print_table(results, ["photo_mb", "upload", "requests", "ms", "server_peak_mb", "lost_mb"])
+
+
+if __name__ == "__main__":
+    main()
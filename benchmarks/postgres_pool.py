@@ -0,0 +1,78 @@
+"""
+Per-request latency on PostgreSQL with and without connection reuse.
+
+    python benchmarks/postgres_pool.py --database-url postgres://localhost/glucosnap_bench
+
+The database is migrated and given a user with a month of readings and
+meals. The dashboard, glucose_list and meal_list views are then loaded
+through gunicorn with three strategies:
+
+* ``no reuse``: CONN_MAX_AGE=0, a new connection (and auth handshake) per request
+* ``persistent``: CONN_MAX_AGE with CONN_HEALTH_CHECKS
+* ``pool``: Django's built-in psycopg pool (DATABASE_POOL, the default)
+"""
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+
+from _common import (
+    BASE_DIR, free_port, print_table, reset_user_data, run_load, serve, session_cookies,
+    setup_django, summarize,
+)
+
+STRATEGIES = {
+    "no reuse": {"DATABASE_POOL": "0", "CONN_MAX_AGE": "0"},
+    "persistent": {"DATABASE_POOL": "0", "CONN_MAX_AGE": "600"},
+    "pool": {"DATABASE_POOL": "1"},
+}
+VIEWS = {"dashboard": "/", "glucose_list": "/glucose-history/", "meal_list": "/meal-history/"}
+
+
+async def drive(base_url, cookies, path, concurrency, total):
+    import httpx
+
+    async with httpx.AsyncClient(base_url=base_url, cookies=cookies, timeout=60) as client:
+        async def send(i):
+            return (await client.get(path)).status_code == 200
+
+        return await run_load(send, concurrency, total)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--database-url", required=True)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args()
+
+    os.environ["DATABASE_URL"] = args.database_url
+    subprocess.run([sys.executable, "manage.py", "migrate", "-v0"], cwd=BASE_DIR, check=True)
+    setup_django()
+    user, cookies = session_cookies()
+    reset_user_data(user)
+
+    rows = []
+    for strategy, env in STRATEGIES.items():
+        port = free_port()
+        command = [
+            "gunicorn", "glucosnap_project.wsgi", "-b", f"127.0.0.1:{port}",
+            "-w", str(args.workers), "-k", "gthread", "--threads", str(args.threads),
+        ]
+        with serve(command, port, env=env) as base_url:
+            for view, path in VIEWS.items():
+                # Warm up so the pool and persistent connections exist
+                asyncio.run(drive(base_url, cookies, path, args.concurrency, args.concurrency))
+                result = asyncio.run(drive(base_url, cookies, path, args.concurrency, args.requests))
+                rows.append({"strategy": strategy, "view": view, **summarize(*result)})
+
+    print(f"concurrency {args.concurrency}, {args.workers} workers x {args.threads} threads")
+    print_table(rows, ["strategy", "view", "requests", "errors", "rps", "p50_ms", "p95_ms", "p99_ms"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Postprandial response engine against a query per meal.
+
+    python benchmarks/postprandial.py --days 365
+    python benchmarks/postprandial.py --days 730 --repeat 5
+
+A synthetic user with ``--days`` of 5-minute readings and their meals is
+generated with the seed_synthetic command. The responses of all meals are
+then computed four ways:
+
+- per_meal: one readings query per meal window and a Python loop over it,
+  what the meal list would do without stored values;
+- merge_python: both series fetched once, walked with two pointers in Python;
+- engine: ``refresh_responses`` (the same two reads, numpy searchsorted and a
+  padded window matrix), including writing every result;
+- engine_unchanged: the same when the stored values are already current,
+  so nothing is written.
+
+The cost a new reading adds through the incremental update is reported too.
+"""
+
+import argparse
+import time
+from datetime import timedelta
+
+from _common import print_table, setup_django
+
+USERNAME = "postprandial_bench_0"
+
+
+def response(baseline, window, meal_time):
+    """Peak rise, time to peak and AUC of one window, in plain Python."""
+    if baseline is None or not window:
+        return None
+    best, best_time, area = None, None, 0.0
+    last_time, last_rise = 0.0, 0.0
+    for timestamp, level in window:
+        minutes = (timestamp - meal_time).total_seconds() / 60
+        rise = level - baseline
+        if best is None or rise > best:
+            best, best_time = rise, minutes
+        area += (last_rise + max(rise, 0)) / 2 * (minutes - last_time)
+        last_time, last_rise = minutes, max(rise, 0)
+    return best, best_time, area
+
+
+def per_meal(user):
+    from glucose_tracker.models import GlucoseReading, Meal
+    from glucose_tracker.utils.postprandial import BASELINE_LOOKBACK, WINDOW
+
+    results = []
+    for meal_time in Meal.objects.filter(user=user).order_by("timestamp").values_list("timestamp", flat=True):
+        readings = GlucoseReading.objects.filter(
+            user=user, timestamp__gte=meal_time - BASELINE_LOOKBACK, timestamp__lte=meal_time + WINDOW
+        ).order_by("timestamp").values_list("timestamp", "glucose_level")
+        before = [level for timestamp, level in readings if timestamp <= meal_time]
+        window = [(timestamp, level) for timestamp, level in readings if timestamp > meal_time]
+        results.append(response(before[-1] if before else None, window, meal_time))
+    return results
+
+
+def merge_python(user):
+    from glucose_tracker.models import GlucoseReading, Meal
+    from glucose_tracker.utils.postprandial import BASELINE_LOOKBACK, WINDOW
+
+    meals = list(Meal.objects.filter(user=user).order_by("timestamp").values_list("timestamp", flat=True))
+    readings = list(
+        GlucoseReading.objects.filter(user=user).order_by("timestamp").values_list("timestamp", "glucose_level")
+    )
+    results, start = [], 0
+    for meal_time in meals:
+        while start < len(readings) and readings[start][0] <= meal_time:
+            start += 1
+        baseline = None
+        if start and readings[start - 1][0] >= meal_time - BASELINE_LOOKBACK:
+            baseline = readings[start - 1][1]
+        end = start
+        while end < len(readings) and readings[end][0] <= meal_time + WINDOW:
+            end += 1
+        results.append(response(baseline, readings[start:end], meal_time))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per method; the best is reported.")
+    args = parser.parse_args()
+
+    setup_django()
+    from django.contrib.auth.models import User
+    from django.core.management import call_command
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    from glucose_tracker.models import GlucoseReading, Meal
+    from glucose_tracker.utils.postprandial import refresh_responses
+
+    call_command("seed_synthetic", users=1, days=args.days, seed=42, prefix="postprandial_bench_", replace=True)
+    user = User.objects.get(username=USERNAME)
+    meals = Meal.objects.filter(user=user).count()
+    readings = GlucoseReading.objects.filter(user=user).count()
+    print(f"{connection.vendor}: {readings:,} readings, {meals:,} meals")
+
+    def engine(user):
+        Meal.objects.filter(user=user).update(glucose_peak_rise=None)  # force every row to be written
+        return refresh_responses(user.id)
+
+    results = []
+    methods = [
+        ("per_meal", per_meal),
+        ("merge_python", merge_python),
+        ("engine", engine),
+        ("engine_unchanged", lambda user: refresh_responses(user.id)),
+    ]
+    for name, run in methods:
+        times = []
+        for _ in range(args.repeat):
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                run(user)
+                times.append(time.perf_counter() - start)
+        results.append({
+            "method": name,
+            "queries": len(queries),
+            "best_ms": min(times) * 1000,
+            "per_meal_us": min(times) / meals * 1e6,
+        })
+
+    # Incremental update: a new reading during the last meal's window
+    last_meal = Meal.objects.filter(user=user).order_by("-timestamp").first()
+    times = []
+    for i in range(args.repeat * 10):
+        start = time.perf_counter()
+        reading = GlucoseReading.objects.create(
+            user=user, timestamp=last_meal.timestamp + timedelta(minutes=7, seconds=i),
+            glucose_level=150 + i, measurement_type="post_dinner",
+        )
+        times.append(time.perf_counter() - start)
+        reading.delete()
+    results.append({"method": "reading_insert", "queries": "", "best_ms": min(times) * 1000, "per_meal_us": ""})
+
+    print_table(results, ["method", "queries", "best_ms", "per_meal_us"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Recent-range query latency and insert throughput for the glucose reading
+table with the three PostgreSQL layouts supported by ``partition_readings``.
+
+    python benchmarks/reading_partitions.py \\
+        --database-url postgres://localhost/glucosnap_scratch --rows 100000000
+
+THE DATABASE IS WIPED: the glucose_tracker tables are migrated to zero and
+back for every layout, so point it at a scratch database.
+
+Rows are generated server-side with generate_series, oldest first (as an
+append-only table fills), spread over ``--users`` users and ``--months``
+months. Layouts: ``btree`` (default indexes only), ``brin`` (plus a BRIN
+index on timestamp) and ``partitioned`` (monthly partitions).
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from datetime import timedelta
+
+from _common import BASE_DIR, print_table, setup_django
+
+LAYOUTS = {"btree": None, "brin": ["--brin"], "partitioned": ["--convert"]}
+
+
+def manage(*args):
+    subprocess.run([sys.executable, "manage.py", *args], cwd=BASE_DIR, check=True,
+                   stdout=subprocess.DEVNULL)
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+
+def run_layout(layout, args, users):
+    from django.db import connection
+    from django.db.models import Avg, Count
+    from django.utils import timezone
+
+    from glucose_tracker.models import GlucoseReading
+
+    table = GlucoseReading._meta.db_table
+    connection.close()
+    manage("migrate", "glucose_tracker", "zero", "-v0")
+    manage("migrate", "-v0")
+
+    span = args.months * 30 * 24 * 3600
+    start = time.perf_counter()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} (timestamp, glucose_level, measurement_type, notes, user_id, updated_at) "
+            f"SELECT now() - make_interval(secs => %s * (1 - i::float / %s)), "
+            f"70 + (i * 7919) %% 180, 'fasting', NULL, "
+            f"(ARRAY[{','.join(str(u.pk) for u in users)}])[1 + i %% %s], now() "
+            f"FROM generate_series(1::bigint, %s) AS i",
+            [span, args.rows, len(users), args.rows],
+        )
+    load_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    if LAYOUTS[layout]:
+        manage("partition_readings", *LAYOUTS[layout])
+    layout_s = time.perf_counter() - start
+    with connection.cursor() as cursor:
+        cursor.execute(f"VACUUM ANALYZE {table}")
+        cursor.execute(
+            "SELECT sum(pg_total_relation_size(c.oid)) FROM pg_class c "
+            "WHERE c.oid = to_regclass(%s) OR c.oid IN "
+            "(SELECT inhrelid FROM pg_inherits WHERE inhparent = to_regclass(%s))",
+            [table, table],
+        )
+        size_mb = float(cursor.fetchone()[0]) / 1024 / 1024
+
+    now = timezone.now()
+    user = users[0]
+
+    def user_30d():
+        list(GlucoseReading.objects.filter(user=user, timestamp__gte=now - timedelta(days=30)))
+
+    def all_users_7d():
+        GlucoseReading.objects.filter(timestamp__gte=now - timedelta(days=7)).aggregate(
+            Avg("glucose_level"), Count("id")
+        )
+
+    def insert_batch():
+        GlucoseReading.objects.bulk_create(
+            [GlucoseReading(user=user, glucose_level=100, measurement_type="fasting")
+             for _ in range(args.batch)]
+        )
+
+    result = {
+        "layout": layout,
+        "rows": args.rows,
+        "load_s": load_s,
+        "layout_s": layout_s,
+        "size_mb": size_mb,
+        "user_30d_ms": timed(user_30d, args.repeat),
+        "all_7d_ms": timed(all_users_7d, args.repeat),
+    }
+    # Last, so the inserted rows do not skew the range queries
+    result["insert_rows/s"] = args.batch / (timed(insert_batch, 5) / 1000)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--database-url", required=True)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--months", type=int, default=24)
+    parser.add_argument("--batch", type=int, default=5000, help="rows per insert batch")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--layouts", nargs="+", choices=LAYOUTS, default=list(LAYOUTS))
+    args = parser.parse_args()
+
+    os.environ["DATABASE_URL"] = args.database_url
+    manage("migrate", "-v0")
+    setup_django()
+    from django.contrib.auth.models import User
+
+    User.objects.bulk_create(
+        [User(username=f"bench_partition_{i}") for i in range(args.users)], ignore_conflicts=True
+    )
+    users = list(User.objects.filter(username__startswith="bench_partition_").order_by("pk"))
+
+    rows = [run_layout(layout, args, users) for layout in args.layouts]
+    print_table(rows, ["layout", "rows", "load_s", "layout_s", "size_mb",
+                       "user_30d_ms", "all_7d_ms", "insert_rows/s"])
+
+
+if __name__ == "__main__":
+    main()
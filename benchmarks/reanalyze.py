@@ -0,0 +1,77 @@
+"""
+Throughput of the reanalyze_meals command against a stubbed vision API.
+
+    python benchmarks/reanalyze.py
+    python benchmarks/reanalyze.py --meals 2000 --delay 1.0 --rate 200
+
+``--meals`` meals with a 12-megapixel photo are created for the user
+``reanalyze_bench`` and re-analyzed by the command against the fake
+chat/completions server from _common, which answers after ``--delay``
+seconds. Each configuration is one run of the command; the sequential
+baseline (one meal at a time, resized in the same process) is what
+re-uploading the meals one by one amounts to.
+"""
+
+import argparse
+import io
+import os
+import time
+
+from _common import fake_openai_command, free_port, jpeg_bytes, print_table, serve, setup_django
+
+USERNAME = "reanalyze_bench"
+PHOTO_NAME = "meals/reanalyze_bench.jpg"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--meals", type=int, default=400)
+    parser.add_argument("--delay", type=float, default=0.5, help="Seconds the fake API takes per request.")
+    parser.add_argument("--rate", type=float, default=100.0, help="--rate passed to the command.")
+    args = parser.parse_args()
+
+    setup_django()
+    from django.contrib.auth.models import User
+    from django.core.files.base import ContentFile
+    from django.core.files.storage import default_storage
+    from django.core.management import call_command
+    from django.test.utils import override_settings
+    from django.utils import timezone
+
+    from glucose_tracker.models import Meal
+
+    if not default_storage.exists(PHOTO_NAME):
+        default_storage.save(PHOTO_NAME, ContentFile(jpeg_bytes((4000, 3000))))
+    user, _ = User.objects.get_or_create(username=USERNAME)
+    Meal.objects.filter(user=user).delete()
+    now = timezone.now()
+    Meal.objects.bulk_create(
+        Meal(user=user, timestamp=now, meal_type="lunch", photo=PHOTO_NAME) for _ in range(args.meals)
+    )
+
+    cpus = os.cpu_count()
+    configurations = [
+        ("sequential", {"workers": 0, "concurrency": 1}),
+        ("threads, 16 in flight", {"workers": 0, "concurrency": 16}),
+        (f"{cpus} processes, 16 in flight", {"workers": cpus, "concurrency": 16}),
+        (f"{cpus} processes, 64 in flight", {"workers": cpus, "concurrency": 64}),
+    ]
+    port = free_port()
+    results = []
+    with serve(fake_openai_command(port), port, env={"FAKE_OPENAI_DELAY": str(args.delay)}) as base:
+        with override_settings(OPENAI_API_KEY="bench", OPENAI_API_BASE=base):
+            for name, options in configurations:
+                meals = args.meals if options["concurrency"] > 1 else max(1, args.meals // 20)
+                start = time.perf_counter()
+                call_command(
+                    "reanalyze_meals", user=[USERNAME], rate=args.rate, restart=True,
+                    limit=meals, stdout=io.StringIO(), **options,
+                )
+                elapsed = time.perf_counter() - start
+                results.append({"configuration": name, "meals": meals, "seconds": elapsed, "meals_per_s": meals / elapsed})
+
+    print_table(results, ["configuration", "meals", "seconds", "meals_per_s"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Report pack rendering time against the number of worker processes.
+
+    python benchmarks/report_pack.py
+    python benchmarks/report_pack.py --patients 8 --months 12 --workers 1,2,4,8
+
+``--patients`` synthetic users with ``--months`` of 5-minute readings are
+generated with the seed_synthetic command, then a pack of one PDF per
+patient and month is rendered with each worker count. Reported: wall time,
+reports per second, speedup over one worker (rendered in-process, no pool)
+and parallel efficiency (speedup / workers). Speedup cannot exceed the
+number of CPUs, printed first; pool start-up, each worker setting Django up
+and parsing the report stylesheet, is included.
+"""
+
+import argparse
+import os
+import time
+
+from _common import print_table, setup_django
+
+PREFIX = "report_bench_"
+
+
+def main():
+    cpus = os.cpu_count()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--patients", type=int, default=4)
+    parser.add_argument("--months", type=int, default=12)
+    parser.add_argument("--workers", default=",".join(str(n) for n in sorted({1, 2, cpus // 2 or 1, cpus})))
+    args = parser.parse_args()
+
+    setup_django()
+    from django.contrib.auth.models import User
+    from django.core.management import call_command
+
+    from glucose_tracker.utils.report_pack import pack_chunks, pack_jobs
+
+    call_command(
+        "seed_synthetic", users=args.patients, days=args.months * 31, seed=46, prefix=PREFIX, replace=True
+    )
+    users = User.objects.filter(username__startswith=PREFIX).order_by("username")
+    jobs = pack_jobs(users, args.months)
+    print(f"{cpus} CPUs, {len(jobs)} reports ({args.patients} patients x {args.months} months)")
+
+    results = []
+    for workers in (int(value) for value in args.workers.split(",")):
+        start = time.perf_counter()
+        size = sum(len(chunk) for chunk in pack_chunks(jobs, workers))
+        elapsed = time.perf_counter() - start
+        baseline = results[0]["seconds"] if results else elapsed
+        results.append({
+            "workers": workers,
+            "seconds": elapsed,
+            "reports_per_s": len(jobs) / elapsed,
+            "speedup": baseline / elapsed,
+            "efficiency": baseline / elapsed / workers,
+            "zip_kb": size // 1024,
+        })
+    print_table(results, ["workers", "seconds", "reports_per_s", "speedup", "efficiency", "zip_kb"])
+
+
+if __name__ == "__main__":
+    main()
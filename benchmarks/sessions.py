@@ -0,0 +1,86 @@
+"""
+Database work per request for each session and message storage.
+
+    python benchmarks/sessions.py
+    python benchmarks/sessions.py --rounds 200
+
+Each configuration logs the ``bench`` user in with a fresh test client and
+repeats ``--rounds`` times what a user does when logging a reading: open the
+dashboard, post the add glucose form and follow the redirect back to the
+dashboard, which shows the flash message. Reported per request: all SQL
+statements, those on the django_session table, writes among them, and the
+mean latency in-process.
+
+- db_fallback: database sessions with the default FallbackStorage messages,
+  the settings before sessions moved to cookies;
+- cached_db_cookie: cached_db sessions with CookieStorage messages;
+- signed_cookies_cookie: signed cookie sessions with CookieStorage
+  messages, the default.
+"""
+
+import argparse
+import time
+
+from _common import print_table, reset_user_data, setup_django
+
+CONFIGURATIONS = [
+    ("db_fallback", "django.contrib.sessions.backends.db", "django.contrib.messages.storage.fallback.FallbackStorage"),
+    ("cached_db_cookie", "django.contrib.sessions.backends.cached_db",
+     "django.contrib.messages.storage.cookie.CookieStorage"),
+    ("signed_cookies_cookie", "django.contrib.sessions.backends.signed_cookies",
+     "django.contrib.messages.storage.cookie.CookieStorage"),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=50)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.contrib.auth.models import User
+    from django.db import connection, reset_queries
+    from django.test import Client
+    from django.test.utils import CaptureQueriesContext, override_settings
+    from django.urls import reverse
+    from django.utils import timezone
+
+    user, _created = User.objects.get_or_create(username="bench")
+    results = []
+    for name, engine, storage in CONFIGURATIONS:
+        reset_user_data(user)
+        with override_settings(SESSION_ENGINE=engine, MESSAGE_STORAGE=storage, ALLOWED_HOSTS=["testserver"]):
+            client = Client()
+            client.force_login(user)
+            requests, elapsed, statements = 0, 0.0, []
+            for i in range(args.rounds):
+                reset_queries()  # the query log keeps at most 9000 entries
+                with CaptureQueriesContext(connection) as queries:
+                    start = time.perf_counter()
+                    client.get(reverse("dashboard"))
+                    response = client.post(
+                        reverse("add_glucose"),
+                        {"timestamp": timezone.localtime().strftime("%Y-%m-%dT%H:%M"),
+                         "glucose_level": 100 + i % 50, "measurement_type": "night"},
+                        follow=True,
+                    )
+                    elapsed += time.perf_counter() - start
+                assert response.status_code == 200 and b"alert-success" in response.content
+                requests += 3
+                statements.extend(query["sql"] for query in queries)
+        session = [sql for sql in statements if "django_session" in sql]
+        results.append({
+            "configuration": name,
+            "queries": len(statements) / requests,
+            "session_queries": len(session) / requests,
+            "session_writes": sum(not sql.startswith("SELECT") for sql in session) / requests,
+            "ms_per_request": elapsed / requests * 1000,
+        })
+    reset_user_data(user)
+
+    print(f"{connection.vendor}: {args.rounds} rounds of dashboard, add_glucose, dashboard")
+    print_table(results, ["configuration", "queries", "session_queries", "session_writes", "ms_per_request"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Multi-process read/write benchmark for the default and SQLITE_TUNED profiles.
+
+    python benchmarks/sqlite_concurrency.py --processes 8 --seconds 10
+
+Each profile gets a fresh, migrated database in a temporary directory. Every
+worker process is a separate Django instance (like a gunicorn worker) that
+loops until the deadline, doing dashboard-style reads and add_glucose-style
+writes. Writes run as read-then-insert transactions, the pattern that fails
+with "database is locked" under the default DEFERRED transactions.
+"""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import timedelta
+from pathlib import Path
+
+from _common import BASE_DIR, print_table, setup_django
+
+PROFILES = {"default": "0", "tuned": "1"}
+
+
+def worker(seconds, write_ratio, seed):
+    setup_django()
+    from django.contrib.auth.models import User
+    from django.db import OperationalError, transaction
+    from django.db.models import Avg
+    from django.utils import timezone
+
+    from glucose_tracker.models import GlucoseReading
+
+    rng = random.Random(seed)
+    user = User.objects.get(username="bench")
+    counts = {"reads": 0, "writes": 0, "lock_errors": 0, "ops": 0}
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        counts["ops"] += 1
+        try:
+            if rng.random() < write_ratio:
+                with transaction.atomic():
+                    # Read inside the transaction first, as views do when they
+                    # touch the session or related rows before inserting.
+                    GlucoseReading.objects.filter(user=user).exists()
+                    GlucoseReading.objects.create(
+                        user=user,
+                        glucose_level=rng.randint(60, 250),
+                        measurement_type="fasting",
+                    )
+                counts["writes"] += 1
+            else:
+                since = timezone.now() - timedelta(days=7)
+                list(GlucoseReading.objects.filter(user=user)[:5])
+                GlucoseReading.objects.filter(user=user, timestamp__gte=since).aggregate(
+                    Avg("glucose_level")
+                )
+                counts["reads"] += 1
+        except OperationalError as exc:
+            if "locked" not in str(exc):
+                raise
+            counts["lock_errors"] += 1
+    print(json.dumps(counts))
+
+
+def run_profile(name, tuned, args, workdir):
+    env = {
+        **os.environ,
+        "DATABASE_URL": f"sqlite:///{Path(workdir) / name}.sqlite3",
+        "SQLITE_TUNED": tuned,
+    }
+    subprocess.run(
+        [sys.executable, "manage.py", "migrate", "-v0"], cwd=BASE_DIR, env=env, check=True
+    )
+    subprocess.run(
+        [sys.executable, "manage.py", "shell", "-c",
+         "from django.contrib.auth.models import User; User.objects.create(username='bench')"],
+        cwd=BASE_DIR, env=env, check=True,
+    )
+    processes = [
+        subprocess.Popen(
+            [sys.executable, __file__, "--worker", "--seconds", str(args.seconds),
+             "--write-ratio", str(args.write_ratio), "--seed", str(i)],
+            cwd=BASE_DIR, env=env, stdout=subprocess.PIPE, text=True,
+        )
+        for i in range(args.processes)
+    ]
+    totals = {"reads": 0, "writes": 0, "lock_errors": 0, "ops": 0}
+    for process in processes:
+        output, _ = process.communicate()
+        for key, value in json.loads(output.strip().splitlines()[-1]).items():
+            totals[key] += value
+    return {
+        "profile": name,
+        "reads/s": totals["reads"] / args.seconds,
+        "writes/s": totals["writes"] / args.seconds,
+        "lock_errors": totals["lock_errors"],
+        "error_%": 100.0 * totals["lock_errors"] / max(totals["ops"], 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--processes", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--write-ratio", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(args.seconds, args.write_ratio, args.seed)
+        return
+
+    with tempfile.TemporaryDirectory() as workdir:
+        rows = [run_profile(name, tuned, args, workdir) for name, tuned in PROFILES.items()]
+    print(f"{args.processes} processes, {args.seconds}s, {args.write_ratio:.0%} writes")
+    print_table(rows, ["profile", "reads/s", "writes/s", "lock_errors", "error_%"])
+
+
+if __name__ == "__main__":
+    main()
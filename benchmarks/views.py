@@ -0,0 +1,220 @@
+"""
+Latency, throughput, query-count and memory benchmark for every
+glucose_tracker view, with comparison against a stored baseline.
+
+    python benchmarks/views.py                                 # in-process test client
+    python benchmarks/views.py --server --concurrency 16       # real uvicorn server
+    python benchmarks/views.py --save-baseline benchmarks/baseline.json
+    python benchmarks/views.py --compare benchmarks/baseline.json --tolerance 0.25
+
+A ``bench`` user is (re)seeded with a fixed month of readings and meals
+before the run. Query counts and peak Python memory per request always come
+from an in-process pass; latency and throughput come from the test client
+or, with ``--server``, from HTTP requests at ``--concurrency``. The meal
+analyzer is stubbed: patched out in-process, and pointed at a local fake
+endpoint for the server. ``--compare`` exits with status 1 if a view's p95
+latency grew by more than the tolerance or it runs more queries.
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+import tracemalloc
+from unittest import mock
+
+from _common import (
+    fake_openai_command, free_port, jpeg_bytes, print_table, reset_user_data, run_load, serve,
+    session_cookies, setup_django, summarize,
+)
+
+# name, url name, query string, method, expected status
+SCENARIOS = [
+    ("dashboard", "dashboard", "", "GET", 200),
+    ("add_glucose", "add_glucose", "", "POST", 302),
+    ("add_meal", "add_meal", "", "POST", 302),
+    ("glucose_list", "glucose_list", "?page=2", "GET", 200),
+    ("meal_list", "meal_list", "?page=2", "GET", 200),
+    ("export_csv", "export_data", "?format=csv", "GET", 200),
+    ("export_xlsx", "export_data", "?format=xlsx", "GET", 200),
+    ("export_ods", "export_data", "?format=ods", "GET", 200),
+    ("export_parquet", "export_data", "?format=parquet", "GET", 200),
+    ("export_arrow", "export_data", "?format=arrow", "GET", 200),
+    ("export_zip", "export_data", "?format=zip", "GET", 200),
+    ("generate_report", "generate_report", "", "GET", 200),
+]
+
+STUB_ANALYSIS = {"description": "Pasta", "calories": 600, "carbs": 80, "components": []}
+
+
+def form_data(name):
+    from django.core.files.uploadedfile import SimpleUploadedFile
+
+    if name == "add_glucose":
+        return {"glucose_level": 110, "measurement_type": "fasting",
+                "timestamp": "2025-01-01T08:00", "notes": ""}
+    if name == "add_meal":
+        return {"meal_type": "lunch", "timestamp": "2025-01-01T12:00",
+                "photo": SimpleUploadedFile("meal.jpg", jpeg_bytes(), "image/jpeg")}
+    return None
+
+
+def measure_in_process(user, requests):
+    """Latency, query count and peak memory per view through the test client."""
+    from django.db import connection, reset_queries
+    from django.test import Client
+    from django.test.utils import CaptureQueriesContext
+    from django.urls import reverse
+
+    client = Client(HTTP_HOST="localhost")
+    client.force_login(user)
+    results = {}
+    stub = mock.patch("glucose_tracker.views.aanalyze_meal_image",
+                      mock.AsyncMock(return_value=STUB_ANALYSIS))
+    with stub:
+        for name, url_name, query, method, expected in SCENARIOS:
+            url = reverse(url_name) + query
+
+            def request():
+                if method == "POST":
+                    return client.post(url, form_data(name))
+                response = client.get(url)
+                if response.streaming:
+                    b"".join(response.streaming_content)
+                return response
+
+            try:
+                # The query log is a bounded deque; start from empty so the
+                # capture below cannot be cut off by a full log.
+                reset_queries()
+                with CaptureQueriesContext(connection) as queries:
+                    response = request()
+                if response.status_code != expected:
+                    raise RuntimeError(f"HTTP {response.status_code}")
+
+                tracemalloc.start()
+                request()
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+
+                latencies = []
+                start = time.perf_counter()
+                for _ in range(requests):
+                    t = time.perf_counter()
+                    request()
+                    latencies.append(time.perf_counter() - t)
+                elapsed = time.perf_counter() - start
+            except Exception as exc:  # e.g. WeasyPrint system libraries missing
+                tracemalloc.stop()
+                results[name] = {"view": name, "error": f"{type(exc).__name__}: {exc}"[:60]}
+                continue
+
+            results[name] = {
+                "view": name,
+                **summarize(latencies, elapsed),
+                "queries": len(queries),
+                "peak_kb": peak / 1024,
+            }
+    return results
+
+
+async def measure_server(base_url, cookies, results, requests, concurrency):
+    import httpx
+    from django.urls import reverse
+
+    photo = jpeg_bytes()
+    async with httpx.AsyncClient(base_url=base_url, cookies=cookies, timeout=120) as client:
+        await client.get(reverse("add_glucose"))  # sets the csrftoken cookie
+        headers = {"X-CSRFToken": client.cookies.get("csrftoken", "")}
+        for name, url_name, query, method, expected in SCENARIOS:
+            if "error" in results[name]:
+                continue
+            url = reverse(url_name) + query
+            data = form_data(name)
+            files = None
+            if data and "photo" in data:
+                data.pop("photo")
+                files = {"photo": ("meal.jpg", photo, "image/jpeg")}
+
+            async def send(i):
+                if method == "POST":
+                    response = await client.post(url, data=data, files=files, headers=headers)
+                else:
+                    response = await client.get(url)
+                return response.status_code == expected
+
+            latencies, elapsed, errors = await run_load(send, concurrency, requests)
+            results[name].update(summarize(latencies, elapsed, errors))
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for name, row in results.items():
+        base = baseline.get(name)
+        if not base or "error" in row or "error" in base:
+            continue
+        row["p95_vs_base"] = f"{(row['p95_ms'] / base['p95_ms'] - 1) * 100:+.0f}%" if base["p95_ms"] else "-"
+        if row["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {base['p95_ms']:.1f} -> {row['p95_ms']:.1f} ms")
+        if row["queries"] > base["queries"]:
+            regressions.append(f"{name}: queries {base['queries']} -> {row['queries']}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--requests", type=int, default=50, help="requests per view")
+    parser.add_argument("--server", action="store_true", help="also load a real uvicorn server")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--save-baseline", metavar="FILE")
+    parser.add_argument("--compare", metavar="FILE")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed p95 growth")
+    args = parser.parse_args()
+
+    setup_django()
+    from django.test.utils import override_settings
+
+    user, cookies = session_cookies()
+    reset_user_data(user)
+    with override_settings(OPENAI_API_KEY="bench"):
+        results = measure_in_process(user, args.requests)
+    reset_user_data(user)
+
+    if args.server:
+        upstream_port, port = free_port(), free_port()
+        env = {"OPENAI_API_KEY": "bench", "OPENAI_API_BASE": f"http://127.0.0.1:{upstream_port}/v1"}
+        command = ["uvicorn", "glucosnap_project.asgi:application", "--port", str(port),
+                   "--workers", str(args.workers), "--log-level", "warning"]
+        with serve(fake_openai_command(upstream_port), upstream_port), \
+                serve(command, port, env=env) as base_url:
+            asyncio.run(measure_server(base_url, cookies, results, args.requests, args.concurrency))
+        reset_user_data(user)
+
+    mode = f"server, concurrency {args.concurrency}" if args.server else "test client"
+    regressions = []
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline["mode"] != mode:
+            sys.exit(f"Baseline was recorded with '{baseline['mode']}', not '{mode}'.")
+        regressions = compare(results, baseline["views"], args.tolerance)
+
+    print(f"{args.requests} requests per view ({mode})")
+    columns = ["view", "rps", "p50_ms", "p95_ms", "p99_ms", "queries", "peak_kb"]
+    if args.compare:
+        columns.append("p95_vs_base")
+    print_table(list(results.values()), columns + ["error"])
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump({"mode": mode, "views": results}, f, indent=2)
+        print(f"Baseline written to {args.save_baseline}")
+    if regressions:
+        print("\nRegressions:\n  " + "\n  ".join(regressions))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
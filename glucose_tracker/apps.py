@@ -1,6 +1,28 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_migrate
 
 
 class GlucoseTrackerConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "glucose_tracker"
+
+    def ready(self):
+        from . import signals  # noqa: F401
+
+        post_migrate.connect(install_search_index, sender=self)
+
+        if settings.PERF_INSTRUMENTATION or settings.METRICS_ENABLED:
+            from .instrumentation import install_query_timer
+
+            connection_created.connect(install_query_timer)
+
+
+def install_search_index(using, **kwargs):
+    # Table rebuilds in later SQLite migrations drop the index triggers
+    from django.db import connections
+
+    from .utils import search
+
+    search.install(connections[using])
@@ -66,6 +66,16 @@ class GlucoseReadingForm(forms.ModelForm):
 
 
 class MealForm(forms.ModelForm):
+    dish = forms.CharField(
+        label=_("Dish"),
+        required=False,
+        max_length=200,
+        help_text=_("Optional, e.g. \"pizza margherita, 1 beer\". Known dishes are estimated instantly, without waiting for the photo analysis."),
+        widget=forms.TextInput(
+            attrs={"class": "form-control", "list": "food-suggestions", "autocomplete": "off"}
+        ),
+    )
+
     class Meta:
         model = Meal
         fields = ["photo", "meal_type", "timestamp", "manual_notes"]
@@ -79,3 +89,17 @@ class MealForm(forms.ModelForm):
                 attrs={"class": "form-control", "accept": "image/*"}
             ),
         }
+
+    # Set by the page script when the photo went through a resumable upload
+    # (utils/uploads.py); the file input is then left empty
+    upload = forms.UUIDField(required=False, widget=forms.HiddenInput)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields["photo"].required = False
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if not cleaned_data.get("photo") and not cleaned_data.get("upload") and "photo" not in self.errors:
+            self.add_error("photo", self.fields["photo"].error_messages["required"])
+        return cleaned_data
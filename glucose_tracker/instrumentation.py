@@ -0,0 +1,198 @@
+"""
+Per-request timing of SQL, template rendering, the meal analyzer and PDF
+generation. Measurements are collected in a context variable, so they follow
+the request across ``sync_to_async`` threads and asyncio tasks, and cost a
+single lookup when no request is being instrumented.
+"""
+import functools
+import inspect
+import time
+from contextvars import ContextVar
+
+from django.template.backends.django import DjangoTemplates, Template
+
+_current = ContextVar("request_timings", default=None)
+_DONE = object()
+
+# Server-Timing metric names and their descriptions
+METRICS = {
+    "db": "Database",
+    "tpl": "Templates",
+    "ai": "Meal analyzer",
+    "pdf": "PDF report",
+}
+
+
+class RequestTimings:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.durations = dict.fromkeys(METRICS, 0.0)
+        self.queries = {}
+        self.query_count = 0
+
+    def add(self, metric, seconds):
+        self.durations[metric] += seconds
+
+    def add_query(self, sql, seconds):
+        self.durations["db"] += seconds
+        self.query_count += 1
+        count, total = self.queries.get(sql, (0, 0.0))
+        self.queries[sql] = (count + 1, total + seconds)
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def server_timing(self, elapsed):
+        parts = []
+        for metric, description in METRICS.items():
+            seconds = self.durations[metric]
+            if metric == "db":
+                description = f"{self.query_count} queries"
+            elif not seconds:
+                continue
+            parts.append(f'{metric};dur={seconds * 1000:.1f};desc="{description}"')
+        parts.append(f"total;dur={elapsed * 1000:.1f}")
+        return ", ".join(parts)
+
+    def top_queries(self, limit):
+        """Distinct statements by total time, so N+1 patterns surface as one entry."""
+        ranked = sorted(self.queries.items(), key=lambda item: item[1][1], reverse=True)
+        return [
+            {"sql": sql[:500], "count": count, "ms": round(total * 1000, 1)}
+            for sql, (count, total) in ranked[:limit]
+        ]
+
+
+def start():
+    """Begin timing a request; nested middleware share the outer one's timings."""
+    if _current.get() is not None:
+        return None
+    return _current.set(RequestTimings())
+
+
+def stop(token):
+    if token is not None:
+        _current.reset(token)
+
+
+def current():
+    return _current.get()
+
+
+def follow_stream(response, timings, finished):
+    """
+    Keep a streamed response's body under ``timings``, then call
+    ``finished()``. The view returns before the body is produced, so the
+    queries and time spent in each chunk would otherwise go unmeasured; the
+    chunks are produced with ``timings`` current, on the request's thread
+    just as the view was, and ``finished()`` runs once the last one is sent
+    or the stream is closed early.
+    """
+
+    def follow(chunks):
+        try:
+            while True:
+                token = _current.set(timings)
+                try:
+                    chunk = next(chunks, _DONE)
+                finally:
+                    _current.reset(token)
+                if chunk is _DONE:
+                    return
+                yield chunk
+        finally:
+            finished()
+
+    async def afollow(chunks):
+        try:
+            while True:
+                token = _current.set(timings)
+                try:
+                    chunk = await anext(chunks, _DONE)
+                finally:
+                    _current.reset(token)
+                if chunk is _DONE:
+                    return
+                yield chunk
+        finally:
+            finished()
+
+    content = response.streaming_content
+    if response.is_async:
+        response.streaming_content = afollow(aiter(content))
+    else:
+        response.streaming_content = follow(iter(content))
+
+
+def timed(metric):
+    """Decorator adding a function's wall time to the current request's metric."""
+
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                timings = _current.get()
+                if timings is None:
+                    return await func(*args, **kwargs)
+                started = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    timings.add(metric, time.perf_counter() - started)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            timings = _current.get()
+            if timings is None:
+                return func(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                timings.add(metric, time.perf_counter() - started)
+
+        return wrapper
+
+    return decorator
+
+
+def time_query(execute, sql, params, many, context):
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.add_query(sql, time.perf_counter() - started)
+
+
+def install_query_timer(sender, connection, **kwargs):
+    """connection_created receiver; reconnects reuse the wrapper object, so add it once."""
+    if time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_query)
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        timings = _current.get()
+        if timings is None:
+            return super().render(context, request)
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            timings.add("tpl", time.perf_counter() - started)
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """Django template backend whose templates report their render time."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code).template, self)
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name).template, self)
@@ -0,0 +1,43 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from glucose_tracker.models import CareAssignment
+
+
+class Command(BaseCommand):
+    help = (
+        "Assign patients to a clinician (a staff user), who then sees them on "
+        "the clinician overview. --prefix assigns every user whose username "
+        "starts with it."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("clinician", help="Username of the clinician.")
+        parser.add_argument("patients", nargs="*", help="Usernames of the patients.")
+        parser.add_argument("--prefix", help="Also assign every user whose username starts with this.")
+        parser.add_argument("--remove", action="store_true", help="Remove the assignments instead.")
+
+    def handle(self, *args, **options):
+        clinician = User.objects.filter(username=options["clinician"]).first()
+        if clinician is None:
+            raise CommandError(f"Unknown clinician {options['clinician']!r}.")
+        if not clinician.is_staff:
+            raise CommandError(f"{clinician.username} is not a staff user; the overview is for staff only.")
+
+        patients = {user.pk: user for user in User.objects.filter(username__in=options["patients"])}
+        if len(patients) != len(set(options["patients"])):
+            raise CommandError("Unknown user among the patients.")
+        if options["prefix"]:
+            prefixed = User.objects.filter(username__startswith=options["prefix"]).exclude(pk=clinician.pk)
+            patients.update((user.pk, user) for user in prefixed)
+
+        if options["remove"]:
+            removed, _ = CareAssignment.objects.filter(clinician=clinician, patient__in=patients.values()).delete()
+            self.stdout.write(self.style.SUCCESS(f"Removed {removed} patients from {clinician.username}."))
+            return
+        # Patients already assigned are skipped
+        CareAssignment.objects.bulk_create(
+            [CareAssignment(clinician=clinician, patient=patient) for patient in patients.values()],
+            ignore_conflicts=True,
+        )
+        self.stdout.write(self.style.SUCCESS(f"Assigned {len(patients)} patients to {clinician.username}."))
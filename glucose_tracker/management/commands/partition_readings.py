@@ -0,0 +1,199 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from glucose_tracker.models import GlucoseReading
+
+TABLE = GlucoseReading._meta.db_table
+ARCHIVE_SCHEMA = "glucose_archive"
+
+
+def month_start(day, offset=0):
+    month = day.month - 1 + offset
+    return date(day.year + month // 12, month % 12 + 1, 1)
+
+
+def partition_name(start):
+    return f"{TABLE}_p{start:%Y_%m}"
+
+
+class Command(BaseCommand):
+    help = (
+        "Manage the optional PostgreSQL layout for glucose readings: convert the "
+        "table to monthly range partitions, create partitions ahead of time, and "
+        "detach or archive old ones. Run periodically (e.g. daily from cron)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--convert",
+            action="store_true",
+            help="Convert the readings table to a table partitioned by month (one-off, locks the table).",
+        )
+        parser.add_argument(
+            "--brin",
+            action="store_true",
+            help="Instead of partitioning, add a BRIN index on timestamp for append-only tables.",
+        )
+        parser.add_argument(
+            "--ahead",
+            type=int,
+            default=3,
+            help="Number of future months to create partitions for (default: 3).",
+        )
+        parser.add_argument(
+            "--retain-months",
+            type=int,
+            help="Detach partitions that end more than this many months ago.",
+        )
+        parser.add_argument(
+            "--archive",
+            choices=["schema", "drop"],
+            default="schema",
+            help=f"What to do with detached partitions: move them to the "
+            f"'{ARCHIVE_SCHEMA}' schema (default) or drop them.",
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("Reading partitions require PostgreSQL (see DATABASE_URL).")
+
+        if options["brin"]:
+            self.create_brin_index()
+            return
+
+        if options["convert"]:
+            self.convert()
+        elif not self.is_partitioned():
+            raise CommandError(f"{TABLE} is not partitioned yet; run with --convert first.")
+
+        this_month = month_start(timezone.now().date())
+        for offset in range(options["ahead"] + 1):
+            self.create_partition(month_start(this_month, offset))
+
+        if options["retain_months"] is not None:
+            cutoff = month_start(this_month, -options["retain_months"])
+            self.detach_before(cutoff, options["archive"])
+
+    def is_partitioned(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", [TABLE])
+            row = cursor.fetchone()
+        return row is not None and row[0] == "p"
+
+    def create_brin_index(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {TABLE}_ts_brin ON {TABLE} "
+                f"USING brin (timestamp) WITH (pages_per_range = 32)"
+            )
+        self.stdout.write(self.style.SUCCESS(f"BRIN index on {TABLE}.timestamp is in place."))
+
+    @transaction.atomic
+    def convert(self):
+        if self.is_partitioned():
+            self.stdout.write(f"{TABLE} is already partitioned.")
+            return
+
+        legacy = f"{TABLE}_unpartitioned"
+        sequence = f"{TABLE}_id_seq"
+        with connection.cursor() as cursor:
+            cursor.execute(f"LOCK TABLE {TABLE} IN ACCESS EXCLUSIVE MODE")
+            # Remember secondary indexes and foreign keys so they can be
+            # recreated on the partitioned table under the same names.
+            cursor.execute(
+                "SELECT indexdef FROM pg_indexes WHERE tablename = %s "
+                "AND indexdef NOT LIKE 'CREATE UNIQUE INDEX%%'",
+                [TABLE],
+            )
+            index_defs = [row[0] for row in cursor.fetchall()]
+            cursor.execute(
+                "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+                "WHERE conrelid = to_regclass(%s) AND contype = 'f'",
+                [TABLE],
+            )
+            foreign_keys = cursor.fetchall()
+            cursor.execute("SELECT min(timestamp), max(timestamp) FROM " + TABLE)
+            first, last = cursor.fetchone()
+
+            cursor.execute(f"ALTER TABLE {TABLE} RENAME TO {legacy}")
+            cursor.execute(
+                f"CREATE TABLE {TABLE} (LIKE {legacy} INCLUDING DEFAULTS) "
+                f"PARTITION BY RANGE (timestamp)"
+            )
+            cursor.execute(f"CREATE TABLE {TABLE}_default PARTITION OF {TABLE} DEFAULT")
+
+        if first is not None:
+            start = month_start(first.date())
+            while start <= last.date():
+                self.create_partition(start)
+                start = month_start(start, 1)
+
+        with connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {TABLE} SELECT * FROM {legacy}")
+            cursor.execute(f"DROP TABLE {legacy}")
+            # The primary key of a partitioned table must include the partition
+            # key, and ids now come from a plain sequence shared by all partitions.
+            cursor.execute(f"ALTER TABLE {TABLE} ADD PRIMARY KEY (id, timestamp)")
+            cursor.execute(f"CREATE SEQUENCE {sequence} OWNED BY {TABLE}.id")
+            cursor.execute(
+                f"SELECT setval('{sequence}', COALESCE((SELECT max(id) FROM {TABLE}), 0) + 1, false)"
+            )
+            cursor.execute(f"ALTER TABLE {TABLE} ALTER COLUMN id SET DEFAULT nextval('{sequence}')")
+            for index_def in index_defs:
+                cursor.execute(index_def)
+            for name, definition in foreign_keys:
+                cursor.execute(f"ALTER TABLE {TABLE} ADD CONSTRAINT {name} {definition}")
+
+        self.stdout.write(self.style.SUCCESS(f"Converted {TABLE} to monthly partitions."))
+
+    @transaction.atomic
+    def create_partition(self, start):
+        name = partition_name(start)
+        end = month_start(start, 1)
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT to_regclass(%s)", [name])
+            if cursor.fetchone()[0] is not None:
+                return
+            # Rows that were written before the partition existed sit in the
+            # default partition; move them so the new range can be attached.
+            cursor.execute(f"CREATE TABLE {name} (LIKE {TABLE} INCLUDING DEFAULTS)")
+            cursor.execute(
+                f"WITH moved AS (DELETE FROM {TABLE}_default "
+                f"WHERE timestamp >= %s AND timestamp < %s RETURNING *) "
+                f"INSERT INTO {name} SELECT * FROM moved",
+                [start, end],
+            )
+            cursor.execute(
+                f"ALTER TABLE {TABLE} ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)",
+                [start, end],
+            )
+        self.stdout.write(f"Created partition {name}.")
+
+    @transaction.atomic
+    def detach_before(self, cutoff, archive):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT c.relname FROM pg_inherits i "
+                "JOIN pg_class c ON c.oid = i.inhrelid "
+                "WHERE i.inhparent = to_regclass(%s) ORDER BY c.relname",
+                [TABLE],
+            )
+            partitions = [row[0] for row in cursor.fetchall()]
+            if archive == "schema":
+                cursor.execute(f"CREATE SCHEMA IF NOT EXISTS {ARCHIVE_SCHEMA}")
+            for name in partitions:
+                if name == f"{TABLE}_default":
+                    continue
+                year, month = name.rsplit("_p", 1)[1].split("_")
+                if month_start(date(int(year), int(month), 1), 1) > cutoff:
+                    continue
+                cursor.execute(f"ALTER TABLE {TABLE} DETACH PARTITION {name}")
+                if archive == "drop":
+                    cursor.execute(f"DROP TABLE {name}")
+                    self.stdout.write(f"Dropped partition {name}.")
+                else:
+                    cursor.execute(f"ALTER TABLE {name} SET SCHEMA {ARCHIVE_SCHEMA}")
+                    self.stdout.write(f"Archived partition {name} to {ARCHIVE_SCHEMA}.{name}.")
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from glucose_tracker.utils.uploads import purge_expired
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete resumable photo uploads started more than PHOTO_UPLOAD_EXPIRY_HOURS "
+        "ago, with their partial files. Starting an upload only clears the same "
+        "user's expired ones, so run this periodically, e.g. daily from cron."
+    )
+
+    def handle(self, *args, **options):
+        count = purge_expired()
+        self.stdout.write(self.style.SUCCESS(f"Deleted {count} expired uploads."))
@@ -0,0 +1,277 @@
+import asyncio
+import json
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, time as dt_time
+from pathlib import Path
+
+import django
+import httpx
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Q
+from django.utils import timezone
+
+from glucose_tracker.models import Meal
+from glucose_tracker.utils.ai_analyzer import (
+    OPENAI_TIMEOUT, _encode_image, aanalyze_encoded_image, apply_meal_analysis,
+)
+from glucose_tracker.utils.food_index import complete_analysis
+
+UPDATE_FIELDS = ["description", "estimated_calories", "carbs_estimate", "ai_response_raw", "updated_at"]
+
+
+def prepare_photo(name):
+    """Process pool worker: the photo resized and base64-encoded, or None if missing."""
+    try:
+        with default_storage.open(name, "rb") as photo:
+            return _encode_image(photo)
+    except OSError:
+        return None
+
+
+class TokenBucket:
+    """Allow ``rate`` calls per second on average, in bursts of up to ``capacity``."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        # Waiters queue on the lock, so tokens are handed out in order
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class Checkpoint:
+    """
+    Progress saved as the highest meal id below which every meal has been
+    written, so a restarted run skips only work that reached the database.
+    """
+
+    def __init__(self, path, filters):
+        self.path = Path(path) if path else None
+        self.filters = filters
+        self.last_id = 0
+        self.in_flight = deque()
+        self.finished = set()
+
+    def load(self):
+        if not self.path or not self.path.exists():
+            return
+        state = json.loads(self.path.read_text())
+        if state["filters"] != self.filters:
+            raise CommandError(
+                f"{self.path} was written for other filters ({state['filters']}); "
+                "pass --restart to discard it."
+            )
+        self.last_id = state["last_id"]
+
+    def started(self, meal_id):
+        self.in_flight.append(meal_id)
+
+    def flushed(self, meal_ids):
+        self.finished.update(meal_ids)
+        while self.in_flight and self.in_flight[0] in self.finished:
+            self.last_id = self.in_flight.popleft()
+            self.finished.discard(self.last_id)
+        if self.path:
+            state = {"filters": self.filters, "last_id": self.last_id}
+            tmp = self.path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(state))
+            os.replace(tmp, self.path)
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-run the AI analysis on existing meal photos, e.g. after a prompt change "
+        "or for meals whose analysis failed. Photos are resized in a process pool, "
+        "API calls run concurrently under a rate limit and results are saved in "
+        "batches. With --checkpoint an interrupted run resumes where it stopped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", action="append", default=[], help="Username to include (repeatable).")
+        parser.add_argument(
+            "--since", type=self.parse_date, help="Only meals on or after this day, YYYY-MM-DD."
+        )
+        parser.add_argument(
+            "--until", type=self.parse_date, help="Only meals on or before this day, YYYY-MM-DD."
+        )
+        parser.add_argument(
+            "--failed-only",
+            action="store_true",
+            help="Only meals without an analysis (no AI response or empty description).",
+        )
+        parser.add_argument("--limit", type=int, help="Process at most this many meals.")
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count(),
+            help="Image preprocessing processes (default: CPU count; 0 resizes in threads).",
+        )
+        parser.add_argument(
+            "--concurrency", type=int, default=8, help="Meals in flight at once (default: 8)."
+        )
+        parser.add_argument(
+            "--rate", type=float, default=5.0, help="Average API requests per second (default: 5)."
+        )
+        parser.add_argument(
+            "--burst", type=int, default=None, help="Requests allowed in a burst (default: same as --concurrency)."
+        )
+        parser.add_argument("--batch-size", type=int, default=100, help="Meals per bulk_update (default: 100).")
+        parser.add_argument("--checkpoint", help="JSON file recording progress, to resume an interrupted run.")
+        parser.add_argument("--restart", action="store_true", help="Ignore an existing checkpoint file.")
+        parser.add_argument("--dry-run", action="store_true", help="Only count the meals that would be processed.")
+
+    @staticmethod
+    def parse_date(value):
+        return datetime.strptime(value, "%Y-%m-%d").date()
+
+    def handle(self, *args, **options):
+        if not settings.OPENAI_API_KEY and not options["dry_run"]:
+            raise CommandError("OPENAI_API_KEY is not configured.")
+
+        filters = {
+            "users": sorted(options["user"]),
+            "since": options["since"] and options["since"].isoformat(),
+            "until": options["until"] and options["until"].isoformat(),
+            "failed_only": options["failed_only"],
+        }
+        checkpoint = Checkpoint(options["checkpoint"], filters)
+        if not options["restart"]:
+            checkpoint.load()
+
+        meals = self.select_meals(options).filter(id__gt=checkpoint.last_id)
+        # The owner's language, so local estimates match the ones add_meal gives
+        meals = meals.order_by("id").values_list("id", "photo", "user__profile__language_preference")
+        if options["limit"]:
+            meals = meals[: options["limit"]]
+        meals = list(meals)
+        if checkpoint.last_id:
+            self.stdout.write(f"Resuming after meal {checkpoint.last_id}.")
+        self.stdout.write(f"{len(meals)} meals to analyze.")
+        if options["dry_run"] or not meals:
+            return
+
+        self.counts = {"updated": 0, "failed": 0, "missing": 0}
+        started = time.monotonic()
+        asyncio.run(self.pipeline(meals, checkpoint, options))
+        self.report(len(meals), time.monotonic() - started, final=True)
+
+    def select_meals(self, options):
+        meals = Meal.objects.exclude(photo="")
+        if options["user"]:
+            users = list(User.objects.filter(username__in=options["user"]).values_list("id", flat=True))
+            if len(users) != len(set(options["user"])):
+                raise CommandError("Unknown user in --user.")
+            meals = meals.filter(user_id__in=users)
+        if options["since"]:
+            meals = meals.filter(timestamp__gte=timezone.make_aware(datetime.combine(options["since"], dt_time.min)))
+        if options["until"]:
+            meals = meals.filter(timestamp__lte=timezone.make_aware(datetime.combine(options["until"], dt_time.max)))
+        if options["failed_only"]:
+            meals = meals.filter(Q(ai_response_raw__isnull=True) | Q(description="") | Q(description__isnull=True))
+        return meals
+
+    async def pipeline(self, meals, checkpoint, options):
+        loop = asyncio.get_running_loop()
+        bucket = TokenBucket(options["rate"], options["burst"] or options["concurrency"])
+        slots = asyncio.Semaphore(options["concurrency"])
+        pending = []  # Analyzed meals not yet written
+        done = []  # Their ids, plus meals that produced no update
+        write_lock = asyncio.Lock()
+        last_report = time.monotonic()
+        started = time.monotonic()
+        processed = 0
+
+        async def flush():
+            nonlocal pending, done
+            async with write_lock:
+                batch, ids = pending, done
+                pending, done = [], []
+                if batch:
+                    now = timezone.now()
+                    for meal in batch:
+                        # bulk_update skips auto_now; sync clients rely on updated_at
+                        meal.updated_at = now
+                    await sync_to_async(Meal.objects.bulk_update)(batch, UPDATE_FIELDS)
+                self.counts["updated"] += len(batch)
+                checkpoint.flushed(ids)
+
+        async def process(client, pool, meal_id, photo, language):
+            nonlocal processed, last_report
+            try:
+                encoded = await loop.run_in_executor(pool, prepare_photo, photo)
+                if encoded is None:
+                    self.counts["missing"] += 1
+                else:
+                    await bucket.acquire()
+                    analysis = complete_analysis(await aanalyze_encoded_image(encoded, client), language)
+                    meal = Meal(id=meal_id)
+                    if apply_meal_analysis(meal, analysis):
+                        pending.append(meal)
+                    else:
+                        self.counts["failed"] += 1
+                done.append(meal_id)
+                processed += 1
+                if len(pending) >= options["batch_size"]:
+                    await flush()
+                if time.monotonic() - last_report >= 10:
+                    last_report = time.monotonic()
+                    self.report(processed, last_report - started)
+            finally:
+                slots.release()
+
+        # Spawned workers: forking after the event loop and its threads have
+        # started is unsafe. --workers 0 resizes in threads instead.
+        pool = None
+        if options["workers"]:
+            pool = ProcessPoolExecutor(
+                options["workers"], mp_context=multiprocessing.get_context("spawn"), initializer=django.setup
+            )
+        limits = httpx.Limits(max_connections=options["concurrency"])
+        tasks = set()
+        try:
+            async with httpx.AsyncClient(timeout=OPENAI_TIMEOUT, limits=limits) as client:
+                for meal_id, photo, language in meals:
+                    await slots.acquire()
+                    checkpoint.started(meal_id)
+                    task = asyncio.create_task(
+                        process(client, pool, meal_id, photo, language or settings.LANGUAGE_CODE)
+                    )
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                await asyncio.gather(*tasks)
+        finally:
+            if pool:
+                pool.shutdown(cancel_futures=True)
+            # Also on Ctrl-C: analyses already paid for are kept
+            await flush()
+            await sync_to_async(connections.close_all)()
+
+    def report(self, processed, elapsed, final=False):
+        counts = self.counts
+        rate = processed / elapsed if elapsed else 0.0
+        message = (
+            f"{processed} meals in {elapsed:.1f}s ({rate:.1f}/s): {counts['updated']} updated, "
+            f"{counts['failed']} failed, {counts['missing']} photos missing"
+        )
+        self.stdout.write(self.style.SUCCESS(message) if final else message)
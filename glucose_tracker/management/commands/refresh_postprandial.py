@@ -0,0 +1,38 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from glucose_tracker.models import Meal
+from glucose_tracker.utils.postprandial import refresh_responses
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the glucose response (peak rise, time to peak, 2h AUC) of every "
+        "meal. Saving readings and meals keeps them current; run this once after "
+        "upgrading, and after bulk imports that bypass model signals."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", action="append", default=[], help="Username to include (repeatable).")
+
+    def handle(self, *args, **options):
+        users = Meal.objects.values_list("user_id", flat=True).distinct().order_by("user_id")
+        if options["user"]:
+            ids = list(User.objects.filter(username__in=options["user"]).values_list("id", flat=True))
+            if len(ids) != len(set(options["user"])):
+                raise CommandError("Unknown user in --user.")
+            users = users.filter(user_id__in=ids)
+
+        started = time.perf_counter()
+        counts = {"users": 0, "changed": 0}
+        for user_id in users:
+            counts["users"] += 1
+            counts["changed"] += refresh_responses(user_id)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Refreshed meals of {counts['users']} users in {elapsed:.1f}s: {counts['changed']} changed."
+            )
+        )
@@ -0,0 +1,256 @@
+import io
+import time
+from datetime import datetime, time as dt_time, timedelta, timezone as dt_timezone
+
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from glucose_tracker.models import GlucoseReading, Meal, MeasurementSchedule, UserProfile
+from glucose_tracker.utils.charts import bump_version
+from glucose_tracker.utils.postprandial import refresh_responses
+
+# meal type, mean time of day (hours), jitter (hours), mean carbs (g), probability
+MEAL_PLAN = [
+    ("breakfast", 7.5, 0.75, 45, 0.9),
+    ("lunch", 13.0, 0.75, 70, 0.95),
+    ("snack", 16.5, 1.0, 25, 0.4),
+    ("dinner", 20.0, 0.75, 75, 0.95),
+]
+
+DESCRIPTIONS = {
+    "breakfast": ["Cappuccino e cornetto", "Yogurt with granola", "Toast and jam", "Oatmeal with fruit"],
+    "lunch": ["Pasta al pomodoro", "Chicken salad", "Risotto ai funghi", "Pizza margherita"],
+    "snack": ["Apple", "Crackers", "Fruit juice", "Dark chocolate"],
+    "dinner": ["Grilled fish and vegetables", "Lasagna", "Soup and bread", "Steak with potatoes"],
+}
+
+PHOTO_NAME = "meals/synthetic/placeholder.jpg"
+
+
+def glucose_response_kernel(step_minutes):
+    """Gamma-shaped rise per gram of carbs: peaks after ~50 min, gone after ~4 h."""
+    t = np.arange(0, 240, step_minutes, dtype=np.float64)
+    kernel = (t / 50.0) ** 2 * np.exp(2 * (1 - t / 50.0))
+    return kernel / kernel.max()
+
+
+def measurement_types(minutes_of_day, minutes_since_meal, last_meal_type, next_meal_type):
+    """Label each sample the way a user would log it, vectorized."""
+    hours = minutes_of_day / 60.0
+    labels = np.where(hours < 5, "night", np.where(hours < 7, "fasting", ""))
+    post = (labels == "") & (minutes_since_meal <= 150) & (last_meal_type != "")
+    labels = np.where(post, np.char.add("post_", last_meal_type), labels)
+    labels = np.where((labels == "") & (hours >= 21), "bedtime", labels)
+    pre = (labels == "") & (next_meal_type != "")
+    labels = np.where(pre, np.char.add("pre_", next_meal_type), labels)
+    return np.where(labels == "", "fasting", labels)
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate synthetic users with years of 5-minute CGM readings, meals that "
+        "drive the glucose curve and measurement schedules, for scale testing. "
+        "Output is deterministic for a given --seed and --end-date."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=10, help="Number of users (default: 10).")
+        parser.add_argument("--days", type=int, default=365, help="History length in days (default: 365).")
+        parser.add_argument("--interval", type=int, default=5, help="Minutes between readings (default: 5).")
+        parser.add_argument("--seed", type=int, default=0, help="Random seed (default: 0).")
+        parser.add_argument(
+            "--end-date",
+            type=lambda value: datetime.strptime(value, "%Y-%m-%d").date(),
+            default=None,
+            help="Last day of generated history, YYYY-MM-DD (default: today, UTC).",
+        )
+        parser.add_argument("--prefix", default="synthetic_", help="Username prefix (default: synthetic_).")
+        parser.add_argument("--batch-size", type=int, default=20000, help="Rows per insert batch.")
+        parser.add_argument(
+            "--replace", action="store_true", help="Delete existing users with the same prefix first."
+        )
+
+    def handle(self, *args, **options):
+        prefix = options["prefix"]
+        existing = User.objects.filter(username__startswith=prefix)
+        if existing.exists():
+            if not options["replace"]:
+                raise CommandError(f"Users starting with '{prefix}' exist; use --replace or another --prefix.")
+            # Drop the history in bulk first: with the sync tombstone signals
+            # connected, the user cascade would otherwise load every row.
+            user_ids = list(existing.values_list("pk", flat=True))
+            placeholders = ", ".join(["%s"] * len(user_ids))
+            with connection.cursor() as cursor:
+                for model in (GlucoseReading, Meal):
+                    table = connection.ops.quote_name(model._meta.db_table)
+                    cursor.execute(f"DELETE FROM {table} WHERE user_id IN ({placeholders})", user_ids)
+            existing.delete()
+
+        end_date = options["end_date"] or timezone.now().date()
+        start = datetime.combine(
+            end_date - timedelta(days=options["days"] - 1), dt_time.min, tzinfo=dt_timezone.utc
+        )
+        photo = self.placeholder_photo()
+
+        totals = {"readings": 0, "meals": 0}
+        started = time.perf_counter()
+        for index in range(options["users"]):
+            rng = np.random.default_rng([options["seed"], index])
+            with transaction.atomic():
+                user = self.create_user(f"{prefix}{index}", rng)
+                meals = self.create_meals(user, rng, start, options, photo)
+                readings = self.create_readings(user, rng, start, meals, options)
+                # Rows were bulk inserted, so no signal computed the responses
+                # or invalidated cached charts
+                refresh_responses(user.id)
+                bump_version(user.id)
+            totals["readings"] += readings
+            totals["meals"] += len(meals)
+            self.stdout.write(f"{user.username}: {readings} readings, {len(meals)} meals")
+
+        elapsed = time.perf_counter() - started
+        rows = totals["readings"] + totals["meals"]
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Created {options['users']} users, {totals['readings']} readings and "
+                f"{totals['meals']} meals in {elapsed:.1f}s ({rows / elapsed:,.0f} rows/s)."
+            )
+        )
+
+    def placeholder_photo(self):
+        """All synthetic meals share one small JPEG so rows have a real photo."""
+        if not default_storage.exists(PHOTO_NAME):
+            from PIL import Image
+
+            buffer = io.BytesIO()
+            Image.new("RGB", (320, 240), (200, 120, 60)).save(buffer, "JPEG")
+            default_storage.save(PHOTO_NAME, ContentFile(buffer.getvalue()))
+        return PHOTO_NAME
+
+    def create_user(self, username, rng):
+        user = User(username=username)
+        user.set_unusable_password()
+        user.save()
+        target_min = int(rng.integers(65, 80))
+        UserProfile.objects.create(
+            user=user,
+            target_glucose_min=target_min,
+            target_glucose_max=int(rng.integers(160, 190)),
+            language_preference=str(rng.choice(["it", "en"])),
+        )
+        slots = [f.name for f in MeasurementSchedule._meta.fields if isinstance(f.default, bool)]
+        MeasurementSchedule.objects.create(
+            user=user, **{slot: bool(on) for slot, on in zip(slots, rng.random(len(slots)) < 0.3)}
+        )
+        return user
+
+    def create_meals(self, user, rng, start, options, photo):
+        """Return (minute offset, meal type, carbs) triples after inserting the meals."""
+        days = options["days"]
+        offsets, types, carbs = [], [], []
+        for meal_type, hour, jitter, mean_carbs, probability in MEAL_PLAN:
+            eaten = rng.random(days) < probability
+            minutes = (np.arange(days) * 1440 + (hour + rng.normal(0, jitter, days)) * 60)[eaten]
+            offsets.append(minutes.astype(np.int64))
+            types.append(np.full(eaten.sum(), meal_type))
+            carbs.append(rng.lognormal(np.log(mean_carbs), 0.35, eaten.sum()))
+        offsets = np.concatenate(offsets)
+        order = np.argsort(offsets)
+        offsets, types, carbs = offsets[order], np.concatenate(types)[order], np.concatenate(carbs)[order]
+
+        descriptions = {t: rng.choice(DESCRIPTIONS[t], len(offsets)) for t in DESCRIPTIONS}
+        calories = carbs * 4 + rng.normal(250, 80, len(offsets))
+        meals = [
+            Meal(
+                user=user,
+                timestamp=start + timedelta(minutes=int(offset)),
+                meal_type=meal_type,
+                description=descriptions[meal_type][i],
+                photo=photo,
+                estimated_calories=int(max(calories[i], 50)),
+                carbs_estimate=round(float(carbs[i]), 1),
+            )
+            for i, (offset, meal_type) in enumerate(zip(offsets, types))
+        ]
+        Meal.objects.bulk_create(meals, batch_size=options["batch_size"])
+        return list(zip(offsets, types, carbs))
+
+    def create_readings(self, user, rng, start, meals, options):
+        step = options["interval"]
+        minutes = np.arange(0, options["days"] * 1440, step, dtype=np.int64)
+        n = len(minutes)
+
+        # Baseline with a dawn-phenomenon bump and slow AR(1) drift, the latter
+        # as a convolution with a truncated geometric kernel so it stays vectorized
+        baseline = rng.normal(115, 12)
+        circadian = 12 * np.sin(2 * np.pi * (minutes % 1440 - 5 * 60) / 1440)
+        drift = np.convolve(rng.normal(0, 2.5, n), 0.98 ** np.arange(300))[:n]
+
+        # Meal impulses convolved with the carb response kernel
+        meal_offsets = np.array([m[0] for m in meals], dtype=np.int64)
+        carbs = np.array([m[2] for m in meals], dtype=np.float64)
+        impulses = np.zeros(n)
+        sensitivity = rng.uniform(0.8, 1.8)  # mg/dL per gram at peak
+        np.add.at(impulses, np.clip(meal_offsets // step, 0, n - 1), carbs * sensitivity)
+        response = np.convolve(impulses, glucose_response_kernel(step))[:n]
+
+        levels = np.clip(baseline + circadian + drift + response, 40, 400).round().astype(np.int64)
+        types = self.label_readings(minutes, meals)
+
+        # Model instances and per-field prep dominate bulk_create at this volume,
+        # so readings bypass the ORM: COPY on PostgreSQL, executemany elsewhere.
+        # Columns are named from the model, so only the field values below
+        # need to follow it. Naive UTC is what Django hands the driver when
+        # USE_TZ is on.
+        naive_start = np.datetime64(start.replace(tzinfo=None), "us")
+        saved_at = timezone.now().replace(tzinfo=None)
+        rows = zip(
+            [user.pk] * n,
+            (naive_start + minutes.astype("timedelta64[m]")).tolist(),
+            levels.tolist(),
+            types.tolist(),
+            [saved_at] * n,
+            [saved_at] * n,
+        )
+        quote = connection.ops.quote_name
+        table = quote(GlucoseReading._meta.db_table)
+        fields = ("user", "timestamp", "glucose_level", "measurement_type", "updated_at", "created_at")
+        columns = ", ".join(quote(GlucoseReading._meta.get_field(name).column) for name in fields)
+
+        with connection.cursor() as cursor:
+            if connection.vendor == "postgresql":
+                with cursor.copy(f"COPY {table} ({columns}) FROM STDIN") as copy:
+                    for row in rows:
+                        copy.write_row(row)
+                return n
+
+            adapt = connection.ops.adapt_datetimefield_value
+            sql = f"INSERT INTO {table} ({columns}) VALUES (%s, %s, %s, %s, %s, %s)"
+            saved_at = adapt(saved_at)
+            rows = [(pk, adapt(stamp), level, kind, saved_at, saved_at) for pk, stamp, level, kind, _, _ in rows]
+            batch = options["batch_size"]
+            for offset in range(0, n, batch):
+                cursor.executemany(sql, rows[offset:offset + batch])
+        return n
+
+    def label_readings(self, minutes, meals):
+        """Tag samples pre_/post_ the surrounding main meal, falling back to the hour."""
+        main = [(offset, meal_type) for offset, meal_type, _ in meals if meal_type != "snack"]
+        if not main:
+            return measurement_types(minutes % 1440, np.full(len(minutes), np.inf), "", "")
+        offsets = np.array([offset for offset, _ in main], dtype=np.int64)
+        kinds = np.array([meal_type for _, meal_type in main])
+
+        last = np.searchsorted(offsets, minutes, side="right") - 1
+        previous = np.maximum(last, 0)
+        since_meal = np.where(last >= 0, minutes - offsets[previous], np.inf)
+        last_type = np.where(last >= 0, kinds[previous], "")
+        following = np.minimum(last + 1, len(offsets) - 1)
+        upcoming = last + 1 < len(offsets)
+        next_type = np.where(upcoming, kinds[following], "")
+        return measurement_types(minutes % 1440, since_meal, last_type, next_type)
@@ -0,0 +1,132 @@
+"""
+Prometheus metrics for views, the meal analyzer, exports and PDF reports.
+
+With several gunicorn/uvicorn workers set PROMETHEUS_MULTIPROC_DIR to an empty
+directory before the server starts: each worker then writes its samples to
+mmap'd files there and the metrics view sums them, so a scrape sees the whole
+server rather than whichever worker answered it.
+"""
+import os
+import time
+from functools import lru_cache
+from types import SimpleNamespace
+
+from django.conf import settings
+
+from .utils.lazy import lazy_import
+
+prometheus_client = lazy_import("prometheus_client")
+prometheus_multiprocess = lazy_import("prometheus_client.multiprocess")
+
+
+@lru_cache(maxsize=None)
+def _metrics():
+    """
+    The collectors, registered on first use. With METRICS_ENABLED off
+    nothing is recorded and prometheus_client is never imported.
+    """
+    Counter, Histogram = prometheus_client.Counter, prometheus_client.Histogram
+    return SimpleNamespace(
+        view_latency=Histogram(
+            "glucosnap_view_duration_seconds",
+            "Time to produce a response, by URL name.",
+            ["view", "method", "status"],
+            buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+        ),
+        db_queries=Histogram(
+            "glucosnap_db_queries_per_request",
+            "SQL statements executed per request, by URL name.",
+            ["view"],
+            buckets=(0, 1, 2, 5, 10, 20, 50, 100, 250, 1000),
+        ),
+        ai_latency=Histogram(
+            "glucosnap_ai_analyzer_duration_seconds",
+            "Time spent analyzing meal photos per request.",
+            buckets=(0.25, 0.5, 1, 2, 5, 10, 20, 30, 60),
+        ),
+        ai_errors=Counter(
+            "glucosnap_ai_analyzer_errors",
+            "Failed meal photo analyses, by error class.",
+            ["error"],
+        ),
+        export_duration=Histogram(
+            "glucosnap_export_duration_seconds",
+            "Time to build and send a data export, by format.",
+            ["format"],
+            buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+        ),
+        export_bytes=Histogram(
+            "glucosnap_export_bytes",
+            "Size of data exports, by format.",
+            ["format"],
+            buckets=(1e3, 1e4, 1e5, 1e6, 1e7, 1e8, 1e9),
+        ),
+        pdf_duration=Histogram(
+            "glucosnap_pdf_render_duration_seconds",
+            "Time to render a PDF report.",
+            buckets=(0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60),
+        ),
+    )
+
+
+def record_ai_error(error_class):
+    if settings.METRICS_ENABLED:
+        _metrics().ai_errors.labels(error_class).inc()
+
+
+def observe_request(view, method, status, elapsed, timings):
+    metrics = _metrics()
+    metrics.view_latency.labels(view, method, status).observe(elapsed)
+    metrics.db_queries.labels(view).observe(timings.query_count)
+    if timings.durations["ai"]:
+        metrics.ai_latency.observe(timings.durations["ai"])
+    if timings.durations["pdf"]:
+        metrics.pdf_duration.observe(timings.durations["pdf"])
+
+
+def observe_export(format_type, response, started):
+    """Record an export; streamed bodies are measured as they are sent."""
+    if not settings.METRICS_ENABLED:
+        return response
+    metrics = _metrics()
+    if not response.streaming:
+        metrics.export_bytes.labels(format_type).observe(len(response.content))
+        metrics.export_duration.labels(format_type).observe(time.perf_counter() - started)
+        return response
+
+    def observe(size):
+        metrics.export_bytes.labels(format_type).observe(size)
+        metrics.export_duration.labels(format_type).observe(time.perf_counter() - started)
+
+    def counted(chunks):
+        size = 0
+        try:
+            for chunk in chunks:
+                size += len(chunk)
+                yield chunk
+        finally:
+            observe(size)
+
+    async def acounted(chunks):
+        size = 0
+        try:
+            async for chunk in chunks:
+                size += len(chunk)
+                yield chunk
+        finally:
+            observe(size)
+
+    content = response.streaming_content
+    response.streaming_content = acounted(content) if response.is_async else counted(content)
+    return response
+
+
+def exposition():
+    """Return the metrics page body and content type."""
+    _metrics()
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = prometheus_client.CollectorRegistry()
+        prometheus_multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = prometheus_client.REGISTRY
+    return prometheus_client.generate_latest(registry), prometheus_client.CONTENT_TYPE_LATEST
@@ -1,7 +1,16 @@
+import json
+import logging
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
 from django.utils import translation
 from django.utils.deprecation import MiddlewareMixin
+from . import instrumentation, metrics
 from .models import UserProfile
 
+slow_request_logger = logging.getLogger("glucose_tracker.performance")
+
 class LanguagePreferenceMiddleware(MiddlewareMixin):
     """
     Middleware that sets the user's preferred language from their profile.
@@ -17,4 +26,118 @@ class LanguagePreferenceMiddleware(MiddlewareMixin):
                     translation.activate(user_profile.language_preference)
                     request.LANGUAGE_CODE = user_profile.language_preference
             except UserProfile.DoesNotExist:
-                pass
\ No newline at end of file
+                pass
+
+class PerformanceInstrumentationMiddleware:
+    """
+    Times each request's SQL, template rendering, meal analysis and PDF
+    generation, reports them in a Server-Timing header and logs requests
+    slower than SLOW_REQUEST_THRESHOLD_MS as a JSON line with their most
+    expensive queries. Streamed bodies count towards the log but not the
+    header, which is sent before them. Removed from the stack unless
+    PERF_INSTRUMENTATION is on.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.PERF_INSTRUMENTATION:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        token = instrumentation.start()
+        try:
+            response = self.get_response(request)
+            return self.finish(request, response, instrumentation.current())
+        finally:
+            instrumentation.stop(token)
+
+    async def __acall__(self, request):
+        token = instrumentation.start()
+        try:
+            response = await self.get_response(request)
+            return self.finish(request, response, instrumentation.current())
+        finally:
+            instrumentation.stop(token)
+
+    def finish(self, request, response, timings):
+        # Headers go out before a streamed body is produced, so for streamed
+        # responses the header covers the view alone; the slow request log
+        # waits for the body and covers all of it.
+        response["Server-Timing"] = timings.server_timing(timings.elapsed())
+        if response.streaming:
+            instrumentation.follow_stream(response, timings, lambda: self.log_if_slow(request, response, timings))
+        else:
+            self.log_if_slow(request, response, timings)
+        return response
+
+    def log_if_slow(self, request, response, timings):
+        elapsed = timings.elapsed()
+        if elapsed * 1000 < settings.SLOW_REQUEST_THRESHOLD_MS:
+            return
+        match = request.resolver_match
+        slow_request_logger.warning(
+            json.dumps(
+                {
+                    "event": "slow_request",
+                    "method": request.method,
+                    "path": request.path,
+                    "view": match.view_name if match else None,
+                    "status": response.status_code,
+                    "total_ms": round(elapsed * 1000, 1),
+                    **{f"{metric}_ms": round(seconds * 1000, 1) for metric, seconds in timings.durations.items()},
+                    "queries": timings.query_count,
+                    "top_queries": timings.top_queries(settings.SLOW_REQUEST_TOP_QUERIES),
+                }
+            )
+        )
+
+
+class MetricsMiddleware:
+    """
+    Feeds view latency, query counts and analyzer/PDF time into the
+    Prometheus metrics. Removed from the stack unless METRICS_ENABLED is on.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        token = instrumentation.start()
+        try:
+            response = self.get_response(request)
+            self.observe(request, response, instrumentation.current())
+            return response
+        finally:
+            instrumentation.stop(token)
+
+    async def __acall__(self, request):
+        token = instrumentation.start()
+        try:
+            response = await self.get_response(request)
+            self.observe(request, response, instrumentation.current())
+            return response
+        finally:
+            instrumentation.stop(token)
+
+    def observe(self, request, response, timings):
+        match = request.resolver_match
+        view = match.view_name if match else "unmatched"
+        metrics.observe_request(view, request.method, response.status_code, timings.elapsed(), timings)
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:14
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("glucose_tracker", "0002_measurementschedule"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="glucosereading",
+            index=models.Index(
+                fields=["user", "-timestamp"], name="glucose_reading_user_ts_idx"
+            ),
+        ),
+    ]
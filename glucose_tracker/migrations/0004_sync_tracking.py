@@ -0,0 +1,96 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:34
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("glucose_tracker", "0003_glucosereading_user_timestamp_index"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DeletedRecord",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "model",
+                    models.CharField(
+                        choices=[("reading", "Glucose Reading"), ("meal", "Meal")],
+                        max_length=10,
+                        verbose_name="Model",
+                    ),
+                ),
+                ("object_id", models.BigIntegerField(verbose_name="Object ID")),
+                (
+                    "deleted_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="Deleted At"),
+                ),
+            ],
+            options={
+                "verbose_name": "Deleted Record",
+                "verbose_name_plural": "Deleted Records",
+            },
+        ),
+        migrations.AddField(
+            model_name="glucosereading",
+            name="updated_at",
+            field=models.DateTimeField(
+                auto_now=True,
+                default=django.utils.timezone.now,
+                verbose_name="Updated At",
+            ),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name="meal",
+            name="updated_at",
+            field=models.DateTimeField(
+                auto_now=True,
+                default=django.utils.timezone.now,
+                verbose_name="Updated At",
+            ),
+            preserve_default=False,
+        ),
+        migrations.AddIndex(
+            model_name="glucosereading",
+            index=models.Index(
+                fields=["user", "updated_at"], name="glucose_reading_user_upd_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="meal",
+            index=models.Index(
+                fields=["user", "updated_at"], name="meal_user_updated_idx"
+            ),
+        ),
+        migrations.AddField(
+            model_name="deletedrecord",
+            name="user",
+            field=models.ForeignKey(
+                db_constraint=False,
+                on_delete=django.db.models.deletion.DO_NOTHING,
+                related_name="+",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="deletedrecord",
+            index=models.Index(
+                fields=["user", "id"], name="deleted_record_user_id_idx"
+            ),
+        ),
+    ]
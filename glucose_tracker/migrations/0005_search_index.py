@@ -0,0 +1,24 @@
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    from glucose_tracker.utils import search
+
+    search.install(schema_editor.connection)
+
+
+def drop_search_index(apps, schema_editor):
+    from glucose_tracker.utils import search
+
+    search.uninstall(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("glucose_tracker", "0004_sync_tracking"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("glucose_tracker", "0005_search_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="meal",
+            name="glucose_auc_2h",
+            field=models.FloatField(
+                blank=True, null=True, verbose_name="2h Incremental AUC (mg/dL x min)"
+            ),
+        ),
+        migrations.AddField(
+            model_name="meal",
+            name="glucose_baseline",
+            field=models.IntegerField(
+                blank=True, null=True, verbose_name="Baseline Glucose (mg/dL)"
+            ),
+        ),
+        migrations.AddField(
+            model_name="meal",
+            name="glucose_peak_rise",
+            field=models.IntegerField(
+                blank=True, null=True, verbose_name="Peak Rise (mg/dL)"
+            ),
+        ),
+        migrations.AddField(
+            model_name="meal",
+            name="glucose_time_to_peak",
+            field=models.IntegerField(
+                blank=True, null=True, verbose_name="Time to Peak (min)"
+            ),
+        ),
+    ]
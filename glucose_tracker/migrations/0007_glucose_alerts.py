@@ -0,0 +1,112 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:25
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auth", "0012_alter_user_first_name_max_length"),
+        ("glucose_tracker", "0006_meal_glucose_response"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AlertState",
+            fields=[
+                (
+                    "user",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="alert_state",
+                        serialize=False,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                ("last_timestamp", models.DateTimeField(null=True)),
+                ("last_level", models.IntegerField(null=True)),
+                ("zone", models.SmallIntegerField(default=0)),
+                ("changing_fast", models.BooleanField(default=False)),
+                ("high_since", models.DateTimeField(null=True)),
+                ("high_alerted", models.BooleanField(default=False)),
+                ("schedule_day", models.DateField(null=True)),
+                ("logged_slots", models.SmallIntegerField(default=0)),
+                ("alerted_slots", models.SmallIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="GlucoseAlert",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "rule",
+                    models.CharField(
+                        choices=[
+                            ("below_target", "Below target"),
+                            ("above_target", "Above target"),
+                            ("rising_fast", "Rising fast"),
+                            ("falling_fast", "Falling fast"),
+                            ("prolonged_high", "Prolonged high"),
+                            ("missed_measurement", "Missed measurement"),
+                        ],
+                        max_length=20,
+                        verbose_name="Rule",
+                    ),
+                ),
+                ("timestamp", models.DateTimeField(verbose_name="Timestamp")),
+                (
+                    "glucose_level",
+                    models.IntegerField(verbose_name="Glucose Level (mg/dL)"),
+                ),
+                (
+                    "detail",
+                    models.CharField(blank=True, max_length=20, verbose_name="Detail"),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="Created At"),
+                ),
+                (
+                    "reading",
+                    models.ForeignKey(
+                        blank=True,
+                        db_constraint=False,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="alerts",
+                        to="glucose_tracker.glucosereading",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="glucose_alerts",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Glucose Alert",
+                "verbose_name_plural": "Glucose Alerts",
+                "ordering": ["-timestamp"],
+                "indexes": [
+                    models.Index(
+                        fields=["user", "-timestamp"], name="glucose_alert_user_ts_idx"
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:48
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("glucose_tracker", "0007_glucose_alerts"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PhotoUpload",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ("filename", models.CharField(max_length=255, verbose_name="Filename")),
+                ("length", models.PositiveBigIntegerField(verbose_name="Length")),
+                (
+                    "offset",
+                    models.PositiveBigIntegerField(default=0, verbose_name="Offset"),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="Created At"),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="photo_uploads",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Photo Upload",
+                "verbose_name_plural": "Photo Uploads",
+            },
+        ),
+    ]
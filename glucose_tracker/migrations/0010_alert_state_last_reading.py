@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 19:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("glucose_tracker", "0009_care_assignment"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="alertstate",
+            name="last_reading_id",
+            field=models.BigIntegerField(null=True),
+        ),
+    ]
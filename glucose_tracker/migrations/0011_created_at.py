@@ -0,0 +1,59 @@
+# Generated by Django 5.2.18 on 2026-10-19 19:27
+
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+from django.db.models.functions import Least
+
+
+def backfill_created_at(apps, schema_editor):
+    # The closest record of when existing rows arrived: their own time, or
+    # their last change if that came first (updated_at alone may have been
+    # bumped by refresh_postprandial or reanalyze_meals)
+    for name in ("GlucoseReading", "Meal"):
+        apps.get_model("glucose_tracker", name).objects.update(created_at=Least(F("timestamp"), F("updated_at")))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("glucose_tracker", "0010_alert_state_last_reading"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="glucosereading",
+            name="created_at",
+            field=models.DateTimeField(
+                auto_now_add=True,
+                default=django.utils.timezone.now,
+                verbose_name="Created At",
+            ),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name="meal",
+            name="created_at",
+            field=models.DateTimeField(
+                auto_now_add=True,
+                default=django.utils.timezone.now,
+                verbose_name="Created At",
+            ),
+            preserve_default=False,
+        ),
+        migrations.RunPython(backfill_created_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="glucosereading",
+            index=models.Index(
+                fields=["user", "created_at"], name="glucose_reading_user_crt_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="meal",
+            index=models.Index(
+                fields=["user", "created_at"], name="meal_user_created_idx"
+            ),
+        ),
+    ]
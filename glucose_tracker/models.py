@@ -1,3 +1,5 @@
+import uuid
+
 from django.db import models
 from django.contrib.auth.models import User
 from django.utils.translation import gettext_lazy as _
@@ -26,6 +28,24 @@ class UserProfile(models.Model):
         return f"{self.user.username}'s Profile"
 
 
+class CareAssignment(models.Model):
+    """A patient followed by a clinician, listed on the clinician overview."""
+
+    clinician = models.ForeignKey(User, on_delete=models.CASCADE, related_name="care_assignments")
+    patient = models.ForeignKey(User, on_delete=models.CASCADE, related_name="care_team")
+    created_at = models.DateTimeField(_("Created At"), auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["clinician", "patient"], name="care_assignment_unique"),
+        ]
+        verbose_name = _("Care Assignment")
+        verbose_name_plural = _("Care Assignments")
+
+    def __str__(self):
+        return f"{self.clinician.username} -> {self.patient.username}"
+
+
 class GlucoseReading(models.Model):
     MEASUREMENT_TYPE_CHOICES = [
         ("fasting", _("Fasting")),
@@ -48,12 +68,33 @@ class GlucoseReading(models.Model):
         _("Measurement Type"), max_length=20, choices=MEASUREMENT_TYPE_CHOICES
     )
     notes = models.TextField(_("Notes"), blank=True, null=True)
+    # When the reading reached the server; unlike updated_at, maintenance
+    # jobs never touch it
+    created_at = models.DateTimeField(_("Created At"), auto_now_add=True)
+    # Set on every save; delta sync reads changes by it
+    updated_at = models.DateTimeField(_("Updated At"), auto_now=True)
 
     class Meta:
         ordering = ["-timestamp"]
+        indexes = [
+            # Every per-user view reads the most recent readings first
+            models.Index(fields=["user", "-timestamp"], name="glucose_reading_user_ts_idx"),
+            # Delta sync reads what changed since a cursor
+            models.Index(fields=["user", "updated_at"], name="glucose_reading_user_upd_idx"),
+            # The clinician overview's last upload
+            models.Index(fields=["user", "created_at"], name="glucose_reading_user_crt_idx"),
+        ]
         verbose_name = _("Glucose Reading")
         verbose_name_plural = _("Glucose Readings")
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # The stored time, so that moving a reading also refreshes the meals
+        # around where it was
+        instance.saved_timestamp = instance.__dict__.get("timestamp")
+        return instance
+
     def __str__(self):
         return f"{self.glucose_level} mg/dL - {self.get_measurement_type_display()} ({self.timestamp.strftime('%Y-%m-%d %H:%M')})"
 
@@ -84,8 +125,21 @@ class Meal(models.Model):
     # Store raw AI response if needed for debugging or re-parsing
     ai_response_raw = models.JSONField(_("AI Response Raw"), null=True, blank=True)
 
+    # Glucose response in the two hours after the meal, kept up to date by
+    # utils.postprandial as readings arrive
+    glucose_baseline = models.IntegerField(_("Baseline Glucose (mg/dL)"), null=True, blank=True)
+    glucose_peak_rise = models.IntegerField(_("Peak Rise (mg/dL)"), null=True, blank=True)
+    glucose_time_to_peak = models.IntegerField(_("Time to Peak (min)"), null=True, blank=True)
+    glucose_auc_2h = models.FloatField(_("2h Incremental AUC (mg/dL x min)"), null=True, blank=True)
+    created_at = models.DateTimeField(_("Created At"), auto_now_add=True)
+    updated_at = models.DateTimeField(_("Updated At"), auto_now=True)
+
     class Meta:
         ordering = ["-timestamp"]
+        indexes = [
+            models.Index(fields=["user", "updated_at"], name="meal_user_updated_idx"),
+            models.Index(fields=["user", "created_at"], name="meal_user_created_idx"),
+        ]
         verbose_name = _("Meal")
         verbose_name_plural = _("Meals")
 
@@ -214,3 +268,139 @@ class MeasurementSchedule(models.Model):
 
     def __str__(self):
         return f"{self.user.username}'s Measurement Schedule"
+
+
+class PhotoUpload(models.Model):
+    """
+    A meal photo being uploaded in chunks (see utils/uploads.py). The bytes
+    received so far are in storage at ``path``; the row goes away when the
+    photo is attached to a meal or the upload expires.
+    """
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="photo_uploads")
+    filename = models.CharField(_("Filename"), max_length=255)
+    length = models.PositiveBigIntegerField(_("Length"))
+    offset = models.PositiveBigIntegerField(_("Offset"), default=0)
+    created_at = models.DateTimeField(_("Created At"), auto_now_add=True)
+
+    class Meta:
+        verbose_name = _("Photo Upload")
+        verbose_name_plural = _("Photo Uploads")
+
+    @property
+    def path(self):
+        return f"uploads/{self.id}.part"
+
+    @property
+    def complete(self):
+        return self.offset == self.length
+
+    def __str__(self):
+        return f"{self.filename} ({self.offset}/{self.length})"
+
+
+class DeletedRecord(models.Model):
+    """Tombstone left when a reading or meal is deleted, for delta sync clients."""
+
+    MODEL_CHOICES = [
+        ("reading", _("Glucose Reading")),
+        ("meal", _("Meal")),
+    ]
+
+    # No database constraint: tombstones are written while a user's rows are
+    # being cascade-deleted, and are purged with the user afterwards.
+    user = models.ForeignKey(
+        User, on_delete=models.DO_NOTHING, db_constraint=False, related_name="+"
+    )
+    model = models.CharField(_("Model"), max_length=10, choices=MODEL_CHOICES)
+    object_id = models.BigIntegerField(_("Object ID"))
+    deleted_at = models.DateTimeField(_("Deleted At"), auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "id"], name="deleted_record_user_id_idx"),
+        ]
+        verbose_name = _("Deleted Record")
+        verbose_name_plural = _("Deleted Records")
+
+    def __str__(self):
+        return f"{self.model} {self.object_id} ({self.deleted_at.strftime('%Y-%m-%d %H:%M')})"
+
+
+class GlucoseAlert(models.Model):
+    """An alert rule that fired on a reading; see utils.alerts."""
+
+    RULE_CHOICES = [
+        ("below_target", _("Below target")),
+        ("above_target", _("Above target")),
+        ("rising_fast", _("Rising fast")),
+        ("falling_fast", _("Falling fast")),
+        ("prolonged_high", _("Prolonged high")),
+        ("missed_measurement", _("Missed measurement")),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="glucose_alerts")
+    # No database constraint: a partitioned readings table (partition_readings)
+    # has no unique key on id alone to reference.
+    reading = models.ForeignKey(
+        GlucoseReading,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        db_constraint=False,
+        related_name="alerts",
+    )
+    rule = models.CharField(_("Rule"), max_length=20, choices=RULE_CHOICES)
+    timestamp = models.DateTimeField(_("Timestamp"))
+    glucose_level = models.IntegerField(_("Glucose Level (mg/dL)"))
+    # Rate in mg/dL per minute, minutes above range, or the missed measurement
+    detail = models.CharField(_("Detail"), max_length=20, blank=True)
+    created_at = models.DateTimeField(_("Created At"), auto_now_add=True)
+
+    class Meta:
+        ordering = ["-timestamp"]
+        indexes = [
+            models.Index(fields=["user", "-timestamp"], name="glucose_alert_user_ts_idx"),
+        ]
+        verbose_name = _("Glucose Alert")
+        verbose_name_plural = _("Glucose Alerts")
+
+    @property
+    def message(self):
+        if self.rule == "below_target":
+            return _("%(level)s mg/dL is below your target range.") % {"level": self.glucose_level}
+        if self.rule == "above_target":
+            return _("%(level)s mg/dL is above your target range.") % {"level": self.glucose_level}
+        if self.rule in ("rising_fast", "falling_fast"):
+            return _("%(rule)s: %(rate)s mg/dL per minute.") % {"rule": self.get_rule_display(), "rate": self.detail}
+        if self.rule == "prolonged_high":
+            return _("Above your target range for %(minutes)s minutes.") % {"minutes": self.detail}
+        measurement = dict(MeasurementSchedule.TIME_CHOICES).get(self.detail, self.detail)
+        return _("Scheduled measurement missed: %(measurement)s.") % {"measurement": measurement}
+
+    def __str__(self):
+        return f"{self.get_rule_display()} - {self.glucose_level} mg/dL ({self.timestamp.strftime('%Y-%m-%d %H:%M')})"
+
+
+class AlertState(models.Model):
+    """
+    What the alert rules remember about a user's latest readings, so each
+    new reading is checked without querying the history.
+    """
+
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name="alert_state")
+    last_timestamp = models.DateTimeField(null=True)
+    last_level = models.IntegerField(null=True)
+    # Highest reading id checked: a reading above it that is not newer than
+    # last_timestamp was entered late, one below it was checked already
+    last_reading_id = models.BigIntegerField(null=True)
+    # -1 below the target range, 0 inside it, 1 above it
+    zone = models.SmallIntegerField(default=0)
+    changing_fast = models.BooleanField(default=False)
+    high_since = models.DateTimeField(null=True)
+    high_alerted = models.BooleanField(default=False)
+    # Scheduled measurements of schedule_day already logged or alerted, as bitmasks
+    schedule_day = models.DateField(null=True)
+    logged_slots = models.SmallIntegerField(default=0)
+    alerted_slots = models.SmallIntegerField(default=0)
@@ -0,0 +1,78 @@
+from django.contrib.auth.models import User
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import DeletedRecord, GlucoseReading, Meal, UserProfile
+
+
+def _user_deleted(origin):
+    """
+    Whether a delete cascaded from deleting users (``origin`` is what
+    delete() was called on). Their sync clients, meals and charts go away
+    with them, so their rows need no tombstones or refreshes.
+    """
+    if isinstance(origin, QuerySet):
+        return origin.model is User
+    return isinstance(origin, User)
+
+
+@receiver(post_delete, sender=User)
+def purge_user_tombstones(sender, instance, **kwargs):
+    DeletedRecord.objects.filter(user_id=instance.pk).delete()
+
+
+@receiver(post_delete, sender=GlucoseReading)
+@receiver(post_delete, sender=Meal)
+def record_deletion(sender, instance, origin=None, **kwargs):
+    if _user_deleted(origin):
+        return
+    DeletedRecord.objects.create(
+        user_id=instance.user_id,
+        model="reading" if sender is GlucoseReading else "meal",
+        object_id=instance.pk,
+    )
+
+
+@receiver(post_save, sender=GlucoseReading)
+@receiver(post_delete, sender=GlucoseReading)
+def refresh_meal_responses(sender, instance, origin=None, raw=False, **kwargs):
+    if raw or _user_deleted(origin):
+        return
+    # A late or corrected reading changes the response of the meals around
+    # it, and around where it was if it moved. Imported here so numpy is only
+    # loaded by processes that write.
+    from .utils import postprandial
+
+    moments = {instance.timestamp, getattr(instance, "saved_timestamp", None)} - {None}
+    postprandial.refresh_around(instance.user_id, *moments)
+    instance.saved_timestamp = instance.timestamp
+
+
+@receiver(post_save, sender=Meal)
+def compute_meal_response(sender, instance, update_fields=None, raw=False, **kwargs):
+    if raw or update_fields is not None and "timestamp" not in update_fields:
+        return
+    from .utils import postprandial
+
+    postprandial.refresh_responses(instance.user_id, instance.timestamp, instance.timestamp)
+
+
+@receiver(post_save, sender=GlucoseReading)
+def check_alerts(sender, instance, created, raw=False, **kwargs):
+    if not created or raw:
+        return
+    from .utils.alerts import process_readings
+
+    process_readings(instance.user_id, [instance])
+
+
+@receiver(post_save, sender=GlucoseReading)
+@receiver(post_delete, sender=GlucoseReading)
+@receiver(post_save, sender=UserProfile)
+def invalidate_charts(sender, instance, origin=None, **kwargs):
+    if _user_deleted(origin):
+        return
+    from .utils.charts import bump_version
+
+    bump_version(instance.user_id)
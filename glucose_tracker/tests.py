@@ -1,3 +1,1447 @@
-from django.test import TestCase
+import base64
+import contextlib
+import hashlib
+import io
+import math
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from xml.etree import ElementTree
+import zipfile
+from unittest import mock
+import warnings
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models.signals import post_delete
+from django.test import Client, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+import httpx
+import numpy as np
+from PIL import Image
+
+from . import instrumentation, views
+from .models import (
+    AlertState, CareAssignment, DeletedRecord, GlucoseAlert, GlucoseReading, Meal, MeasurementSchedule, PhotoUpload,
+    UserProfile,
+)
+from .utils import ai_analyzer, alerts, charts, overview, postprandial, report_pack, search, sync
+from .utils.food_index import get_index
+
+
+@contextlib.contextmanager
+def async_iterators_only():
+    """Fail if Django has to read a synchronous streaming iterator whole to serve it under ASGI."""
+    with warnings.catch_warnings():
+        warnings.filterwarnings("error", message=".*synchronous iterators.*")
+        yield
+
+
+# Counted without the chart cache, so every dashboard renders its charts
+@override_settings(
+    ALLOWED_HOSTS=["testserver"], CACHES={"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}
+)
+class QueryBudgetTests(TestCase):
+    """
+    Every view has a fixed query budget. Each view is requested with growing
+    amounts of data and, for the history lists, several page sizes; the
+    count must stay within budget and be identical across sizes, so a lazy
+    relation lookup in a template loop fails here instead of in production.
+    """
+
+    DATA_SIZES = (1, 10, 60)
+    PAGE_SIZES = (5, 20, 50)
+
+    # Includes the user lookup every authenticated request makes; the session
+    # is a signed cookie
+    BUDGETS = {
+        "dashboard": 7,
+        "glucose_list": 3,
+        "meal_list": 3,
+        "measurement_schedule": 3,
+        "export_data": 3,
+        "sync_changes": 4,
+        "search": 4,
+        "food_suggestions": 2,
+        "clinician_overview": 2,
+    }
+    # The archive bundles the CSV and XLSX exports and lists the photos
+    EXPORT_BUDGETS = {"zip": 6}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("budget", password="budget")
+        UserProfile.objects.create(user=cls.user, language_preference="en")
+        MeasurementSchedule.objects.create(user=cls.user)
+        # Another user's rows must not leak into the counts either
+        other = User.objects.create_user("other", password="other")
+        cls.create_rows(other, 30)
+
+    @staticmethod
+    def create_rows(user, count):
+        now = timezone.now()
+        GlucoseReading.objects.bulk_create(
+            GlucoseReading(
+                user=user,
+                timestamp=now - timedelta(hours=i),
+                glucose_level=90 + i % 120,
+                measurement_type="fasting",
+            )
+            for i in range(count)
+        )
+        Meal.objects.bulk_create(
+            Meal(
+                user=user,
+                timestamp=now - timedelta(hours=i),
+                meal_type="lunch",
+                description="Pasta",
+                photo="meals/budget.jpg",
+                estimated_calories=600,
+                carbs_estimate=75,
+            )
+            for i in range(count)
+        )
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def count_queries(self, url_name, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse(url_name), params)
+            if response.streaming:
+                b"".join(response.streaming_content)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def assert_constant_budget(self, url_name, budget=None, **params):
+        GlucoseReading.objects.filter(user=self.user).delete()
+        Meal.objects.filter(user=self.user).delete()
+        counts = {}
+        existing = 0
+        for size in self.DATA_SIZES:
+            self.create_rows(self.user, size - existing)
+            existing = size
+            counts[size] = self.count_queries(url_name, **params)
+        budget = budget or self.BUDGETS[url_name]
+        self.assertLessEqual(max(counts.values()), budget, f"{url_name} queries by row count: {counts}")
+        self.assertEqual(len(set(counts.values())), 1, f"{url_name} queries grow with rows: {counts}")
+
+    def test_dashboard(self):
+        self.assert_constant_budget("dashboard")
+
+    def test_measurement_schedule(self):
+        self.assert_constant_budget("measurement_schedule")
+
+    def test_sync_changes(self):
+        self.assert_constant_budget("sync_changes")
+
+    def test_food_suggestions(self):
+        self.assert_constant_budget("food_suggestions", q="pi")
+
+    def test_search(self):
+        for kind in ("meals", "readings"):
+            with self.subTest(kind=kind):
+                self.assert_constant_budget("search", q="pasta", kind=kind)
+
+    def test_history_lists(self):
+        for url_name in ("glucose_list", "meal_list"):
+            for page_size in self.PAGE_SIZES:
+                with self.subTest(view=url_name, page_size=page_size):
+                    with mock.patch.object(views, "HISTORY_PAGE_SIZE", page_size):
+                        self.assert_constant_budget(url_name)
+                        # The last page runs the same queries as the first
+                        last_page = self.count_queries(url_name, page="last")
+                        self.assertLessEqual(last_page, self.BUDGETS[url_name])
+
+    def test_clinician_overview(self):
+        # Patients rather than rows grow here, and a page holds at most 50
+        User.objects.filter(pk=self.user.pk).update(is_staff=True)
+        counts = {}
+        for size in self.DATA_SIZES:
+            for i in range(CareAssignment.objects.count(), size):
+                patient = User.objects.create_user(f"patient{i}")
+                self.create_rows(patient, 3)
+                CareAssignment.objects.create(clinician=self.user, patient=patient)
+            counts[size] = self.count_queries("clinician_overview")
+        self.assertLessEqual(max(counts.values()), self.BUDGETS["clinician_overview"], counts)
+        self.assertEqual(len(set(counts.values())), 1, f"clinician_overview queries grow with patients: {counts}")
+
+    def test_exports(self):
+        for format_type in ("csv", "xlsx", "ods", "zip"):
+            with self.subTest(format=format_type):
+                self.assert_constant_budget(
+                    "export_data", self.EXPORT_BUDGETS.get(format_type), format=format_type
+                )
+        for format_type in ("parquet", "arrow"):
+            for table in ("readings", "meals"):
+                with self.subTest(format=format_type, table=table):
+                    self.assert_constant_budget("export_data", format=format_type, table=table)
+
+
+class StartupImportTests(SimpleTestCase):
+    """
+    Loading the URLconf, what every worker and management command does,
+    must stay cheap: the heavy toolchains are imported on first use only
+    (see utils/lazy.py). Measured with ``python -X importtime`` in a fresh
+    interpreter; set IMPORT_TIME_BUDGET_MS to adjust the budget on slow
+    machines.
+    """
+
+    BUDGET_MS = 600
+    HEAVY_MODULES = {
+        "PIL", "requests", "httpx", "weasyprint", "openpyxl", "odf", "pyarrow", "numpy", "prometheus_client",
+    }
+
+    def test_urlconf_import_budget(self):
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", "import django; django.setup(); import glucosnap_project.urls"],
+            cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+            env={**os.environ, "DJANGO_SETTINGS_MODULE": "glucosnap_project.settings"},
+        )
+        # "import time: <self us> | <cumulative us> | <indented module name>"
+        imports = [
+            line.split("|") for line in result.stderr.splitlines()
+            if line.startswith("import time:") and "self [us]" not in line
+        ]
+        loaded = {name.strip().split(".")[0] for _self, _cumulative, name in imports}
+        self.assertFalse(loaded & self.HEAVY_MODULES, "imported at startup")
+
+        total_ms = sum(int(own.removeprefix("import time:")) for own, _cumulative, _name in imports) / 1000
+        budget = float(os.environ.get("IMPORT_TIME_BUDGET_MS", self.BUDGET_MS))
+        self.assertLess(total_ms, budget, f"startup imports took {total_ms:.0f} ms")
+
+
+@override_settings(OPENAI_API_KEY="test", OPENAI_API_BASE="https://openai.test/v1")
+class AsyncAnalyzerTests(SimpleTestCase):
+    ANALYSIS = {"description": "Risotto", "calories": 500, "carbs": 70, "components": ["rice"]}
+
+    async def analyze(self, handler):
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            with mock.patch("glucose_tracker.utils.ai_analyzer.record_ai_error") as record:
+                result = await ai_analyzer.aanalyze_encoded_image("aW1hZ2U=", client)
+        return result, [call.args[0] for call in record.call_args_list]
+
+    async def test_success(self):
+        def handler(request):
+            self.assertEqual(str(request.url), "https://openai.test/v1/chat/completions")
+            self.assertEqual(request.headers["Authorization"], "Bearer test")
+            content = json.loads(request.content)["messages"][0]["content"]
+            self.assertEqual(content[1]["image_url"]["url"], "data:image/jpeg;base64,aW1hZ2U=")
+            return httpx.Response(200, json={"choices": [{"message": {"content": json.dumps(self.ANALYSIS)}}]})
+
+        self.assertEqual(await self.analyze(handler), (self.ANALYSIS, []))
+
+    async def test_errors_are_mapped(self):
+        def timeout(request):
+            raise httpx.ReadTimeout("timed out", request=request)
+
+        def refused(request):
+            raise httpx.ConnectError("refused", request=request)
+
+        cases = [
+            (timeout, "timeout"),
+            (refused, "connection"),
+            (lambda request: httpx.Response(429, json={}), "http_status"),
+            (lambda request: httpx.Response(200, json={"choices": [{"message": {"content": "not json"}}]}),
+             "invalid_response"),
+            (lambda request: httpx.Response(200, json={"choices": []}), "unexpected"),
+        ]
+        for handler, error_class in cases:
+            with self.subTest(error=error_class):
+                result, recorded = await self.analyze(handler)
+                self.assertIn("error", result)
+                self.assertEqual(recorded, [error_class])
+
+    @override_settings(OPENAI_API_KEY="")
+    async def test_not_configured(self):
+        result, recorded = await self.analyze(lambda request: self.fail("no request expected"))
+        self.assertIn("error", result)
+        self.assertEqual(recorded, ["not_configured"])
+
+
+@override_settings(ALLOWED_HOSTS=["testserver"])
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings = override_settings(MEDIA_ROOT=media.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.user = User.objects.create_user("async")
+
+    async def test_dashboard(self):
+        await GlucoseReading.objects.acreate(
+            user=self.user, timestamp=timezone.now(), glucose_level=123, measurement_type="random"
+        )
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse("dashboard"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r.glucose_level for r in response.context["recent_readings"]], [123])
+        self.assertEqual(response.context["avg_glucose"], 123)
+
+    async def test_add_meal_awaits_the_analyzer(self):
+        image = io.BytesIO()
+        Image.new("RGB", (64, 48), "orange").save(image, "JPEG")
+        analysis = {"description": "Risotto", "calories": 500, "carbs": 70, "components": []}
+        await self.async_client.aforce_login(self.user)
+        with mock.patch("glucose_tracker.views.aanalyze_meal_image", return_value=analysis) as analyzer:
+            response = await self.async_client.post(reverse("add_meal"), {
+                "photo": SimpleUploadedFile("lunch.jpg", image.getvalue(), content_type="image/jpeg"),
+                "meal_type": "lunch",
+                "timestamp": timezone.localtime().strftime("%Y-%m-%dT%H:%M"),
+            })
+        self.assertEqual(response.status_code, 302)
+        analyzer.assert_awaited_once()
+        meal = await Meal.objects.aget(user=self.user)
+        self.assertEqual((meal.description, meal.estimated_calories, meal.carbs_estimate), ("Risotto", 500, 70))
+        self.assertTrue(meal.photo.name.endswith(".jpg"))
+
+
+@override_settings(ALLOWED_HOSTS=["testserver"], METRICS_ENABLED=True, METRICS_TOKEN="")
+class MetricsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("scraped")
+        self.client.force_login(self.user)
+
+    @override_settings(METRICS_ENABLED=False)
+    def test_hidden_when_disabled(self):
+        self.assertEqual(self.client.get(reverse("metrics")).status_code, 404)
+
+    @override_settings(METRICS_TOKEN="s3cret")
+    def test_token_required(self):
+        self.assertEqual(self.client.get(reverse("metrics")).status_code, 403)
+        self.assertEqual(self.client.get(reverse("metrics"), HTTP_AUTHORIZATION="Bearer wrong").status_code, 403)
+        self.assertEqual(self.client.get(reverse("metrics"), HTTP_AUTHORIZATION="Bearer s3cret").status_code, 200)
+
+    def test_request_and_export_histograms(self):
+        self.assertEqual(self.client.get(reverse("dashboard")).status_code, 200)
+        self.client.get(reverse("export_data"), {"format": "csv"}).getvalue()
+        response = self.client.get(reverse("metrics"))
+        self.assertTrue(response["Content-Type"].startswith("text/plain; version=0.0.4"))
+        body = response.content.decode()
+        self.assertIn("# TYPE glucosnap_view_duration_seconds histogram", body)
+        self.assertIn('glucosnap_view_duration_seconds_count{method="GET",status="200",view="dashboard"}', body)
+        self.assertIn("# TYPE glucosnap_export_duration_seconds histogram", body)
+        self.assertIn('glucosnap_export_duration_seconds_count{format="csv"}', body)
+
+    def test_multiprocess_collector(self):
+        # Another worker process records an export into the shared directory
+        with tempfile.TemporaryDirectory() as directory:
+            subprocess.run(
+                [sys.executable, "-c", "import django; django.setup(); from glucose_tracker import metrics; "
+                 "metrics._metrics().export_duration.labels('zip').observe(0.5)"],
+                cwd=settings.BASE_DIR, check=True,
+                env={**os.environ, "DJANGO_SETTINGS_MODULE": "glucosnap_project.settings",
+                     "METRICS_ENABLED": "True", "PROMETHEUS_MULTIPROC_DIR": directory},
+            )
+            with mock.patch.dict(os.environ, {"PROMETHEUS_MULTIPROC_DIR": directory}):
+                body = self.client.get(reverse("metrics")).content.decode()
+        self.assertIn('glucosnap_export_duration_seconds_count{format="zip"} 1.0', body)
+
+
+@override_settings(ALLOWED_HOSTS=["testserver"])
+class SessionTests(TestCase):
+    """Sessions and flash messages live in signed cookies, not in the database."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("cookies", password="cookies")
+
+    def test_add_glucose_round_trip_skips_session_table(self):
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                reverse("add_glucose"),
+                {"timestamp": timezone.localtime().strftime("%Y-%m-%dT%H:%M"), "glucose_level": 110,
+                 "measurement_type": "night"},
+                follow=True,
+            )
+        self.assertContains(response, "alert-success")
+        self.assertFalse([query["sql"] for query in queries if "django_session" in query["sql"]])
+        self.assertEqual(self.client.cookies["messages"].value, "")  # shown once, then cleared
+
+    def test_secret_key_rotation_keeps_sessions(self):
+        with override_settings(SECRET_KEY="old-secret-key"):
+            self.client.force_login(self.user)
+        old_cookie = self.client.cookies[settings.SESSION_COOKIE_NAME].value
+        with override_settings(SECRET_KEY="new-secret-key"):
+            self.assertEqual(self.client.get(reverse("dashboard")).status_code, 302)
+
+            self.client.cookies[settings.SESSION_COOKIE_NAME] = old_cookie
+            with override_settings(SECRET_KEY_FALLBACKS=["old-secret-key"]):
+                self.assertEqual(self.client.get(reverse("dashboard")).status_code, 200)
+            # The session was re-signed with the new key on that request
+            self.assertEqual(self.client.get(reverse("dashboard")).status_code, 200)
+
+
+@override_settings(ALLOWED_HOSTS=["testserver"], REPORT_PACK_WORKERS=1)
+class ReportPackTests(TestCase):
+    """The pack layout; rendering itself is WeasyPrint's, patched out here."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("patient", password="patient")
+        cls.other = User.objects.create_user("other_patient", password="other")
+        cls.clinician = User.objects.create_user("clinician", password="clinician", is_staff=True)
+        CareAssignment.objects.bulk_create(
+            CareAssignment(clinician=cls.clinician, patient=patient) for patient in (cls.user, cls.other)
+        )
+
+    def test_month_periods_cross_the_year(self):
+        periods = report_pack.month_periods(3, today=date(2026, 2, 10))
+        self.assertEqual(
+            [(timezone.localtime(start).date(), timezone.localtime(end).date()) for start, end in periods],
+            [(date(2025, 12, 1), date(2026, 1, 1)), (date(2026, 1, 1), date(2026, 2, 1)),
+             (date(2026, 2, 1), date(2026, 3, 1))],
+        )
+
+    def download(self, user, **params):
+        self.client.force_login(user)
+        with mock.patch("glucose_tracker.utils.pdf_generator.render_pdf", return_value=b"%PDF-1.7") as render:
+            response = self.client.get(reverse("report_pack"), params)
+            body = b"".join(response.streaming_content) if response.streaming else b""
+        return response, body, render
+
+    def test_pack_has_one_report_per_patient_and_month(self):
+        response, body, render = self.download(self.user, months=2)
+        this_month = timezone.localdate().replace(day=1)
+        last_month = (this_month - timedelta(days=1)).replace(day=1)
+        with zipfile.ZipFile(io.BytesIO(body)) as archive:
+            self.assertEqual(
+                sorted(archive.namelist()),
+                [f"patient/patient_{last_month:%Y-%m}.pdf", f"patient/patient_{this_month:%Y-%m}.pdf"],
+            )
+            self.assertEqual(archive.read(archive.namelist()[0]), b"%PDF-1.7")
+        self.assertEqual(render.call_count, 2)
+
+        response, body, render = self.download(self.clinician, months=1, patient=["patient", "other_patient"])
+        with zipfile.ZipFile(io.BytesIO(body)) as archive:
+            self.assertEqual([name.split("/")[0] for name in sorted(archive.namelist())], ["other_patient", "patient"])
+
+    async def test_pack_streams_under_asgi(self):
+        await self.async_client.aforce_login(self.clinician)
+        with mock.patch("glucose_tracker.utils.pdf_generator.render_pdf", return_value=b"%PDF-1.7") as render, \
+                async_iterators_only():
+            response = await self.async_client.get(
+                reverse("report_pack"), {"months": 3, "patient": ["patient", "other_patient"]}
+            )
+            self.assertTrue(response.is_async)
+            stream = aiter(response.streaming_content)
+            # The first report is sent before the others are rendered
+            first = await anext(stream)
+            self.assertEqual(render.call_count, 1)
+            body = first + b"".join([chunk async for chunk in stream])
+        self.assertEqual(render.call_count, 6)
+        with zipfile.ZipFile(io.BytesIO(body)) as archive:
+            self.assertEqual(len(archive.namelist()), 6)
+
+    def test_downloads_share_one_pool(self):
+        # Threads stand in for the spawned workers, rendering a stub report
+        def render_job(user_id, start, end, language):
+            return f"{user_id}/{timezone.localtime(start):%Y-%m}.pdf", b"%PDF-1.7"
+
+        with override_settings(REPORT_PACK_WORKERS=2), \
+                mock.patch.object(report_pack, "_shared_pool", None), \
+                mock.patch.object(report_pack, "render_job", render_job), \
+                mock.patch.object(report_pack, "_start_pool", side_effect=ThreadPoolExecutor) as start_pool:
+            for _ in range(3):
+                _response, body, _render = self.download(self.clinician, months=2, patient=["patient"])
+                with zipfile.ZipFile(io.BytesIO(body)) as archive:
+                    self.assertEqual(len(archive.namelist()), 2)
+            pool = report_pack._shared_pool
+        pool.shutdown()
+        start_pool.assert_called_once_with(2)
+
+    def test_only_staff_choose_patients(self):
+        response, _body, render = self.download(self.user, patient=["other_patient"])
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(render.call_count, 0)
+
+    def test_staff_only_get_assigned_patients(self):
+        stranger = User.objects.create_user("stranger", password="stranger")
+        response, _body, render = self.download(self.clinician, patient=["patient", "stranger"])
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(render.call_count, 0)
+
+        other_clinician = User.objects.create_user("other_clinician", is_staff=True)
+        CareAssignment.objects.create(clinician=other_clinician, patient=stranger)
+        response, _body, render = self.download(self.clinician, patient=["stranger"])
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(render.call_count, 0)
+
+
+class ChartTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("charted", password="charted")
+        UserProfile.objects.create(user=cls.user, target_glucose_min=70, target_glucose_max=180)
+        now = timezone.now()
+        GlucoseReading.objects.bulk_create(
+            GlucoseReading(
+                user=cls.user, timestamp=now - timedelta(minutes=5 * i),
+                glucose_level=120 + int(60 * math.sin(i / 20)), measurement_type="night",
+            )
+            for i in range(14 * 288)
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_90_day_trend_is_small(self):
+        end = 1_800_000_000
+        times = np.arange(end - 90 * 86400, end, 300)
+        levels = 120 + 60 * np.sin(times / 3600)
+        svg = charts.trend_svg(times, levels, end - 90 * 86400, end)
+        ElementTree.fromstring(svg)
+        self.assertLess(len(svg), 20_000)
+
+    def test_time_in_range_shares(self):
+        svg = charts.tir_svg([50, 60, 100, 200, 300], 70, 180)
+        texts = [element.text for element in ElementTree.fromstring(svg).iter("{http://www.w3.org/2000/svg}text")]
+        self.assertEqual(texts[1::2], ["20%"] * 5)
+        self.assertIsNone(charts.agp_svg([1_800_000_000], [100]))
+
+    @override_settings(ALLOWED_HOSTS=["testserver"])
+    def test_dashboard_charts_cached_until_data_changes(self):
+        with CaptureQueriesContext(connection) as queries:
+            first = charts.dashboard_charts(self.user.id)
+        self.assertEqual(len(queries), 2)
+        self.assertTrue(all(first.values()))
+        with self.assertNumQueries(0):
+            self.assertEqual(charts.dashboard_charts(self.user.id), first)
+
+        GlucoseReading.objects.create(
+            user=self.user, timestamp=timezone.now(), glucose_level=300, measurement_type="night"
+        )
+        self.assertNotEqual(charts.dashboard_charts(self.user.id)["tir"], first["tir"])
+
+        self.client.force_login(self.user)
+        self.assertContains(self.client.get(reverse("dashboard")), "<svg", count=3)
+
+
+@override_settings(ALLOWED_HOSTS=["testserver"])
+class ClinicianOverviewTests(TestCase):
+    def setUp(self):
+        self.clinician = User.objects.create_user("doctor", is_staff=True)
+        self.now = timezone.now()
+        self.patients = [User.objects.create_user(name) for name in ("carla", "bruno", "anna", "dario")]
+        call_command("assign_patients", "doctor", "anna", "bruno", "carla", "dario", stdout=io.StringIO())
+        anna, bruno, carla, _dario = sorted(self.patients, key=lambda user: user.username)
+        UserProfile.objects.create(user=anna, target_glucose_min=80, target_glucose_max=140)
+        self.add_readings(anna, [(1, 150), (2, 100), (3, 120), (4, 60)])
+        # Only an old reading: shown as the last one, but outside the 14 days
+        self.add_readings(bruno, [(24 * 20, 200)])
+        self.add_readings(carla, [(5, 90)])
+        Meal.objects.create(user=carla, timestamp=self.now, meal_type="lunch", photo="meals/a.jpg")
+        # Not assigned to this clinician
+        self.add_readings(User.objects.create_user("other"), [(1, 300)])
+
+    def add_readings(self, user, readings):
+        GlucoseReading.objects.bulk_create(
+            GlucoseReading(
+                user=user, timestamp=self.now - timedelta(hours=hours), glucose_level=level,
+                measurement_type="fasting",
+            )
+            for hours, level in readings
+        )
+
+    def test_statistics(self):
+        with self.assertNumQueries(1):
+            patients, after = overview.patient_overview(self.clinician, now=self.now)
+        self.assertIsNone(after)
+        anna, bruno, carla, dario = patients
+        self.assertEqual([p.username for p in patients], ["anna", "bruno", "carla", "dario"])
+        self.assertEqual((anna.last_level, anna.average, anna.readings), (150, 107.5, 4))
+        # Within anna's own 80-140 target range: 100 and 120
+        self.assertEqual(anna.time_in_range, 50)
+        self.assertEqual((bruno.last_level, bruno.readings, bruno.average, bruno.time_in_range), (200, 0, None, None))
+        self.assertEqual(carla.time_in_range, 100)
+        self.assertGreater(carla.last_upload, carla.last_reading_upload)
+        self.assertEqual((dario.last_level, dario.last_upload, dario.upload_age), (None, None, None))
+
+    def test_maintenance_is_not_an_upload(self):
+        carla = User.objects.get(username="carla")
+        GlucoseReading.objects.filter(user=carla).update(created_at=self.now - timedelta(days=3))
+        Meal.objects.filter(user=carla).update(created_at=self.now - timedelta(days=2))
+        # Rewrites the meal's response and updated_at
+        GlucoseReading.objects.filter(user=carla).update(glucose_level=95)
+        Meal.objects.filter(user=carla).update(glucose_baseline=1)
+        postprandial.refresh_responses(carla.pk)
+        self.assertGreater(Meal.objects.get(user=carla).updated_at, self.now)
+        patients, _after = overview.patient_overview(self.clinician, now=self.now)
+        self.assertEqual(patients[2].upload_age, timedelta(days=2))
+
+    def test_keyset_pages(self):
+        seen = []
+        after = ""
+        while after is not None:
+            patients, after = overview.patient_overview(self.clinician, after, limit=3, now=self.now)
+            seen.append([patient.username for patient in patients])
+        self.assertEqual(seen, [["anna", "bruno", "carla"], ["dario"]])
+
+        self.client.force_login(self.clinician)
+        with mock.patch.object(overview, "OVERVIEW_PAGE_SIZE", 3):
+            response = self.client.get(reverse("clinician_overview"))
+        self.assertContains(response, "?after=carla")
+        self.assertNotContains(response, "dario")
+        response = self.client.get(reverse("clinician_overview"), {"after": "carla"})
+        self.assertContains(response, "dario")
+        self.assertNotContains(response, "other")
+
+    def test_staff_only(self):
+        self.client.force_login(self.patients[0])
+        self.assertEqual(self.client.get(reverse("clinician_overview")).status_code, 403)
+        with self.assertRaises(CommandError):
+            call_command("assign_patients", "carla", "anna")
+
+
+@override_settings(ALLOWED_HOSTS=["testserver"])
+class ExportArchiveTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings = override_settings(MEDIA_ROOT=media.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.user = User.objects.create_user("archive")
+        self.client.force_login(self.user)
+
+    def test_archive_contents(self):
+        now = timezone.now()
+        GlucoseReading.objects.bulk_create(
+            GlucoseReading(user=self.user, timestamp=now - timedelta(hours=i), glucose_level=100 + i,
+                           measurement_type="random")
+            for i in range(25)
+        )
+        photo = default_storage.save("meals/lunch.jpg", ContentFile(b"\xff\xd8 not really a jpeg"))
+        lunch = Meal.objects.create(user=self.user, timestamp=now, meal_type="lunch", description="Pasta", photo=photo)
+        Meal.objects.create(user=self.user, timestamp=now, meal_type="dinner", photo="meals/missing.jpg")
+
+        # Small batches, so the CSV goes out over several chunks
+        with mock.patch("glucose_tracker.utils.export_utils.CSV_BATCH_ROWS", 2):
+            response = self.client.get(reverse("export_data"), {"format": "zip"})
+            body = b"".join(response.streaming_content)
+        with zipfile.ZipFile(io.BytesIO(body)) as archive:
+            self.assertIsNone(archive.testzip())
+            taken = timezone.localtime(lunch.timestamp)
+            photo_name = f"photos/{taken:%Y-%m-%d_%H%M}_{lunch.pk}.jpg"
+            self.assertEqual(
+                archive.namelist(), ["glucosnap_export.csv", "glucosnap_export.xlsx", photo_name]
+            )
+            csv_text = archive.read("glucosnap_export.csv").decode()
+            self.assertEqual(csv_text.count("\n"), 2 + 25 + 1 + 2 + 2)
+            self.assertIn("Pasta", csv_text)
+            with zipfile.ZipFile(io.BytesIO(archive.read("glucosnap_export.xlsx"))) as workbook:
+                self.assertIn("xl/workbook.xml", workbook.namelist())
+            self.assertEqual(archive.read(photo_name), b"\xff\xd8 not really a jpeg")
+            self.assertEqual(archive.getinfo(photo_name).compress_type, zipfile.ZIP_STORED)
+            self.assertEqual(archive.getinfo("glucosnap_export.csv").compress_type, zipfile.ZIP_DEFLATED)
+
+    async def test_archive_streams_under_asgi(self):
+        photo = await sync_to_async(default_storage.save)("meals/dinner.jpg", ContentFile(b"\xff\xd8" * 40000))
+        await Meal.objects.acreate(user=self.user, timestamp=timezone.now(), meal_type="dinner", photo=photo)
+        await self.async_client.aforce_login(self.user)
+        with async_iterators_only():
+            response = await self.async_client.get(reverse("export_data"), {"format": "zip"})
+            self.assertTrue(response.is_async)
+            chunks = [chunk async for chunk in response.streaming_content]
+        self.assertGreater(len(chunks), 3)
+        with zipfile.ZipFile(io.BytesIO(b"".join(chunks))) as archive:
+            self.assertEqual(len(archive.namelist()), 3)
+
+    @override_settings(PERF_INSTRUMENTATION=True, SLOW_REQUEST_THRESHOLD_MS=0)
+    def test_slow_request_log_covers_streamed_body(self):
+        GlucoseReading.objects.create(user=self.user, timestamp=timezone.now(), glucose_level=110,
+                                      measurement_type="random")
+        with connection.execute_wrapper(instrumentation.time_query), \
+                self.assertLogs("glucose_tracker.performance") as logs:
+            # A fresh client builds its middleware chain with instrumentation on
+            client = Client()
+            client.force_login(self.user)
+            response = client.get(reverse("export_data"), {"format": "zip"})
+            self.assertIn("Server-Timing", response)
+            self.assertEqual(logs.output, [])
+            b"".join(response.streaming_content)
+        self.assertEqual(len(logs.output), 1)
+        entry = json.loads(logs.records[0].getMessage())
+        self.assertEqual(entry["view"], "export_data")
+        self.assertGreaterEqual(entry["queries"], 2)
+
+
+@override_settings(ALLOWED_HOSTS=["testserver"])
+class ColumnarExportTests(TestCase):
+    """Parquet and Arrow exports read back with pyarrow, typed as documented."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("columnar")
+        cls.now = timezone.now().replace(microsecond=123456)
+        GlucoseReading.objects.bulk_create(
+            GlucoseReading(user=cls.user, timestamp=cls.now - timedelta(hours=i), glucose_level=100 + i,
+                           measurement_type="fasting" if i % 2 else "night", notes="after a run" if i == 0 else None)
+            for i in range(5)
+        )
+        Meal.objects.create(user=cls.user, timestamp=cls.now, meal_type="lunch", description="Pasta",
+                            estimated_calories=640, carbs_estimate=82.5)
+        Meal.objects.create(user=cls.user, timestamp=cls.now, meal_type="snack", description="Not analyzed yet")
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def read(self, format_type, body):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if format_type == "parquet":
+            return pq.read_table(io.BytesIO(body))
+        return pa.ipc.open_stream(body).read_all()
+
+    def assert_readings(self, data):
+        import pyarrow as pa
+
+        self.assertEqual(data.schema.field("timestamp").type, pa.timestamp("us", tz="UTC"))
+        self.assertEqual(data.schema.field("glucose_level").type, pa.int16())
+        self.assertEqual(data.column("glucose_level").to_pylist(), [104, 103, 102, 101, 100])
+        self.assertEqual(data.column("timestamp").to_pylist()[-1], self.now)
+        self.assertEqual(data.column("measurement_type").to_pylist(), ["night", "fasting", "night", "fasting", "night"])
+        self.assertEqual(data.column("notes").null_count, 4)
+
+    def test_readings_and_meals(self):
+        import pyarrow as pa
+
+        for format_type in ("parquet", "arrow"):
+            with self.subTest(format=format_type):
+                response = self.client.get(reverse("export_data"), {"format": format_type, "table": "readings"})
+                self.assert_readings(self.read(format_type, b"".join(response.streaming_content)))
+
+                response = self.client.get(reverse("export_data"), {"format": format_type, "table": "meals"})
+                meals = self.read(format_type, b"".join(response.streaming_content))
+                self.assertEqual(meals.schema.field("estimated_calories").type, pa.int32())
+                self.assertEqual(meals.schema.field("carbs_estimate").type, pa.float64())
+                self.assertTrue(meals.schema.field("estimated_calories").nullable)
+                self.assertEqual(meals.column("estimated_calories").to_pylist(), [640, None])
+                self.assertEqual(meals.column("carbs_estimate").to_pylist(), [82.5, None])
+                self.assertEqual(meals.column("meal_type").to_pylist(), ["lunch", "snack"])
+
+    async def test_streams_under_asgi(self):
+        await self.async_client.aforce_login(self.user)
+        for format_type in ("parquet", "arrow"):
+            with self.subTest(format=format_type), async_iterators_only():
+                # One batch per two rows, so the file goes out in several chunks
+                with mock.patch("glucose_tracker.utils.export_utils.COLUMNAR_CHUNK_ROWS", 2):
+                    response = await self.async_client.get(
+                        reverse("export_data"), {"format": format_type, "table": "readings"}
+                    )
+                    self.assertTrue(response.is_async)
+                    chunks = [chunk async for chunk in response.streaming_content]
+                self.assertGreater(len(chunks), 3)
+                self.assert_readings(self.read(format_type, b"".join(chunks)))
+
+
+@override_settings(ALLOWED_HOSTS=["testserver"])
+class SyncTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("sync", password="sync")
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def add_reading(self, level=100, user=None):
+        return GlucoseReading.objects.create(
+            user=user or self.user, timestamp=timezone.now(), glucose_level=level, measurement_type="random"
+        )
+
+    @staticmethod
+    def settle(queryset, seconds=60):
+        """Backdate the rows' last change past the settle horizon."""
+        field = "deleted_at" if queryset.model is DeletedRecord else "updated_at"
+        queryset.update(**{field: timezone.now() - timedelta(seconds=seconds)})
+
+    def fetch(self, cursor=None, **params):
+        if cursor:
+            params["cursor"] = cursor
+        response = self.client.get(reverse("sync_changes"), params)
+        self.assertEqual(response.status_code, 200)
+        lines = [json.loads(line) for line in response.content.decode().splitlines()]
+        last = lines.pop()
+        self.assertEqual(last["type"], "cursor")
+        self.assertEqual(response["X-Sync-Cursor"], last["cursor"])
+        self.assertEqual(response["X-Sync-Has-More"], "true" if last["has_more"] else "false")
+        return lines, last["cursor"], last["has_more"]
+
+    def test_cursor_pages_through_changes(self):
+        readings = [self.add_reading(100 + i) for i in range(5)]
+        self.settle(GlucoseReading.objects.all())
+        pages, cursor = [], None
+        while True:
+            lines, cursor, has_more = self.fetch(cursor, limit=2)
+            pages.append([line["id"] for line in lines])
+            if not has_more:
+                break
+        ids = [reading.pk for reading in readings]
+        self.assertEqual(pages, [ids[:2], ids[2:4], ids[4:]])
+        self.assertEqual(self.fetch(cursor)[0], [])
+
+        # An edit sends the row again, once
+        readings[1].glucose_level = 180
+        readings[1].save()
+        self.settle(GlucoseReading.objects.filter(pk=readings[1].pk))
+        lines, cursor, _has_more = self.fetch(cursor)
+        self.assertEqual([(line["id"], line["glucose_level"]) for line in lines], [(ids[1], 180)])
+        self.assertEqual(self.fetch(cursor)[0], [])
+
+    def test_deletions_are_sent_as_tombstones(self):
+        reading = self.add_reading()
+        meal = Meal.objects.create(user=self.user, timestamp=timezone.now(), meal_type="lunch", photo="meals/sync.jpg")
+        self.settle(GlucoseReading.objects.all())
+        self.settle(Meal.objects.all())
+        lines, cursor, _has_more = self.fetch()
+        self.assertEqual(sorted(line["type"] for line in lines), ["meal", "reading"])
+
+        deleted = [("reading", reading.pk), ("meal", meal.pk)]
+        reading.delete()
+        meal.delete()
+        self.settle(DeletedRecord.objects.all())
+        lines, cursor, _has_more = self.fetch(cursor)
+        self.assertEqual(lines, [{"type": "deleted", "model": model, "id": pk} for model, pk in deleted])
+        self.assertEqual(self.fetch(cursor)[0], [])
+
+    def test_recent_changes_wait_for_the_next_sync(self):
+        settled = self.add_reading(100)
+        self.settle(GlucoseReading.objects.all())
+        recent = self.add_reading(110)
+        lines, cursor, has_more = self.fetch()
+        self.assertEqual([line["id"] for line in lines], [settled.pk])
+        self.assertFalse(has_more)
+
+        # Once it is older than the horizon, the held-back row comes next
+        self.settle(GlucoseReading.objects.filter(pk=recent.pk), seconds=sync.SETTLE_SECONDS + 1)
+        lines, cursor, _has_more = self.fetch(cursor)
+        self.assertEqual([line["id"] for line in lines], [recent.pk])
+
+    def test_rejects_tampered_cursors(self):
+        self.add_reading()
+        self.settle(GlucoseReading.objects.all())
+        _lines, cursor, _has_more = self.fetch()
+        value, signature = cursor.rsplit(":", 1)
+        tampered = f"{value}:{signature[::-1]}"
+        response = self.client.get(reverse("sync_changes"), {"cursor": tampered})
+        self.assertEqual(response.status_code, 400)
+
+        other = User.objects.create_user("other_sync")
+        self.client.force_login(other)
+        response = self.client.get(reverse("sync_changes"), {"cursor": cursor})
+        self.assertEqual(response.status_code, 400)
+
+    def test_deleting_a_user_leaves_no_tombstones(self):
+        for delete in (lambda user: user.delete(), lambda user: User.objects.filter(pk=user.pk).delete()):
+            user = User.objects.create_user("leaving")
+            user_id = user.pk
+            self.add_reading(user=user)
+            Meal.objects.create(user=user, timestamp=timezone.now(), meal_type="lunch", photo="meals/leaving.jpg")
+            delete(user)
+            self.assertFalse(DeletedRecord.objects.filter(user_id=user_id).exists())
+
+    def test_failed_user_delete_keeps_tombstones(self):
+        reading = self.add_reading()
+
+        def fail(sender, **kwargs):
+            raise RuntimeError("delete failed")
+
+        post_delete.connect(fail, sender=Meal)
+        Meal.objects.create(user=self.user, timestamp=timezone.now(), meal_type="lunch", photo="meals/sync.jpg")
+        try:
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                self.user.delete()
+        finally:
+            post_delete.disconnect(fail, sender=Meal)
+        reading_id = reading.pk
+        reading.delete()
+        self.assertEqual(
+            list(DeletedRecord.objects.filter(user=self.user).values_list("model", "object_id")),
+            [("reading", reading_id)],
+        )
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("searcher")
+        cls.other = User.objects.create_user("other")
+        now = timezone.now()
+        cls.pizza = Meal.objects.create(
+            user=cls.user, timestamp=now, meal_type="dinner", description="Pizza margherita", photo="a.jpg"
+        )
+        cls.salad = Meal.objects.create(
+            user=cls.user, timestamp=now, meal_type="lunch", description="Insalata",
+            manual_notes="poi due pizze", photo="b.jpg",
+        )
+        Meal.objects.create(user=cls.other, timestamp=now, meal_type="dinner", description="Pizza", photo="c.jpg")
+        cls.reading = GlucoseReading.objects.create(
+            user=cls.user, timestamp=now, glucose_level=190, measurement_type="post_meal", notes="dopo la pizza"
+        )
+
+    def search_ids(self, query, kind="meals", language="it", **kwargs):
+        results, cursor = search.search(self.user, kind, query, language, **kwargs)
+        return [obj.pk for obj in results], cursor
+
+    def test_stemmed_ranked_and_scoped_to_user(self):
+        # Description outranks notes; the other user's pizza never shows
+        self.assertEqual(self.search_ids("pizze")[0], [self.pizza.pk, self.salad.pk])
+        self.assertEqual(self.search_ids("margherita pizza")[0], [self.pizza.pk])
+        self.assertEqual(self.search_ids("pizza", kind="readings")[0], [self.reading.pk])
+        self.assertEqual(self.search_ids('"pizz*) -')[0], [self.pizza.pk, self.salad.pk])
+
+    def test_index_follows_updates_and_deletes(self):
+        self.salad.manual_notes = ""
+        self.salad.save()
+        self.assertEqual(self.search_ids("pizza")[0], [self.pizza.pk])
+        self.pizza.delete()
+        self.assertEqual(self.search_ids("pizza")[0], [])
+
+    def test_keyset_pagination(self):
+        first, cursor = self.search_ids("pizza", limit=1)
+        second, end = self.search_ids("pizza", limit=1, cursor=cursor)
+        self.assertEqual(first + second, [self.pizza.pk, self.salad.pk])
+        self.assertIsNone(end)
+        with self.assertRaises(search.InvalidCursor):
+            self.search_ids("pizza", cursor="tampered")
+
+
+class PostprandialTests(TestCase):
+    def test_fixtures_skip_the_refresh(self):
+        user = User.objects.create_user("fixture")
+        fixture = [
+            {"model": "glucose_tracker.glucosereading", "fields": {
+                "user": user.pk, "timestamp": "2025-01-01T12:30:00Z", "glucose_level": 160,
+                "measurement_type": "post_lunch", "created_at": "2025-01-01T12:30:00Z",
+                "updated_at": "2025-01-01T12:30:00Z"}},
+            {"model": "glucose_tracker.meal", "fields": {
+                "user": user.pk, "timestamp": "2025-01-01T12:00:00Z", "meal_type": "lunch", "photo": "",
+                "created_at": "2025-01-01T12:00:00Z", "updated_at": "2025-01-01T12:00:00Z"}},
+        ]
+        with tempfile.NamedTemporaryFile("w", suffix=".json") as f:
+            json.dump(fixture, f)
+            f.flush()
+            with mock.patch("glucose_tracker.utils.postprandial.refresh_around") as around, \
+                    mock.patch("glucose_tracker.utils.postprandial.refresh_responses") as responses:
+                call_command("loaddata", f.name, verbosity=0)
+        self.assertEqual(GlucoseReading.objects.filter(user=user).count(), 1)
+        around.assert_not_called()
+        responses.assert_not_called()
+
+    def test_compute_responses(self):
+        # Meal at 0 s; the reading at 125 min is outside the window
+        times = [-600, 1800, 3600, 5400, 7200, 7500]
+        levels = [100, 140, 180, 150, 120, 200]
+        baseline, rise, peak, auc = postprandial.compute_responses([0, 20000], times, levels)
+        self.assertEqual((baseline[0], rise[0], peak[0]), (100, 80, 60))
+        # Trapezoids over rises 0, 40, 80, 50, 20 at 30-minute steps
+        self.assertEqual(auc[0], 5400)
+        # No reading in the 30 minutes before the second meal
+        self.assertTrue(all(values[1] != values[1] for values in (baseline, rise, peak, auc)))
+
+    def test_meals_follow_late_readings(self):
+        user = User.objects.create_user("responder")
+        start = timezone.now().replace(microsecond=0) - timedelta(hours=3)
+        GlucoseReading.objects.create(user=user, timestamp=start - timedelta(minutes=10), glucose_level=95,
+                                      measurement_type="pre_lunch")
+        meal = Meal.objects.create(user=user, timestamp=start, meal_type="lunch", photo="a.jpg")
+        self.assertEqual(meal.glucose_baseline, None)
+        meal.refresh_from_db()
+        self.assertEqual((meal.glucose_baseline, meal.glucose_peak_rise), (95, None))
+
+        late = GlucoseReading.objects.create(user=user, timestamp=start + timedelta(minutes=90),
+                                             glucose_level=175, measurement_type="post_lunch")
+        meal.refresh_from_db()
+        self.assertEqual((meal.glucose_peak_rise, meal.glucose_time_to_peak, meal.glucose_auc_2h), (80, 90, 3600))
+        GlucoseReading.objects.create(user=user, timestamp=start + timedelta(minutes=45), glucose_level=205,
+                                      measurement_type="post_lunch")
+        meal.refresh_from_db()
+        self.assertEqual((meal.glucose_peak_rise, meal.glucose_time_to_peak), (110, 45))
+
+        late.delete()
+        meal.refresh_from_db()
+        self.assertEqual(meal.glucose_auc_2h, 2475)
+        self.client.force_login(user)
+        self.assertContains(self.client.get(reverse("meal_list")), "+110 mg/dL")
+
+    def test_moved_reading_refreshes_both_meals(self):
+        user = User.objects.create_user("mover")
+        start = timezone.now().replace(microsecond=0) - timedelta(hours=8)
+        for meal_start in (start, start + timedelta(hours=4)):
+            GlucoseReading.objects.create(user=user, timestamp=meal_start - timedelta(minutes=10), glucose_level=95,
+                                          measurement_type="pre_lunch")
+        lunch = Meal.objects.create(user=user, timestamp=start, meal_type="lunch", photo="a.jpg")
+        dinner = Meal.objects.create(user=user, timestamp=start + timedelta(hours=4), meal_type="dinner", photo="b.jpg")
+        GlucoseReading.objects.create(user=user, timestamp=start + timedelta(minutes=60), glucose_level=175,
+                                      measurement_type="post_lunch")
+        lunch.refresh_from_db()
+        self.assertEqual(lunch.glucose_peak_rise, 80)
+
+        # Logged against the wrong meal: moved to an hour after dinner
+        reading = GlucoseReading.objects.get(user=user, glucose_level=175)
+        reading.timestamp = dinner.timestamp + timedelta(minutes=60)
+        reading.save()
+        lunch.refresh_from_db()
+        dinner.refresh_from_db()
+        self.assertEqual((lunch.glucose_peak_rise, lunch.glucose_auc_2h), (None, None))
+        self.assertEqual(dinner.glucose_peak_rise, 80)
+
+
+class RecordingNotifier:
+    sent = []
+
+    def notify(self, alerts):
+        self.sent.extend(alerts)
+
+
+@override_settings(ALERT_RATE_MG_DL_PER_MIN=3, ALERT_PROLONGED_HIGH_MINUTES=30, ALERT_MAX_AGE_MINUTES=60 * 24 * 15)
+class AlertTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("alerted")
+        UserProfile.objects.create(user=self.user, target_glucose_min=70, target_glucose_max=180)
+        # Noon on the Monday of last week, local time
+        today = timezone.localdate()
+        monday = today - timedelta(days=today.weekday() + 7)
+        self.start = timezone.make_aware(timezone.datetime.combine(monday, timezone.datetime.min.time()))
+        self.start += timedelta(hours=12)
+
+    def readings(self, *levels, measurement_type="post_lunch", step=5, start=None):
+        start = start or self.start
+        return [
+            GlucoseReading(user=self.user, timestamp=start + timedelta(minutes=step * i),
+                           glucose_level=level, measurement_type=measurement_type)
+            for i, level in enumerate(levels)
+        ]
+
+    def rules(self, readings):
+        fired = []
+        for reading in sorted(readings, key=lambda r: r.timestamp):
+            for rule, detail in self.checker.check(self.state, reading.timestamp, reading.glucose_level,
+                                                   reading.measurement_type):
+                fired.append(rule)
+        return fired
+
+    def test_rules_fire_once_per_episode(self):
+        self.checker = alerts.Rules(70, 180, rate=3, prolonged_minutes=30)
+        self.state = AlertState()
+        # In range, rising 4 mg/dL/min into a 40-minute high, back down fast
+        levels = [150, 170, 190, 200, 200, 200, 200, 200, 200, 200, 200, 170, 140, 60]
+        self.assertEqual(
+            self.rules(self.readings(*levels)),
+            ["rising_fast", "above_target", "prolonged_high", "falling_fast", "below_target"],
+        )
+        # A gap longer than 15 minutes is not a rate of change
+        self.assertEqual(self.rules(self.readings(150, start=self.start + timedelta(hours=2))), [])
+
+    def test_missed_scheduled_measurements(self):
+        MeasurementSchedule.objects.create(user=self.user, mon_pre_lunch=True, mon_bedtime=True, tue_pre_breakfast=True)
+        self.checker = alerts.rules_for(self.user.pk)
+        self.state = AlertState()
+        fired = []
+        for reading in self.readings(120, measurement_type="post_lunch"):
+            fired += self.checker.check(self.state, reading.timestamp, 120, reading.measurement_type)
+        for reading in self.readings(100, measurement_type="fasting", start=self.start + timedelta(hours=19)):
+            fired += self.checker.check(self.state, reading.timestamp, 100, reading.measurement_type)
+        self.assertEqual(fired, [("missed_measurement", "pre_lunch"), ("missed_measurement", "bedtime")])
+
+    def test_batches_match_single_inserts_and_old_readings_stay_quiet(self):
+        levels = [150, 170, 190, 200, 200, 200, 200, 200, 200, 120]
+        batch = self.readings(*levels)
+        GlucoseReading.objects.bulk_create(batch)
+        created = alerts.process_readings(self.user.pk, list(reversed(batch)))
+        self.assertEqual(
+            [a.rule for a in created], ["rising_fast", "above_target", "prolonged_high", "falling_fast"]
+        )
+        # Already checked: nothing fires twice
+        self.assertEqual(alerts.process_readings(self.user.pk, batch), [])
+
+        with override_settings(ALERT_MAX_AGE_MINUTES=60):
+            later = self.readings(40, start=self.start + timedelta(minutes=60))
+            GlucoseReading.objects.bulk_create(later)
+            self.assertEqual(alerts.process_readings(self.user.pk, later), [])
+        self.assertEqual(AlertState.objects.get(user=self.user).zone, -1)
+
+    @override_settings(ALERT_NOTIFIER="glucose_tracker.tests.RecordingNotifier", ALLOWED_HOSTS=["testserver"])
+    def test_late_reading_checks_the_target_range(self):
+        RecordingNotifier.sent = []
+        # The CGM synced up to a minute ago, in range
+        cgm = self.readings(120, 125, 130, step=5, start=timezone.now() - timedelta(minutes=11))
+        for reading in cgm:
+            reading.save()
+        # A fingerstick taken before the last CGM reading is logged afterwards
+        self.client.force_login(self.user)
+        taken = timezone.localtime(cgm[-1].timestamp - timedelta(minutes=3))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse("add_glucose"),
+                {"timestamp": taken.strftime("%Y-%m-%dT%H:%M"), "glucose_level": 45, "measurement_type": "night"},
+            )
+        self.assertEqual([alert.rule for alert in RecordingNotifier.sent], ["below_target"])
+        # The rate and streak rules still follow the CGM
+        state = AlertState.objects.get(user=self.user)
+        self.assertEqual((state.last_level, state.zone), (130, 0))
+
+        # Checked once: reprocessing fires nothing, nor does a late reading
+        # while the CGM is already low
+        late = GlucoseReading.objects.get(user=self.user, glucose_level=45)
+        self.assertEqual(alerts.process_readings(self.user.pk, [late]), [])
+        low = self.readings(60, start=timezone.now())[0]
+        low.save()
+        later = self.readings(50, start=low.timestamp - timedelta(minutes=1))[0]
+        later.save()
+        self.assertEqual(GlucoseAlert.objects.filter(user=self.user, rule="below_target").count(), 2)
+
+    @override_settings(ALERT_MAX_AGE_MINUTES=60 * 24 * 30)
+    def test_backfilled_reading_counts_as_logged(self):
+        MeasurementSchedule.objects.create(user=self.user, mon_pre_lunch=True, mon_bedtime=True)
+        # The CGM is checked past lunch, in a state row from before reading ids were recorded
+        cgm = self.readings(120, 130, measurement_type="night", step=60, start=self.start - timedelta(hours=1))
+        GlucoseReading.objects.bulk_create(cgm)
+        alerts.process_readings(self.user.pk, cgm)
+        AlertState.objects.filter(user=self.user).update(last_reading_id=None)
+
+        # The pre-lunch fingerstick is logged afterwards, then the bedtime one
+        fingerstick = self.readings(110, measurement_type="pre_lunch", start=self.start - timedelta(minutes=30))
+        GlucoseReading.objects.bulk_create(fingerstick)
+        self.assertEqual(alerts.process_readings(self.user.pk, fingerstick), [])
+        bedtime = self.readings(115, measurement_type="bedtime", start=self.start + timedelta(hours=10))
+        GlucoseReading.objects.bulk_create(bedtime)
+        self.assertEqual(alerts.process_readings(self.user.pk, bedtime), [])
+        next_day = self.readings(100, measurement_type="night", start=self.start + timedelta(hours=20))
+        GlucoseReading.objects.bulk_create(next_day)
+        self.assertEqual(alerts.process_readings(self.user.pk, next_day), [])
+        self.assertFalse(GlucoseAlert.objects.filter(user=self.user, rule="missed_measurement").exists())
+
+    @override_settings(ALERT_NOTIFIER="glucose_tracker.tests.RecordingNotifier", ALLOWED_HOSTS=["testserver"])
+    def test_add_glucose_warns_and_notifies(self):
+        RecordingNotifier.sent = []
+        self.client.force_login(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse("add_glucose"),
+                {"timestamp": timezone.localtime().strftime("%Y-%m-%dT%H:%M"), "glucose_level": 45,
+                 "measurement_type": "night"},
+                follow=True,
+            )
+        self.assertContains(response, "alert-warning")
+        self.assertContains(response, "45 mg/dL ")
+        self.assertEqual([alert.rule for alert in RecordingNotifier.sent], ["below_target"])
+        self.assertEqual(GlucoseAlert.objects.get(user=self.user).reading.glucose_level, 45)
+
+
+@override_settings(ALLOWED_HOSTS=["testserver"])
+class FoodIndexTests(TestCase):
+    def setUp(self):
+        self.index = get_index()
+
+    def test_fuzzy_match_in_both_languages(self):
+        food, score = self.index.match("Spagheti Carbonara")
+        self.assertEqual(food.name_en, "spaghetti carbonara")
+        self.assertGreater(score, 0.8)
+        self.assertEqual(self.index.match("caffè")[0].name_en, "coffee")
+        self.assertLess(self.index.match("zzz")[1], 0.5)
+
+    def test_suggest_by_word_prefix(self):
+        names = [food.name_it for food in self.index.suggest("marg")]
+        self.assertEqual(names, ["pizza margherita"])
+
+    def test_estimate_splits_components_and_scales_quantities(self):
+        estimate = self.index.estimate("cornetto e cappuccino", "it", 0.5)
+        self.assertEqual([c["name"] for c in estimate["components"]], ["cornetto", "cappuccino"])
+        self.assertEqual(estimate["calories"], 340)
+        # A dish whose name contains a separator stays whole
+        self.assertEqual(len(self.index.estimate("pasta e fagioli", "it", 0.5)["components"]), 1)
+        estimate = self.index.estimate("160 g pasta, 2 beers", "en", 0.5)
+        self.assertEqual(estimate["calories"], 570 + 290)
+        self.assertEqual(estimate["carbs"], 116 + 24)
+        self.assertIsNone(self.index.estimate("pizza and something unknown", "en", 0.5))
+
+    def test_known_dish_skips_the_vision_api(self):
+        user = User.objects.create_user("eater")
+        self.client.force_login(user)
+        image = io.BytesIO()
+        Image.new("RGB", (64, 48), "orange").save(image, "JPEG")
+        photo = SimpleUploadedFile("meal.jpg", image.getvalue(), content_type="image/jpeg")
+        with mock.patch.object(views, "aanalyze_meal_image") as analyze, \
+                mock.patch("django.core.files.storage.FileSystemStorage.save", return_value="meals/meal.jpg"):
+            self.client.post(
+                reverse("add_meal"),
+                {"meal_type": "dinner", "timestamp": "2026-01-10T20:00", "dish": "pizza margherita", "photo": photo},
+            )
+        analyze.assert_not_called()
+        meal = Meal.objects.get(user=user)
+        self.assertEqual((meal.estimated_calories, meal.carbs_estimate), (800, 100))
+        self.assertEqual(meal.ai_response_raw["source"], "local")
+
+
+@override_settings(ALLOWED_HOSTS=["testserver"])
+class PhotoUploadTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings = override_settings(MEDIA_ROOT=media.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.user = User.objects.create_user("uploader")
+        self.client.force_login(self.user)
+        image = io.BytesIO()
+        Image.new("RGB", (640, 480), "orange").save(image, "JPEG")
+        self.photo = image.getvalue()
+
+    def create(self, length):
+        filename = base64.b64encode("pranzo.jpg".encode()).decode()
+        return self.client.post(
+            reverse("photo_uploads"), headers={"Upload-Length": str(length), "Upload-Metadata": f"filename {filename}"}
+        )
+
+    def patch(self, url, data, offset, checksum=None):
+        headers = {"Upload-Offset": str(offset)}
+        if checksum:
+            headers["Upload-Checksum"] = "sha256 " + base64.b64encode(hashlib.sha256(checksum).digest()).decode()
+        return self.client.patch(url, data, content_type="application/offset+octet-stream", headers=headers)
+
+    def test_chunks_resume_and_attach_to_a_meal(self):
+        response = self.create(len(self.photo))
+        self.assertEqual(response.status_code, 201)
+        url = response["Location"]
+        first, rest = self.photo[:1000], self.photo[1000:]
+
+        response = self.patch(url, first, 0, checksum=first)
+        self.assertEqual((response.status_code, response["Upload-Offset"]), (204, "1000"))
+        # A chunk sent twice, or out of order, is refused
+        self.assertEqual(self.patch(url, first, 0).status_code, 409)
+        # A corrupted chunk is discarded and can be sent again
+        self.assertEqual(self.patch(url, rest[:-1] + b"x", 1000, checksum=rest).status_code, 460)
+        response = self.client.head(url)
+        self.assertEqual((response["Upload-Offset"], response["Upload-Length"]), ("1000", str(len(self.photo))))
+        self.assertEqual(self.patch(url, rest, 1000, checksum=rest)["Upload-Offset"], str(len(self.photo)))
+
+        upload = PhotoUpload.objects.get()
+        with mock.patch.object(views, "aanalyze_meal_image", return_value={"description": "Pasta"}) as analyze:
+            response = self.client.post(
+                reverse("add_meal"), {"meal_type": "lunch", "timestamp": "2026-01-10T13:00", "upload": upload.pk}
+            )
+        self.assertRedirects(response, reverse("dashboard"))
+        meal = Meal.objects.get(user=self.user)
+        self.assertRegex(meal.photo.name, r"^meals/\d{4}/\d{2}/\d{2}/pranzo.*\.jpg$")
+        self.assertEqual(meal.description, "Pasta")
+        self.assertEqual(analyze.call_args.args[0].name, meal.photo.name)
+        with default_storage.open(meal.photo.name) as f:
+            self.assertEqual(f.read(), self.photo)
+        self.assertFalse(PhotoUpload.objects.exists())
+        self.assertFalse(default_storage.exists(upload.path))
+
+    def test_limits_and_ownership(self):
+        with self.settings(PHOTO_UPLOAD_MAX_BYTES=1000):
+            self.assertEqual(self.create(1001).status_code, 413)
+        url = self.create(10)["Location"]
+        self.assertEqual(self.patch(url, b"x" * 11, 0).status_code, 413)
+        self.assertEqual(self.client.head(url)["Upload-Offset"], "0")
+
+        other = Client()
+        other.force_login(User.objects.create_user("other"))
+        self.assertEqual(other.head(url).status_code, 404)
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertFalse(PhotoUpload.objects.exists())
+
+    def test_purge_uploads_command(self):
+        self.create(10)
+        other = Client()
+        other.force_login(User.objects.create_user("gone"))
+        filename = base64.b64encode(b"cena.jpg").decode()
+        other.post(reverse("photo_uploads"), headers={"Upload-Length": "10", "Upload-Metadata": f"filename {filename}"})
+        stale, recent = PhotoUpload.objects.order_by("user__username")
+        PhotoUpload.objects.filter(pk=stale.pk).update(created_at=timezone.now() - timedelta(hours=25))
+
+        out = io.StringIO()
+        call_command("purge_uploads", stdout=out)
+        self.assertIn("Deleted 1 expired uploads.", out.getvalue())
+        self.assertEqual(list(PhotoUpload.objects.all()), [recent])
+        self.assertFalse(default_storage.exists(stale.path))
+        self.assertTrue(default_storage.exists(recent.path))
+
+    def test_finalize_rejects_incomplete_and_non_images(self):
+        url = self.create(4)["Location"]
+        upload = PhotoUpload.objects.get()
+        meal = {"meal_type": "lunch", "timestamp": "2026-01-10T13:00", "upload": upload.pk}
+        self.patch(url, b"ab", 0)
+        response = self.client.post(reverse("add_meal"), meal)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context["form"].has_error("photo"))
+
+        self.patch(url, b"cd", 2)
+        response = self.client.post(reverse("add_meal"), meal)
+        self.assertTrue(response.context["form"].has_error("photo", "invalid_image"))
+        self.assertFalse(Meal.objects.exists())
+        self.assertFalse(PhotoUpload.objects.exists())
+
+    def test_expired_uploads_are_purged(self):
+        self.create(10)
+        stale = PhotoUpload.objects.get()
+        PhotoUpload.objects.filter(pk=stale.pk).update(created_at=timezone.now() - timedelta(days=2))
+        self.create(10)
+        self.assertFalse(PhotoUpload.objects.filter(pk=stale.pk).exists())
+        self.assertFalse(default_storage.exists(stale.path))
+
+
+@override_settings(ALLOWED_HOSTS=["testserver"], PHOTO_MAX_MEGAPIXELS=0.5)
+class PhotoEncodingTests(TestCase):
+    def jpeg(self, size, orientation=None):
+        exif = Image.Exif()
+        if orientation:
+            exif[ai_analyzer.EXIF_ORIENTATION] = orientation
+        output = io.BytesIO()
+        Image.new("RGB", size, "orange").save(output, "JPEG", exif=exif)
+        return output.getvalue()
+
+    def encoded_image(self, data):
+        return Image.open(io.BytesIO(base64.b64decode(ai_analyzer._encode_image(io.BytesIO(data)))))
+
+    def test_photo_sized_in_the_browser_is_sent_unchanged(self):
+        photo = self.jpeg((800, 600))
+        self.assertEqual(base64.b64decode(ai_analyzer._encode_image(io.BytesIO(photo))), photo)
+
+    def test_large_or_rotated_photo_is_resized_upright(self):
+        self.assertLessEqual(math.prod(self.encoded_image(self.jpeg((1600, 1200))).size), 500_000)
+        # Stored sideways, displayed rotated by 90 degrees
+        self.assertEqual(self.encoded_image(self.jpeg((800, 600), orientation=6)).size, (600, 800))
+        width, height = self.encoded_image(self.jpeg((1600, 1200), orientation=6)).size
+        self.assertLess(width, height)
+
+    def test_page_gets_the_size_unlocalized(self):
+        self.client.force_login(User.objects.create_user("resizer"))
+        response = self.client.get(reverse("add_meal"))
+        self.assertContains(response, "maxMegapixels: 0.5,")
+        self.assertContains(response, "quality: 0.85,")
+
+
+class SeedSyntheticTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings = override_settings(MEDIA_ROOT=media.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def seed(self, **options):
+        call_command(
+            "seed_synthetic", users=2, days=3, interval=15, seed=7, end_date=date(2025, 3, 9), prefix="seeded_",
+            replace=True, stdout=io.StringIO(), **options
+        )
+        owner = ("user__username",)
+        readings = GlucoseReading.objects.order_by("user__username", "timestamp").values_list(
+            *owner, "timestamp", "glucose_level", "measurement_type"
+        )
+        meals = Meal.objects.order_by("user__username", "timestamp").values_list(
+            *owner, "timestamp", "meal_type", "description", "estimated_calories", "carbs_estimate",
+            "glucose_baseline", "glucose_peak_rise", "glucose_auc_2h",
+        )
+        schedules = [
+            {field: value for field, value in row.items() if field not in ("id", "user_id")}
+            for row in MeasurementSchedule.objects.order_by("user__username").values()
+        ]
+        return list(readings), list(meals), schedules
+
+    def test_same_seed_same_data(self):
+        first = self.seed()
+        self.assertEqual(self.seed(), first)
+        self.assertNotEqual(self.seed(seed=8)[0], first[0])
+
+        readings, meals, schedules = first
+        self.assertEqual(len(readings), 2 * 3 * 24 * 4)
+        self.assertEqual(len(schedules), 2)
+        # Responses are computed after the bulk insert, and cached charts invalidated
+        first, last = readings[0][1] + timedelta(hours=1), readings[-1][1] - timedelta(hours=2)
+        covered = [meal for meal in meals if first <= meal[1] <= last]
+        self.assertTrue(covered)
+        self.assertTrue(all(meal[-2] is not None for meal in covered))
+        for user in User.objects.filter(username__startswith="seeded_"):
+            self.assertIsNotNone(cache.get(charts._version_key(user.pk)))
+
+    def test_readings_read_back_through_the_orm(self):
+        # Readings are inserted with raw SQL, bypassing the fields' own prep
+        self.seed(users=1)
+        readings = GlucoseReading.objects.filter(user__username="seeded_0").order_by("timestamp")
+        first, last = readings.first(), readings.last()
+        utc = timezone.get_fixed_timezone(0)
+        self.assertEqual(first.timestamp, timezone.datetime(2025, 3, 7, tzinfo=utc))
+        self.assertEqual(last.timestamp, timezone.datetime(2025, 3, 9, 23, 45, tzinfo=utc))
+        self.assertTrue(timezone.is_aware(first.created_at))
+        self.assertTrue(40 <= first.glucose_level <= 400)
+        self.assertIn(first.measurement_type, dict(GlucoseReading.MEASUREMENT_TYPE_CHOICES))
+        self.assertEqual(readings.filter(timestamp__date=date(2025, 3, 8)).count(), 24 * 4)
+
+
+class ReanalyzeMealsTests(TransactionTestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings = override_settings(MEDIA_ROOT=media.name, OPENAI_API_KEY="test")
+        settings.enable()
+        self.addCleanup(settings.disable)
+        image = io.BytesIO()
+        Image.new("RGB", (64, 48), "orange").save(image, "JPEG")
+        photo = default_storage.save("meals/a.jpg", ContentFile(image.getvalue()))
+
+        user = User.objects.create_user("reanalyzed")
+        earlier = timezone.now() - timedelta(days=1)
+        meal = dict(user=user, timestamp=earlier, meal_type="lunch", photo=photo)
+        self.failed = Meal.objects.create(**meal)
+        self.analyzed = Meal.objects.create(**meal, description="Pasta", ai_response_raw={"description": "Pasta"})
+        self.missing = Meal.objects.create(**{**meal, "photo": "meals/gone.jpg"})
+        Meal.objects.filter(pk__in=[self.failed.pk, self.analyzed.pk, self.missing.pk]).update(updated_at=earlier)
+        self.checkpoint = f"{media.name}/checkpoint.json"
+
+    def reanalyze(self, analysis=None, **options):
+        async def analyze(encoded, client):
+            return analysis or {"description": "Risotto", "calories": 500, "carbs": 70, "components": []}
+
+        out = io.StringIO()
+        path = "glucose_tracker.management.commands.reanalyze_meals.aanalyze_encoded_image"
+        with mock.patch(path, side_effect=analyze) as analyzer:
+            call_command(
+                "reanalyze_meals", workers=0, checkpoint=self.checkpoint, batch_size=1, stdout=out, **options
+            )
+        return analyzer.call_count, out.getvalue()
+
+    def test_failed_only_run_updates_and_resumes(self):
+        calls, output = self.reanalyze(failed_only=True, user=["reanalyzed"])
+        self.assertEqual(calls, 1)
+        self.assertIn("1 updated, 0 failed, 1 photos missing", output)
+
+        self.failed.refresh_from_db()
+        self.assertEqual((self.failed.description, self.failed.carbs_estimate), ("Risotto", 70))
+        self.assertGreater(self.failed.updated_at, self.failed.timestamp)  # bulk_update skips auto_now
+        self.analyzed.refresh_from_db()
+        self.assertEqual(self.analyzed.description, "Pasta")
+
+        with open(self.checkpoint) as f:
+            self.assertEqual(json.load(f)["last_id"], self.missing.pk)
+        self.assertEqual(self.reanalyze(failed_only=True, user=["reanalyzed"])[0], 0)
+        with self.assertRaises(CommandError):
+            self.reanalyze()
+        self.assertEqual(self.reanalyze(restart=True)[0], 2)
+
+    def test_missing_nutrition_completed_from_food_table(self):
+        UserProfile.objects.create(user=self.failed.user, language_preference="it")
+        analysis = {"description": "Pizza", "calories": None, "carbs": None, "components": ["trancio di pizza"]}
+        self.reanalyze(analysis, failed_only=True)
+        self.failed.refresh_from_db()
+        self.assertEqual((self.failed.estimated_calories, self.failed.carbs_estimate), (320, 40))
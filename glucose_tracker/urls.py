@@ -5,10 +5,18 @@ urlpatterns = [
     path("", views.dashboard, name="dashboard"),
     path("add-glucose/", views.add_glucose, name="add_glucose"),
     path("add-meal/", views.add_meal, name="add_meal"),
+    path("uploads/", views.photo_uploads, name="photo_uploads"),
+    path("uploads/<uuid:upload_id>/", views.photo_upload, name="photo_upload"),
+    path("foods/", views.food_suggestions, name="food_suggestions"),
     path("glucose-history/", views.glucose_list, name="glucose_list"),
     path("meal-history/", views.meal_list, name="meal_list"),
+    path("search/", views.search, name="search"),
     path("export/", views.export_data, name="export_data"),
     path("report/", views.generate_report, name="generate_report"),
+    path("report/monthly/", views.report_pack, name="report_pack"),
+    path("clinician/", views.clinician_overview, name="clinician_overview"),
     path("set-language/", views.set_language, name="set_language"),
     path("measurement-schedule/", views.measurement_schedule, name="measurement_schedule"),
+    path("sync/", views.sync_changes, name="sync_changes"),
+    path("metrics/", views.metrics, name="metrics"),
 ]
@@ -1,61 +1,94 @@
 import base64
 import json
-import requests
+from asgiref.sync import sync_to_async
 from django.conf import settings
 from django.utils.translation import gettext_lazy as _
-from PIL import Image
 import io
+from ..instrumentation import timed
+from ..metrics import record_ai_error
+from .lazy import lazy_import
 
+# Loaded on the first analysis, not when the views are imported
+Image = lazy_import("PIL.Image")
+ImageOps = lazy_import("PIL.ImageOps")
+httpx = lazy_import("httpx")
+requests = lazy_import("requests")
 
-def analyze_meal_image(image_file):
-    """
-    Analyzes a meal image using OpenAI GPT-5.1 Vision API.
-    Returns a dictionary with description, calories, carbs, and components.
+
+OPENAI_TIMEOUT = 30
+# EXIF tag giving the rotation and mirroring to display a photo upright
+EXIF_ORIENTATION = 0x0112
+
+PROMPT_TEXT = """
+    Analyze this food photo and provide:
+    1. Detailed description of the meal
+    2. Estimated total calories (kcal)
+    3. Estimated carbohydrates (grams)
+    4. Main components list
+    Format as JSON: {description, calories, carbs, components[]}
     """
-    api_key = settings.OPENAI_API_KEY
-    if not api_key:
-        return {"error": _("OpenAI API key not configured.")}
 
-    # Downsample image to 2 megapixels (approx 1600x1200) to reduce token usage
+
+def _encode_image(image_file):
+    """
+    Downsample the image to about PHOTO_MAX_MEGAPIXELS, upright, and return
+    it base64-encoded. An upright JPEG already that small, as the add meal
+    page sends it, is passed through unchanged.
+    Falls back to the original bytes if the image cannot be processed.
+    """
+    # Downsample image (2 megapixels by default, approx 1600x1200) to reduce token usage
     try:
         # Read the original image
         img = Image.open(image_file)
 
-        # Calculate target dimensions for 2 megapixels (maintaining aspect ratio)
-        target_megapixels = 2.0
+        # Calculate target dimensions for the configured size (maintaining aspect ratio)
+        target_megapixels = settings.PHOTO_MAX_MEGAPIXELS
         original_width, original_height = img.size
+        if (
+            img.format == "JPEG"
+            and original_width * original_height <= target_megapixels * 1e6
+            and img.getexif().get(EXIF_ORIENTATION, 1) == 1
+        ):
+            image_file.seek(0)
+            return base64.b64encode(image_file.read()).decode("utf-8")
+
         original_aspect = original_width / original_height
         target_width = int((target_megapixels * 1e6 * original_aspect) ** 0.5)
         target_height = int((target_megapixels * 1e6) / target_width)
 
+        # For JPEGs, let the decoder scale down by 1/2, 1/4 or 1/8 while
+        # decoding; a 12 MP photo then never gets decoded at full size
+        img.draft("RGB", (target_width, target_height))
+        # Phones store photos sideways with an EXIF orientation tag, which
+        # the re-encoded image would lose
+        size = img.size
+        ImageOps.exif_transpose(img, in_place=True)
+        if img.size != size:
+            target_width, target_height = target_height, target_width
+        original_width, original_height = img.size
+
         # Resize the image using high-quality downsampling
         if original_width > target_width or original_height > target_height:
             img = img.resize((target_width, target_height), Image.Resampling.LANCZOS)
 
         # Convert to JPEG format with good quality
         output_buffer = io.BytesIO()
-        img.save(output_buffer, format='JPEG', quality=85, optimize=True)
+        img.save(output_buffer, format='JPEG', quality=settings.PHOTO_JPEG_QUALITY, optimize=True)
         output_buffer.seek(0)
 
         # Encode the downsized image to base64
-        base64_image = base64.b64encode(output_buffer.read()).decode("utf-8")
-        output_buffer.seek(0)
+        return base64.b64encode(output_buffer.read()).decode("utf-8")
 
     except Exception as e:
         # Fallback to original image if downsizing fails
+        image_file.seek(0)
         base64_image = base64.b64encode(image_file.read()).decode("utf-8")
         image_file.seek(0)
+        return base64_image
 
-    headers = {"Content-Type": "application/json", "Authorization": f"Bearer {api_key}"}
 
-    prompt_text = """
-    Analyze this food photo and provide:
-    1. Detailed description of the meal
-    2. Estimated total calories (kcal)
-    3. Estimated carbohydrates (grams)
-    4. Main components list
-    Format as JSON: {description, calories, carbs, components[]}
-    """
+def _build_request(api_key, base64_image):
+    headers = {"Content-Type": "application/json", "Authorization": f"Bearer {api_key}"}
 
     payload = {
         "model": "gpt-5.1",  # Updated to GPT-5.1 model
@@ -63,7 +96,7 @@ def analyze_meal_image(image_file):
             {
                 "role": "user",
                 "content": [
-                    {"type": "text", "text": prompt_text},
+                    {"type": "text", "text": PROMPT_TEXT},
                     {
                         "type": "image_url",
                         "image_url": {"url": f"data:image/jpeg;base64,{base64_image}"},
@@ -74,25 +107,126 @@ def analyze_meal_image(image_file):
         "max_tokens": 500,
         "response_format": {"type": "json_object"},
     }
+    return headers, payload
+
+
+def _chat_completions_url():
+    return f"{settings.OPENAI_API_BASE.rstrip('/')}/chat/completions"
+
+
+def _parse_result(result):
+    content = result["choices"][0]["message"]["content"]
+    return json.loads(content)
+
+
+def apply_meal_analysis(meal, analysis):
+    """
+    Copy the analyzer output onto the meal.
+    Returns True if the analysis succeeded, False if it reported an error.
+    """
+    if "error" in analysis:
+        return False
+
+    meal.description = analysis.get("description", "")
+    # Validate and convert numeric fields safely
+    try:
+        meal.estimated_calories = int(analysis.get("calories", 0)) if analysis.get("calories") else None
+    except (ValueError, TypeError):
+        meal.estimated_calories = None
+
+    try:
+        meal.carbs_estimate = float(analysis.get("carbs", 0)) if analysis.get("carbs") else None
+    except (ValueError, TypeError):
+        meal.carbs_estimate = None
+
+    meal.ai_response_raw = analysis
+    return True
+
+
+@timed("ai")
+def analyze_meal_image(image_file):
+    """
+    Analyzes a meal image using OpenAI GPT-5.1 Vision API.
+    Returns a dictionary with description, calories, carbs, and components.
+    """
+    api_key = settings.OPENAI_API_KEY
+    if not api_key:
+        record_ai_error("not_configured")
+        return {"error": _("OpenAI API key not configured.")}
+
+    base64_image = _encode_image(image_file)
+    headers, payload = _build_request(api_key, base64_image)
 
     try:
         response = requests.post(
-            "https://api.openai.com/v1/chat/completions",
+            _chat_completions_url(),
             headers=headers,
             json=payload,
-            timeout=30,
+            timeout=OPENAI_TIMEOUT,
         )
         response.raise_for_status()
-        result = response.json()
+        return _parse_result(response.json())
 
-        content = result["choices"][0]["message"]["content"]
-        parsed_content = json.loads(content)
+    except requests.exceptions.RequestException as e:
+        if isinstance(e, requests.exceptions.Timeout):
+            record_ai_error("timeout")
+        elif isinstance(e, requests.exceptions.HTTPError):
+            record_ai_error("http_status")
+        else:
+            record_ai_error("connection")
+        return {"error": f"API Error: {str(e)}"}
+    except json.JSONDecodeError:
+        record_ai_error("invalid_response")
+        return {"error": "Failed to parse AI response."}
+    except Exception as e:
+        record_ai_error("unexpected")
+        return {"error": f"Unexpected error: {str(e)}"}
 
-        return parsed_content
 
-    except requests.exceptions.RequestException as e:
+@timed("ai")
+async def aanalyze_meal_image(image_file):
+    """
+    Async version of analyze_meal_image for async views.
+    The image resize runs in a worker thread and the API call awaits an
+    httpx request, so no thread is held while waiting for the model.
+    """
+    if not settings.OPENAI_API_KEY:
+        record_ai_error("not_configured")
+        return {"error": _("OpenAI API key not configured.")}
+
+    base64_image = await sync_to_async(_encode_image, thread_sensitive=False)(image_file)
+    async with httpx.AsyncClient(timeout=OPENAI_TIMEOUT) as client:
+        return await aanalyze_encoded_image(base64_image, client)
+
+
+async def aanalyze_encoded_image(base64_image, client):
+    """
+    Send an image already prepared by _encode_image with a shared
+    httpx.AsyncClient; used by bulk re-analysis to reuse connections.
+    """
+    api_key = settings.OPENAI_API_KEY
+    if not api_key:
+        record_ai_error("not_configured")
+        return {"error": _("OpenAI API key not configured.")}
+
+    headers, payload = _build_request(api_key, base64_image)
+
+    try:
+        response = await client.post(_chat_completions_url(), headers=headers, json=payload)
+        response.raise_for_status()
+        return _parse_result(response.json())
+
+    except httpx.HTTPError as e:
+        if isinstance(e, httpx.TimeoutException):
+            record_ai_error("timeout")
+        elif isinstance(e, httpx.HTTPStatusError):
+            record_ai_error("http_status")
+        else:
+            record_ai_error("connection")
         return {"error": f"API Error: {str(e)}"}
     except json.JSONDecodeError:
+        record_ai_error("invalid_response")
         return {"error": "Failed to parse AI response."}
     except Exception as e:
+        record_ai_error("unexpected")
         return {"error": f"Unexpected error: {str(e)}"}
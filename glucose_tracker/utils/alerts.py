@@ -0,0 +1,193 @@
+"""
+Glucose alerts, checked as readings are saved.
+
+- below_target / above_target: a reading leaves the profile's target range
+  (once per excursion, not on every reading outside it);
+- rising_fast / falling_fast: glucose moved at least
+  ALERT_RATE_MG_DL_PER_MIN since the previous reading, taken at most 15
+  minutes earlier;
+- prolonged_high: above the range for ALERT_PROLONGED_HIGH_MINUTES;
+- missed_measurement: a measurement in the user's schedule was skipped,
+  noticed when a later one of the same day, or the first of the next day,
+  is logged.
+
+The rules never query the history: everything they need about earlier
+readings is kept in the user's AlertState row, a few values updated with
+each reading. A reading entered late, older than the last one checked (a
+fingerstick logged after the CGM synced), is only held against the target
+range: the rate and streak rules would need the readings around it. It
+still counts as logging its scheduled measurement, so it is not reported
+missed later. Readings checked already are skipped, and readings older than
+ALERT_MAX_AGE_MINUTES do not alert, so importing history stays quiet.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from ..models import AlertState, GlucoseAlert, MeasurementSchedule
+
+logger = logging.getLogger("glucose_tracker.alerts")
+
+RATE_MAX_GAP = timedelta(minutes=15)
+DAYS = [day for day, _label in MeasurementSchedule.DAY_CHOICES]
+SLOTS = [slot for slot, _label in MeasurementSchedule.TIME_CHOICES]
+SLOT_BITS = {slot: 1 << position for position, slot in enumerate(SLOTS)}
+SLOT_BITS["fasting"] = SLOT_BITS["pre_breakfast"]
+
+
+def schedule_masks(schedule):
+    """Bitmask of the scheduled measurements of each weekday, Monday first."""
+    if schedule is None:
+        return [0] * len(DAYS)
+    return [
+        sum(1 << position for position, slot in enumerate(SLOTS) if getattr(schedule, f"{day}_{slot}"))
+        for day in DAYS
+    ]
+
+
+def _slots(mask):
+    return [slot for position, slot in enumerate(SLOTS) if mask & (1 << position)]
+
+
+class Rules:
+    """The alert rules for one user's targets and schedule."""
+
+    def __init__(self, target_min=70, target_max=180, scheduled=None, rate=None, prolonged_minutes=None):
+        self.target_min = target_min
+        self.target_max = target_max
+        self.scheduled = scheduled or [0] * len(DAYS)
+        self.rate = settings.ALERT_RATE_MG_DL_PER_MIN if rate is None else rate
+        prolonged_minutes = settings.ALERT_PROLONGED_HIGH_MINUTES if prolonged_minutes is None else prolonged_minutes
+        self.prolonged = timedelta(minutes=prolonged_minutes)
+
+    def _zone(self, level):
+        return -1 if level < self.target_min else 1 if level > self.target_max else 0
+
+    def check_late(self, state, timestamp, level, measurement_type):
+        """
+        The target rules for a reading older than ``state``'s latest. Only
+        the logged measurements of ``state``'s day change.
+        """
+        bit = SLOT_BITS.get(measurement_type, 0)
+        if bit and timezone.localtime(timestamp).date() == state.schedule_day:
+            state.logged_slots |= bit
+        zone = self._zone(level)
+        # Unless the latest reading is already outside the range the same way
+        if zone and zone != state.zone:
+            return [("below_target" if zone < 0 else "above_target", "")]
+        return []
+
+    def check(self, state, timestamp, level, measurement_type):
+        """Advance ``state`` past one reading; return the (rule, detail) pairs it fires."""
+        fired = []
+
+        zone = self._zone(level)
+        if zone and zone != state.zone:
+            fired.append(("below_target" if zone < 0 else "above_target", ""))
+        state.zone = zone
+
+        fast = False
+        if state.last_timestamp is not None and timestamp - state.last_timestamp <= RATE_MAX_GAP:
+            rate = (level - state.last_level) * 60 / (timestamp - state.last_timestamp).total_seconds()
+            fast = abs(rate) >= self.rate
+            if fast and not state.changing_fast:
+                fired.append(("rising_fast" if rate > 0 else "falling_fast", f"{rate:+.1f}"))
+        state.changing_fast = fast
+
+        if zone > 0:
+            if state.high_since is None:
+                state.high_since, state.high_alerted = timestamp, False
+            if not state.high_alerted and timestamp - state.high_since >= self.prolonged:
+                fired.append(("prolonged_high", str(int((timestamp - state.high_since).total_seconds() // 60))))
+                state.high_alerted = True
+        else:
+            state.high_since, state.high_alerted = None, False
+
+        day = timezone.localtime(timestamp).date()
+        if day != state.schedule_day:
+            if state.schedule_day == day - timedelta(days=1):
+                missed = self.scheduled[state.schedule_day.weekday()] & ~(state.logged_slots | state.alerted_slots)
+                fired.extend(("missed_measurement", slot) for slot in _slots(missed))
+            state.schedule_day, state.logged_slots, state.alerted_slots = day, 0, 0
+        bit = SLOT_BITS.get(measurement_type, 0)
+        if bit:
+            state.logged_slots |= bit
+            # Scheduled earlier in the day and neither logged nor alerted yet
+            missed = self.scheduled[day.weekday()] & (bit - 1) & ~(state.logged_slots | state.alerted_slots)
+            fired.extend(("missed_measurement", slot) for slot in _slots(missed))
+            state.alerted_slots |= missed
+
+        state.last_timestamp, state.last_level = timestamp, level
+        return fired
+
+
+class LogNotifier:
+    """Default notifier: one WARNING line per alert on the "glucose_tracker.alerts" logger."""
+
+    def notify(self, alerts):
+        for alert in alerts:
+            logger.warning(
+                "user=%s rule=%s level=%s detail=%s at=%s",
+                alert.user_id, alert.rule, alert.glucose_level, alert.detail, alert.timestamp.isoformat(),
+            )
+
+
+def get_notifier():
+    return import_string(settings.ALERT_NOTIFIER)()
+
+
+def rules_for(user_id):
+    """Rules with the user's targets and schedule, read in one query."""
+    user = User.objects.select_related("profile", "measurement_schedule").get(pk=user_id)
+    profile = getattr(user, "profile", None)
+    schedule = getattr(user, "measurement_schedule", None)
+    if profile is None:
+        return Rules(scheduled=schedule_masks(schedule))
+    return Rules(profile.target_glucose_min, profile.target_glucose_max, schedule_masks(schedule))
+
+
+def process_readings(user_id, readings):
+    """
+    Check saved ``readings`` of one user in time order, store the alerts
+    they fire and hand them to the notifier once committed. Call it after
+    inserting readings in bulk, which sends no post_save signal. Returns
+    the new GlucoseAlert rows.
+    """
+    if not settings.ALERTS_ENABLED or not readings:
+        return []
+    rules = rules_for(user_id)
+    readings = sorted(readings, key=lambda reading: (reading.timestamp, reading.pk))
+    recent = timezone.now() - timedelta(minutes=settings.ALERT_MAX_AGE_MINUTES)
+    alerts = []
+    with transaction.atomic():
+        state, _created = AlertState.objects.select_for_update().get_or_create(user_id=user_id)
+        # No id recorded (state from before it was kept): nothing checked yet
+        checked_up_to = state.last_reading_id or 0
+        for reading in readings:
+            if state.last_timestamp is None or reading.timestamp > state.last_timestamp:
+                fired = rules.check(state, reading.timestamp, reading.glucose_level, reading.measurement_type)
+            elif reading.pk > checked_up_to:
+                fired = rules.check_late(
+                    state, reading.timestamp, reading.glucose_level, reading.measurement_type
+                )
+            else:
+                continue
+            if fired and reading.timestamp >= recent:
+                alerts.extend(
+                    GlucoseAlert(
+                        user_id=user_id, reading=reading, rule=rule, timestamp=reading.timestamp,
+                        glucose_level=reading.glucose_level, detail=detail,
+                    )
+                    for rule, detail in fired
+                )
+        state.last_reading_id = max(checked_up_to, *(reading.pk for reading in readings))
+        state.save()
+        GlucoseAlert.objects.bulk_create(alerts)
+        if alerts:
+            transaction.on_commit(lambda: get_notifier().notify(alerts))
+    return alerts
@@ -0,0 +1,306 @@
+"""
+Glucose charts rendered on the server as SVG, for the dashboard and the PDF
+report (WeasyPrint runs no JavaScript):
+
+- trend: readings over time over the target range band, binned to at most
+  TREND_BINS points (mean line, min-max band where a bin holds several);
+- agp: ambulatory glucose profile, the 5th/25th/50th/75th/95th percentiles
+  of each AGP_SLOT_MINUTES slot of the day over the whole period;
+- tir: time in range, one stacked bar from very low to very high.
+
+The renderers take plain arrays of epoch seconds and mg/dL, and cost a few
+milliseconds. The readings are fetched once per set of charts, and the
+SVG is cached per user, period and language until a reading or the user's
+targets change (a signal bumps the user's data version) or
+CHART_CACHE_SECONDS pass.
+"""
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.utils import timezone, translation
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+from django.utils.translation import gettext as _
+
+from ..models import GlucoseReading, UserProfile
+from .postprandial import EpochSeconds
+
+WIDTH, HEIGHT = 600, 180
+LEFT, BOTTOM, TOP = 30, 16, 6
+# Readings beyond the axis are drawn at its edge
+Y_MIN, Y_MAX = 40, 350
+TREND_BINS = 300
+TIR_WIDTH = 300
+AGP_SLOT_MINUTES = 30
+AGP_MIN_READINGS = 3
+# Consecutive trend points further apart (or two bins, if wider) are not joined
+TREND_MAX_GAP = 24 * 3600
+VERY_LOW, VERY_HIGH = 54, 250
+DASHBOARD_TREND_DAYS, DASHBOARD_AGP_DAYS = 7, 14
+
+TARGET_FILL = "#e8f5e9"
+LINE = "#1976d2"
+BAND = "#bbdefb"
+GRID = "#9e9e9e"
+TIR_COLORS = ["#b71c1c", "#e53935", "#43a047", "#fbc02d", "#f57c00"]
+
+
+def _y(levels):
+    levels = np.clip(levels, Y_MIN, Y_MAX)
+    return np.rint(TOP + (Y_MAX - levels) * (HEIGHT - BOTTOM - TOP) / (Y_MAX - Y_MIN)).astype(int)
+
+
+def _x(values, start, end):
+    return np.rint(LEFT + (np.asarray(values) - start) * (WIDTH - LEFT) / max(end - start, 1)).astype(int)
+
+
+def _svg(label, body, width=WIDTH, height=HEIGHT):
+    return mark_safe(
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {width} {height}" width="{width}" '
+        f'height="{height}" font-family="sans-serif" font-size="10" role="img" '
+        f'aria-label="{escape(label)}">{body}</svg>'
+    )
+
+
+def _frame(target_min, target_max):
+    """Target band, horizontal grid lines and mg/dL labels."""
+    top, bottom = _y(np.array([target_max, target_min]))
+    parts = [f'<rect x="{LEFT}" y="{top}" width="{WIDTH - LEFT}" height="{bottom - top}" fill="{TARGET_FILL}"/>']
+    for level in sorted({target_min, target_max, VERY_HIGH}):
+        y = _y(np.array([level]))[0]
+        parts.append(
+            f'<path d="M{LEFT} {y}H{WIDTH}" stroke="{GRID}" stroke-width=".5" stroke-dasharray="2 3"/>'
+            f'<text x="{LEFT - 3}" y="{y + 3}" text-anchor="end">{level}</text>'
+        )
+    return "".join(parts)
+
+
+def _path(xs, ys):
+    return "M" + "L".join(f"{x} {y}" for x, y in zip(xs, ys))
+
+
+def _segments(xs, ys, breaks):
+    """One path through the points, restarting after each break."""
+    parts, start = [], 0
+    for end in [*breaks, len(xs)]:
+        if end > start:
+            parts.append(_path(xs[start:end], ys[start:end]))
+        start = end
+    return "".join(parts)
+
+
+def _band(xs, lows, highs, breaks):
+    """Closed area between two lines, one polygon per unbroken run."""
+    parts, start = [], 0
+    for end in [*breaks, len(xs)]:
+        if end - start > 1:
+            parts.append(_path(xs[start:end], highs[start:end]) + "L" + "L".join(
+                f"{x} {y}" for x, y in zip(xs[start:end][::-1], lows[start:end][::-1])
+            ) + "Z")
+        start = end
+    return "".join(parts)
+
+
+def _day_ticks(start, end):
+    """(epoch, label) of local midnights, at most 8 of them."""
+    first = timezone.localtime(datetime.fromtimestamp(start, dt_timezone.utc)).date() + timedelta(days=1)
+    last = timezone.localtime(datetime.fromtimestamp(end, dt_timezone.utc)).date()
+    days = (last - first).days + 1
+    step = max(1, -(-days // 8))
+    ticks = []
+    for offset in range(0, max(days, 0), step):
+        day = first + timedelta(days=offset)
+        epoch = timezone.make_aware(datetime.combine(day, datetime.min.time())).timestamp()
+        ticks.append((epoch, f"{day:%d/%m}"))
+    return ticks
+
+
+def trend_svg(times, levels, start, end, target_min=70, target_max=180):
+    """Readings between epoch seconds start and end, binned to TREND_BINS points."""
+    times, levels = np.asarray(times, dtype=np.int64), np.asarray(levels, dtype=np.float64)
+    keep = (times >= start) & (times < end)
+    times, levels = times[keep], levels[keep]
+    if not times.size:
+        return None
+
+    edges = np.linspace(start, end, TREND_BINS + 1)
+    bins = np.clip(np.searchsorted(edges, times, side="right") - 1, 0, TREND_BINS - 1)
+    counts = np.bincount(bins, minlength=TREND_BINS)
+    filled = np.flatnonzero(counts)
+    firsts = np.searchsorted(bins, filled)  # times are sorted, so each bin is one slice
+    means = np.bincount(bins, weights=levels, minlength=TREND_BINS)[filled] / counts[filled]
+    lows = np.minimum.reduceat(levels, firsts)
+    highs = np.maximum.reduceat(levels, firsts)
+    centers = np.bincount(bins, weights=times, minlength=TREND_BINS)[filled] / counts[filled]
+
+    xs = _x(centers, start, end)
+    max_gap = max(TREND_MAX_GAP, 2 * (end - start) / TREND_BINS)
+    breaks = (np.flatnonzero(np.diff(centers) > max_gap) + 1).tolist()
+    parts = [_frame(target_min, target_max)]
+    for epoch, label in _day_ticks(start, end):
+        x = _x([epoch], start, end)[0]
+        parts.append(
+            f'<path d="M{x} {TOP}V{HEIGHT - BOTTOM}" stroke="{GRID}" stroke-width=".3"/>'
+            f'<text x="{x}" y="{HEIGHT - 4}" text-anchor="middle">{label}</text>'
+        )
+    if (counts[filled] > 1).any():
+        parts.append(f'<path d="{_band(xs, _y(lows), _y(highs), breaks)}" fill="{BAND}"/>')
+    ys = _y(means)
+    parts.append(f'<path d="{_segments(xs, ys, breaks)}" fill="none" stroke="{LINE}" stroke-width="1.5"/>')
+    if filled.size <= 60:
+        parts.extend(f'<circle cx="{x}" cy="{y}" r="2" fill="{LINE}"/>' for x, y in zip(xs, ys))
+    return _svg(_("Glucose trend"), "".join(parts))
+
+
+def local_minutes(times):
+    """Minute of the local day of each epoch second, with one UTC offset lookup per day."""
+    times = np.asarray(times, dtype=np.int64)
+    days, inverse = np.unique(times // 86400, return_inverse=True)
+    offsets = np.array([
+        timezone.localtime(datetime.fromtimestamp(int(day) * 86400 + 43200, dt_timezone.utc))
+        .utcoffset().total_seconds()
+        for day in days
+    ], dtype=np.int64)
+    return (times + offsets[inverse]) % 86400 // 60
+
+
+def agp_svg(times, levels, target_min=70, target_max=180):
+    """Percentile bands of each slot of the day; slots with few readings are left out."""
+    levels = np.asarray(levels, dtype=np.float64)
+    if not levels.size:
+        return None
+    slots_per_day = 24 * 60 // AGP_SLOT_MINUTES
+    slots = local_minutes(times) // AGP_SLOT_MINUTES
+    order = np.lexsort((levels, slots))
+    slots, levels = slots[order], levels[order]
+    bounds = np.searchsorted(slots, np.arange(slots_per_day + 1))
+    present, rows = [], []
+    for slot in range(slots_per_day):
+        values = levels[bounds[slot]:bounds[slot + 1]]
+        if values.size >= AGP_MIN_READINGS:
+            present.append(slot)
+            rows.append(np.percentile(values, [5, 25, 50, 75, 95]))
+    if not rows:
+        return None
+
+    present, rows = np.array(present), np.array(rows)
+    xs = _x((present + 0.5) * AGP_SLOT_MINUTES, 0, 24 * 60)
+    breaks = (np.flatnonzero(np.diff(present) > 1) + 1).tolist()
+    p5, p25, p50, p75, p95 = (_y(rows[:, i]) for i in range(5))
+    parts = [_frame(target_min, target_max)]
+    for hour in range(0, 25, 6):
+        x = _x([hour * 60], 0, 24 * 60)[0]
+        parts.append(
+            f'<path d="M{x} {TOP}V{HEIGHT - BOTTOM}" stroke="{GRID}" stroke-width=".3"/>'
+            f'<text x="{min(x, WIDTH - 14)}" y="{HEIGHT - 4}" text-anchor="middle">{hour:02d}:00</text>'
+        )
+    parts.append(f'<path d="{_band(xs, p5, p95, breaks)}" fill="{BAND}"/>')
+    parts.append(f'<path d="{_band(xs, p25, p75, breaks)}" fill="#64b5f6"/>')
+    parts.append(f'<path d="{_segments(xs, p50, breaks)}" fill="none" stroke="{LINE}" stroke-width="2"/>')
+    return _svg(_("Ambulatory glucose profile"), "".join(parts))
+
+
+def tir_svg(levels, target_min=70, target_max=180):
+    """Share of readings very low, low, in range, high and very high, as one bar."""
+    levels = np.asarray(levels, dtype=np.float64)
+    if not levels.size:
+        return None
+    low, high = max(target_min, VERY_LOW), min(target_max, VERY_HIGH)
+    shares = np.bincount(np.digitize(levels, [VERY_LOW, low, high + 1, VERY_HIGH + 1]), minlength=5) / levels.size
+    labels = [_("Very low"), _("Low"), _("In range"), _("High"), _("Very high")]
+
+    bar, row = 20, 16
+    parts, x = [], 0.0
+    for share, color in zip(shares, TIR_COLORS):
+        if share:
+            parts.append(f'<rect x="{x:.0f}" y="0" width="{share * TIR_WIDTH + .5:.0f}" height="{bar}" fill="{color}"/>')
+        x += share * TIR_WIDTH
+    # Legend in the usual report order, very high first
+    for i, (share, color, label) in enumerate(reversed(list(zip(shares, TIR_COLORS, labels)))):
+        y = bar + 8 + i * row
+        parts.append(
+            f'<rect x="0" y="{y}" width="10" height="10" fill="{color}"/>'
+            f'<text x="16" y="{y + 9}">{escape(label)}</text>'
+            f'<text x="{TIR_WIDTH}" y="{y + 9}" text-anchor="end">{share * 100:.0f}%</text>'
+        )
+    height = bar + 8 + 5 * row
+    return _svg(_("Time in range"), "".join(parts), TIR_WIDTH, height)
+
+
+def _version_key(user_id):
+    return f"charts:version:{user_id}"
+
+
+def bump_version(user_id):
+    """Invalidate the user's cached charts."""
+    cache.set(_version_key(user_id), time.time_ns(), timeout=None)
+
+
+def _cached(user_id, label, build):
+    version = cache.get_or_set(_version_key(user_id), time.time_ns, timeout=None)
+    key = f"charts:{user_id}:{version}:{translation.get_language()}:{label}"
+    charts = cache.get(key)
+    if charts is None:
+        charts = build()
+        cache.set(key, charts, settings.CHART_CACHE_SECONDS)
+    return charts
+
+
+def _targets(user_id):
+    return UserProfile.objects.filter(user_id=user_id).values_list(
+        "target_glucose_min", "target_glucose_max"
+    ).first() or (70, 180)
+
+
+def fetch_series(user_id, start=None, end=None):
+    """The user's readings in [start, end) as sorted (epoch seconds, mg/dL) arrays."""
+    readings = GlucoseReading.objects.filter(user_id=user_id)
+    if start is not None:
+        readings = readings.filter(timestamp__gte=start)
+    if end is not None:
+        readings = readings.filter(timestamp__lt=end)
+    readings = readings.annotate(epoch=EpochSeconds("timestamp")).order_by("timestamp")
+    sql, params = readings.values_list("epoch", "glucose_level").query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = np.array(cursor.fetchall(), dtype=np.int64).reshape(-1, 2)
+    return rows[:, 0], rows[:, 1]
+
+
+def dashboard_charts(user_id):
+    """Trend of the last 7 days, AGP and time in range of the last 14."""
+    def build():
+        now = timezone.now()
+        times, levels = fetch_series(user_id, now - timedelta(days=DASHBOARD_AGP_DAYS))
+        target_min, target_max = _targets(user_id)
+        end = int(now.timestamp())
+        return {
+            "trend": trend_svg(times, levels, end - DASHBOARD_TREND_DAYS * 86400, end, target_min, target_max),
+            "agp": agp_svg(times, levels, target_min, target_max),
+            "tir": tir_svg(levels, target_min, target_max),
+        }
+
+    return _cached(user_id, "dashboard", build)
+
+
+def report_charts(user_id, start=None, end=None):
+    """Trend, AGP and time in range of readings in [start, end), or of all of them."""
+    def build():
+        times, levels = fetch_series(user_id, start, end)
+        if not times.size:
+            return {"trend": None, "agp": None, "tir": None}
+        target_min, target_max = _targets(user_id)
+        first = int(start.timestamp()) if start else int(times[0])
+        last = int(end.timestamp()) if end else int(times[-1]) + 1
+        return {
+            "trend": trend_svg(times, levels, first, last, target_min, target_max),
+            "agp": agp_svg(times, levels, target_min, target_max),
+            "tir": tir_svg(levels, target_min, target_max),
+        }
+
+    label = f"report:{start.timestamp() if start else ''}:{end.timestamp() if end else ''}"
+    return _cached(user_id, label, build)
@@ -1,52 +1,65 @@
 import csv
-import openpyxl
-from openpyxl.styles import Font, PatternFill
-from odf.opendocument import OpenDocumentSpreadsheet
-from odf.table import Table, TableRow, TableCell
-from odf.text import P
+import io
+import os
+import tempfile
+import zipfile
+from functools import lru_cache
+from django.core.files.storage import default_storage
 from django.http import HttpResponse
-from django.utils.translation import gettext_lazy as _
+from django.utils import timezone
 from ..models import GlucoseReading, Meal
+from .lazy import lazy_import
+from .streaming import streaming_response
+
+# Each format's library is imported by the first export in that format
+openpyxl = lazy_import("openpyxl")
+openpyxl_cell = lazy_import("openpyxl.cell")
+openpyxl_styles = lazy_import("openpyxl.styles")
+odf_opendocument = lazy_import("odf.opendocument")
+odf_table = lazy_import("odf.table")
+odf_text = lazy_import("odf.text")
+pa = lazy_import("pyarrow")
+pq = lazy_import("pyarrow.parquet")
 
 
 def export_to_csv(user):
     response = HttpResponse(content_type="text/csv")
     response["Content-Disposition"] = 'attachment; filename="glucosnap_export.csv"'
+    write_csv(user, response)
+    return response
+
 
-    writer = csv.writer(response)
+def write_csv(user, stream):
+    csv.writer(stream).writerows(csv_rows(user))
 
+
+def csv_rows(user):
     # Readings
-    writer.writerow(["--- Glucose Readings ---"])
-    writer.writerow(["Date", "Time", "Level (mg/dL)", "Type", "Notes"])
-    for reading in GlucoseReading.objects.filter(user=user):
-        writer.writerow(
-            [
-                reading.timestamp.date(),
-                reading.timestamp.time(),
-                reading.glucose_level,
-                reading.get_measurement_type_display(),
-                reading.notes,
-            ]
-        )
+    yield ["--- Glucose Readings ---"]
+    yield ["Date", "Time", "Level (mg/dL)", "Type", "Notes"]
+    for reading in GlucoseReading.objects.filter(user=user).iterator():
+        yield [
+            reading.timestamp.date(),
+            reading.timestamp.time(),
+            reading.glucose_level,
+            reading.get_measurement_type_display(),
+            reading.notes,
+        ]
 
-    writer.writerow([])
+    yield []
 
     # Meals
-    writer.writerow(["--- Meals ---"])
-    writer.writerow(["Date", "Time", "Type", "Description", "Calories", "Carbs"])
-    for meal in Meal.objects.filter(user=user):
-        writer.writerow(
-            [
-                meal.timestamp.date(),
-                meal.timestamp.time(),
-                meal.get_meal_type_display(),
-                meal.description or meal.manual_notes,
-                meal.estimated_calories,
-                meal.carbs_estimate,
-            ]
-        )
-
-    return response
+    yield ["--- Meals ---"]
+    yield ["Date", "Time", "Type", "Description", "Calories", "Carbs"]
+    for meal in Meal.objects.filter(user=user).iterator():
+        yield [
+            meal.timestamp.date(),
+            meal.timestamp.time(),
+            meal.get_meal_type_display(),
+            meal.description or meal.manual_notes,
+            meal.estimated_calories,
+            meal.carbs_estimate,
+        ]
 
 
 def export_to_excel(user):
@@ -54,24 +67,32 @@ def export_to_excel(user):
         content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
     )
     response["Content-Disposition"] = 'attachment; filename="glucosnap_export.xlsx"'
+    build_workbook(user).save(response)
+    return response
+
 
-    wb = openpyxl.Workbook()
+def _header_cells(ws, headers, color):
+    cells = []
+    for header in headers:
+        cell = openpyxl_cell.WriteOnlyCell(ws, value=header)
+        cell.font = openpyxl_styles.Font(bold=True)
+        cell.fill = openpyxl_styles.PatternFill(start_color=color, end_color=color, fill_type="solid")
+        cells.append(cell)
+    return cells
+
+
+def build_workbook(user):
+    # Write-only mode streams rows to the file on save instead of keeping a
+    # cell object per value, so large histories fit in constant memory.
+    wb = openpyxl.Workbook(write_only=True)
 
     # Readings Sheet
-    ws_readings = wb.active
-    ws_readings.title = "Glucose Readings"
+    ws_readings = wb.create_sheet("Glucose Readings")
 
     headers = ["Date", "Time", "Level (mg/dL)", "Type", "Notes"]
-    ws_readings.append(headers)
+    ws_readings.append(_header_cells(ws_readings, headers, "CCE5FF"))
 
-    # Style headers
-    for cell in ws_readings[1]:
-        cell.font = Font(bold=True)
-        cell.fill = PatternFill(
-            start_color="CCE5FF", end_color="CCE5FF", fill_type="solid"
-        )
-
-    for reading in GlucoseReading.objects.filter(user=user):
+    for reading in GlucoseReading.objects.filter(user=user).iterator():
         ws_readings.append(
             [
                 reading.timestamp.date(),
@@ -85,15 +106,9 @@ def export_to_excel(user):
     # Meals Sheet
     ws_meals = wb.create_sheet("Meals")
     headers = ["Date", "Time", "Type", "Description", "Calories", "Carbs"]
-    ws_meals.append(headers)
+    ws_meals.append(_header_cells(ws_meals, headers, "E5FFCC"))
 
-    for cell in ws_meals[1]:
-        cell.font = Font(bold=True)
-        cell.fill = PatternFill(
-            start_color="E5FFCC", end_color="E5FFCC", fill_type="solid"
-        )
-
-    for meal in Meal.objects.filter(user=user):
+    for meal in Meal.objects.filter(user=user).iterator():
         ws_meals.append(
             [
                 meal.timestamp.date(),
@@ -105,8 +120,7 @@ def export_to_excel(user):
             ]
         )
 
-    wb.save(response)
-    return response
+    return wb
 
 
 def export_to_ods(user):
@@ -115,21 +129,21 @@ def export_to_ods(user):
     )
     response["Content-Disposition"] = 'attachment; filename="glucosnap_export.ods"'
 
-    doc = OpenDocumentSpreadsheet()
+    doc = odf_opendocument.OpenDocumentSpreadsheet()
 
     # Readings Table
-    table_readings = Table(name="Glucose Readings")
+    table_readings = odf_table.Table(name="Glucose Readings")
 
     # Headers
-    tr = TableRow()
+    tr = odf_table.TableRow()
     for header in ["Date", "Time", "Level (mg/dL)", "Type", "Notes"]:
-        tc = TableCell()
-        tc.addElement(P(text=header))
+        tc = odf_table.TableCell()
+        tc.addElement(odf_text.P(text=header))
         tr.addElement(tc)
     table_readings.addElement(tr)
 
     for reading in GlucoseReading.objects.filter(user=user):
-        tr = TableRow()
+        tr = odf_table.TableRow()
         cells = [
             str(reading.timestamp.date()),
             str(reading.timestamp.time()),
@@ -138,25 +152,25 @@ def export_to_ods(user):
             reading.notes or "",
         ]
         for cell_val in cells:
-            tc = TableCell()
-            tc.addElement(P(text=cell_val))
+            tc = odf_table.TableCell()
+            tc.addElement(odf_text.P(text=cell_val))
             tr.addElement(tc)
         table_readings.addElement(tr)
 
     doc.spreadsheet.addElement(table_readings)
 
     # Meals Table
-    table_meals = Table(name="Meals")
+    table_meals = odf_table.Table(name="Meals")
 
-    tr = TableRow()
+    tr = odf_table.TableRow()
     for header in ["Date", "Time", "Type", "Description", "Calories", "Carbs"]:
-        tc = TableCell()
-        tc.addElement(P(text=header))
+        tc = odf_table.TableCell()
+        tc.addElement(odf_text.P(text=header))
         tr.addElement(tc)
     table_meals.addElement(tr)
 
     for meal in Meal.objects.filter(user=user):
-        tr = TableRow()
+        tr = odf_table.TableRow()
         cells = [
             str(meal.timestamp.date()),
             str(meal.timestamp.time()),
@@ -166,8 +180,8 @@ def export_to_ods(user):
             str(meal.carbs_estimate or ""),
         ]
         for cell_val in cells:
-            tc = TableCell()
-            tc.addElement(P(text=cell_val))
+            tc = odf_table.TableCell()
+            tc.addElement(odf_text.P(text=cell_val))
             tr.addElement(tc)
         table_meals.addElement(tr)
 
@@ -175,3 +189,207 @@ def export_to_ods(user):
 
     doc.save(response)
     return response
+
+
+# Columnar exports: one table per file, typed so analytics tools read them
+# without re-parsing text. Dictionaries are fixed to the model choices so
+# every record batch shares them, which the Arrow IPC stream requires.
+COLUMNAR_CHUNK_ROWS = 65536
+
+COLUMNAR_TABLES = {
+    "readings": (
+        GlucoseReading,
+        ["timestamp", "glucose_level", "measurement_type", "notes"],
+        lambda: pa.schema(
+            [
+                ("timestamp", pa.timestamp("us", tz="UTC")),
+                ("glucose_level", pa.int16()),
+                ("measurement_type", pa.dictionary(pa.int8(), pa.string())),
+                ("notes", pa.string()),
+            ]
+        ),
+    ),
+    "meals": (
+        Meal,
+        ["timestamp", "meal_type", "description", "estimated_calories", "carbs_estimate"],
+        lambda: pa.schema(
+            [
+                ("timestamp", pa.timestamp("us", tz="UTC")),
+                ("meal_type", pa.dictionary(pa.int8(), pa.string())),
+                ("description", pa.string()),
+                ("estimated_calories", pa.int32()),
+                ("carbs_estimate", pa.float64()),
+            ]
+        ),
+    ),
+}
+
+
+@lru_cache(maxsize=None)
+def _columnar_schema(table):
+    # Built on first use so that importing this module does not load pyarrow
+    return COLUMNAR_TABLES[table][2]()
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object whose contents are drained after each batch."""
+
+    def __init__(self):
+        super().__init__()
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def _record_batches(user, table):
+    model, fields, _schema = COLUMNAR_TABLES[table]
+    schema = _columnar_schema(table)
+    choices = {
+        name: [key for key, _label in model._meta.get_field(name).choices]
+        for name in fields
+        if model._meta.get_field(name).choices
+    }
+    codes = {name: {key: i for i, key in enumerate(keys)} for name, keys in choices.items()}
+
+    rows = model.objects.filter(user=user).order_by("timestamp").values_list(*fields)
+    columns = [[] for _ in fields]
+    for row in rows.iterator(chunk_size=COLUMNAR_CHUNK_ROWS):
+        for column, value in zip(columns, row):
+            column.append(value)
+        if len(columns[0]) == COLUMNAR_CHUNK_ROWS:
+            yield _to_batch(schema, fields, columns, choices, codes)
+            columns = [[] for _ in fields]
+    if columns[0]:
+        yield _to_batch(schema, fields, columns, choices, codes)
+
+
+def _to_batch(schema, fields, columns, choices, codes):
+    arrays = []
+    for name, column, field in zip(fields, columns, schema):
+        if name in choices:
+            indices = pa.array([codes[name].get(v) for v in column], type=pa.int8())
+            arrays.append(pa.DictionaryArray.from_arrays(indices, pa.array(choices[name], pa.string())))
+        else:
+            arrays.append(pa.array(column, type=field.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def _columnar_response(user, table, open_writer, content_type, extension, asgi):
+    schema = _columnar_schema(table)
+
+    def stream():
+        sink = _ChunkSink()
+        writer = open_writer(sink, schema)
+        for batch in _record_batches(user, table):
+            writer.write_batch(batch)
+            yield sink.drain()
+        writer.close()
+        yield sink.drain()
+
+    return streaming_response(stream(), content_type, f"glucosnap_{table}.{extension}", asgi)
+
+
+def export_to_parquet(user, table="readings", asgi=False):
+    """Parquet file with one row group per chunk of rows."""
+    return _columnar_response(
+        user,
+        table,
+        lambda sink, schema: pq.ParquetWriter(sink, schema, compression="zstd"),
+        "application/vnd.apache.parquet",
+        "parquet",
+        asgi,
+    )
+
+
+def export_to_arrow(user, table="readings", asgi=False):
+    """Arrow IPC stream, readable with pyarrow.ipc.open_stream."""
+    return _columnar_response(
+        user,
+        table,
+        pa.ipc.new_stream,
+        "application/vnd.apache.arrow.stream",
+        "arrows",
+        asgi,
+    )
+
+
+# Full archive: data files plus every meal photo, streamed as it is built.
+# Photos are already compressed, so deflating them would only burn CPU; so is
+# the XLSX, itself a ZIP.
+PHOTO_CHUNK_BYTES = 256 * 1024
+STORED_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".heic", ".gif"}
+# CSV rows written to the archive between two chunks sent
+CSV_BATCH_ROWS = 1000
+
+
+def _zip_entry(name, date_time, compress):
+    info = zipfile.ZipInfo(name, date_time=date_time.timetuple()[:6])
+    info.compress_type = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+    return info
+
+
+def _copy_entry(archive, sink, info, source, size):
+    """Copy the file object ``source`` into a new entry, yielding each chunk written."""
+    with archive.open(info, "w", force_zip64=size > zipfile.ZIP64_LIMIT) as entry:
+        while chunk := source.read(PHOTO_CHUNK_BYTES):
+            entry.write(chunk)
+            yield sink.drain()
+
+
+def _zip_chunks(user):
+    sink = _ChunkSink()
+    now = timezone.localtime()
+    with zipfile.ZipFile(sink, "w") as archive:
+        with archive.open(_zip_entry("glucosnap_export.csv", now, True), "w") as entry:
+            with io.TextIOWrapper(entry, encoding="utf-8", newline="") as text:
+                writer = csv.writer(text)
+                for count, row in enumerate(csv_rows(user), 1):
+                    writer.writerow(row)
+                    if count % CSV_BATCH_ROWS == 0:
+                        text.flush()
+                        yield sink.drain()
+        yield sink.drain()
+
+        # openpyxl assembles a workbook from temporary files on save and cannot
+        # write it piecemeal, so it is saved to disk first (about the size of
+        # the finished XLSX; memory stays constant) and copied in chunks.
+        with tempfile.TemporaryFile() as workbook:
+            build_workbook(user).save(workbook)
+            size = workbook.tell()
+            workbook.seek(0)
+            yield from _copy_entry(archive, sink, _zip_entry("glucosnap_export.xlsx", now, False), workbook, size)
+
+        meals = Meal.objects.filter(user=user).order_by("timestamp").values_list("id", "timestamp", "photo")
+        for meal_id, timestamp, photo in meals.iterator():
+            if not photo:
+                continue
+            extension = os.path.splitext(photo)[1].lower()
+            taken = timezone.localtime(timestamp)
+            name = f"photos/{taken:%Y-%m-%d_%H%M}_{meal_id}{extension}"
+            try:
+                source = default_storage.open(photo, "rb")
+            except OSError:
+                continue  # Missing from storage; export the rest
+            with source:
+                info = _zip_entry(name, taken, extension not in STORED_EXTENSIONS)
+                yield from _copy_entry(archive, sink, info, source, source.size)
+    yield sink.drain()
+
+
+def export_to_zip(user, asgi=False):
+    """
+    CSV and XLSX data plus all meal photos in one ZIP, streamed. The XLSX
+    is the one part that is not written straight into the stream: openpyxl
+    only saves finished workbooks, so it passes through a temporary file.
+    """
+    return streaming_response(_zip_chunks(user), "application/zip", "glucosnap_export.zip", asgi)
@@ -0,0 +1,197 @@
+"""
+Local food table: calories and carbs for common dishes without waiting for
+the vision model.
+
+The bundled table (data/foods.csv, one typical portion per row) is loaded
+once per process into two in-memory indexes over its English and Italian
+names: trigram posting lists for fuzzy matching, scored like pg_trgm's
+similarity(), and a sorted list of names and their word suffixes for
+prefix suggestions. A lookup is a few dictionary reads, in microseconds.
+"""
+import bisect
+import csv
+import re
+import unicodedata
+from collections import Counter
+from functools import lru_cache
+from pathlib import Path
+from typing import NamedTuple
+
+from django.conf import settings
+
+FOODS_CSV = Path(__file__).resolve().parent.parent / "data" / "foods.csv"
+
+# "2 beers", "150 g pasta", "3x cookies"
+QUANTITY = re.compile(r"^(\d+(?:[.,]\d+)?)\s*(g|gr|grams?|grammi|x)?\s+(.+)$")
+COMPONENT_SEPARATORS = re.compile(r"\s*(?:[,;+&/\n]|\band\b|\be\b)\s*")
+
+
+class Food(NamedTuple):
+    name_en: str
+    name_it: str
+    portion_g: int
+    calories: int
+    carbs: float
+
+    def name(self, language):
+        return self.name_it if language.startswith("it") else self.name_en
+
+
+def normalize(text):
+    """Lowercase, strip accents and punctuation: "Caffè " -> "caffe"."""
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(c for c in text if not unicodedata.combining(c)).lower()
+    return " ".join(re.findall(r"[a-z0-9]+", text))
+
+
+def trigrams(text):
+    """Trigrams of each word padded like pg_trgm: "pizza" -> "  p", " pi", ..."""
+    grams = set()
+    for word in text.split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class FoodIndex:
+    def __init__(self, foods):
+        self.foods = list(foods)
+        self.names = []  # (normalized name, food position)
+        for position, food in enumerate(self.foods):
+            for name in {normalize(food.name_en), normalize(food.name_it)}:
+                self.names.append((name, position))
+
+        self.postings = {}
+        self.sizes = []
+        self.prefixes = []
+        for name_id, (name, _position) in enumerate(self.names):
+            grams = trigrams(name)
+            self.sizes.append(len(grams))
+            for gram in grams:
+                self.postings.setdefault(gram, []).append(name_id)
+            words = name.split()
+            for i in range(len(words)):
+                self.prefixes.append((" ".join(words[i:]), name_id))
+        self.prefixes.sort()
+
+    @classmethod
+    def from_csv(cls, path=FOODS_CSV):
+        with open(path, newline="", encoding="utf-8") as f:
+            return cls(
+                Food(row["name_en"], row["name_it"], int(row["portion_g"]),
+                     int(row["calories"]), float(row["carbs"]))
+                for row in csv.DictReader(f)
+            )
+
+    def match(self, text):
+        """Return (food, similarity) of the closest name, or (None, 0.0)."""
+        query = trigrams(normalize(text))
+        if not query:
+            return None, 0.0
+        shared = Counter()
+        for gram in query:
+            shared.update(self.postings.get(gram, ()))
+        best, best_score = None, 0.0
+        for name_id, count in shared.items():
+            score = count / (len(query) + self.sizes[name_id] - count)
+            if score > best_score or (score == best_score and len(self.names[name_id][0]) < len(self.names[best][0])):
+                best, best_score = name_id, score
+        if best is None:
+            return None, 0.0
+        return self.foods[self.names[best][1]], best_score
+
+    def suggest(self, prefix, limit=10):
+        """Foods with a name, or a word of a name, starting with ``prefix``."""
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        found = []
+        i = bisect.bisect_left(self.prefixes, (prefix,))
+        while i < len(self.prefixes) and len(found) < limit:
+            suffix, name_id = self.prefixes[i]
+            if not suffix.startswith(prefix):
+                break
+            food = self.foods[self.names[name_id][1]]
+            if food not in found:
+                found.append(food)
+            i += 1
+        return found
+
+    def resolve(self, text, language, threshold):
+        """
+        One component, e.g. "2 beers" or "150 g pasta": the portion-scaled
+        entry, or None when no name is similar enough.
+        """
+        text = text.strip()
+        factor, unit = 1.0, None
+        quantity = QUANTITY.match(text)
+        if quantity:
+            amount, unit, text = quantity.groups()
+            factor = float(amount.replace(",", "."))
+        food, score = self.match(text)
+        if food is None or score < threshold:
+            return None
+        if unit and unit.startswith("g"):
+            factor /= food.portion_g
+        return {
+            "name": food.name(language),
+            "portion_g": round(food.portion_g * factor),
+            "calories": food.calories * factor,
+            "carbs": food.carbs * factor,
+            "confidence": round(score, 2),
+        }
+
+    def estimate(self, text, language="en", threshold=None):
+        """
+        Analyzer-shaped result for a typed dish or list of dishes, or None
+        if any part of it is not confidently in the table. The text is read
+        both as one dish and as a list; the reading with the weaker worst
+        match loses, so "pasta e fagioli" stays one dish while "cornetto e
+        cappuccino" becomes two.
+        """
+        threshold = settings.FOOD_MATCH_THRESHOLD if threshold is None else threshold
+        whole = self.resolve(text, language, threshold)
+        parts = [part for part in COMPONENT_SEPARATORS.split(text) if part.strip()]
+        components = [self.resolve(part, language, threshold) for part in parts]
+        if len(components) < 2 or None in components:
+            components = None
+        if whole and (not components or whole["confidence"] >= min(c["confidence"] for c in components)):
+            components = [whole]
+        return self._totals(components) if components else None
+
+    @staticmethod
+    def _totals(components):
+        return {
+            "description": ", ".join(f"{c['name']} ({c['portion_g']} g)" for c in components),
+            "calories": round(sum(c["calories"] for c in components)),
+            "carbs": round(sum(c["carbs"] for c in components), 1),
+            "components": components,
+            "source": "local",
+        }
+
+
+@lru_cache(maxsize=None)
+def get_index():
+    return FoodIndex.from_csv()
+
+
+def estimate_meal(text, language="en"):
+    return get_index().estimate(text, language)
+
+
+def complete_analysis(analysis, language="en"):
+    """
+    Fill calories and carbs the vision model left out from its
+    ``components`` list, when every component is in the local table.
+    """
+    if "error" in analysis or (analysis.get("calories") and analysis.get("carbs")):
+        return analysis
+    names = [
+        component.get("name", "") if isinstance(component, dict) else str(component)
+        for component in analysis.get("components") or []
+    ]
+    local = get_index().estimate(", ".join(names), language) if names else None
+    if local:
+        analysis = {**analysis, "calories": analysis.get("calories") or local["calories"],
+                    "carbs": analysis.get("carbs") or local["carbs"], "local_components": local["components"]}
+    return analysis
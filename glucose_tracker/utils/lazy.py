@@ -0,0 +1,36 @@
+"""
+Deferred imports for heavy optional toolchains (Pillow, requests, httpx,
+WeasyPrint, openpyxl, odfpy, pyarrow, prometheus_client).
+
+    Image = lazy_import("PIL.Image")
+    ...
+    Image.open(photo)  # PIL is imported here, on first use
+
+A worker or management command that never resizes a photo or writes a
+spreadsheet then never pays for importing those libraries. Unlike
+importlib.util.LazyLoader, nothing is looked up at declaration time, so
+submodules such as "pyarrow.parquet" do not import their package early.
+"""
+import importlib
+
+
+class LazyModule:
+    """Stands in for module ``name``; the first attribute access imports it."""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        # Only called for attributes not set in __init__
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+    def __repr__(self):
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<lazy module {self._name!r} ({state})>"
+
+
+def lazy_import(name):
+    return LazyModule(name)
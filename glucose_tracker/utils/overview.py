@@ -0,0 +1,78 @@
+"""
+The clinician overview: every assigned patient's latest reading, 14-day
+average and time in range, and how long ago they last uploaded anything.
+
+A page of patients costs one query however many there are. The 14-day
+statistics come from a single grouped join on the page's readings in the
+window (FilteredRelation puts the date bound in the join, so patients with
+no recent readings still appear), and the latest reading and upload times
+are LIMIT 1 subqueries, each one step down an index on (user, timestamp) or
+(user, created_at). Uploads are dated by created_at rather than updated_at,
+which maintenance jobs such as refresh_postprandial also set. Pages follow
+each other by username (keyset), so a deep page is as cheap as the first.
+"""
+
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.db.models import Avg, Count, F, FilteredRelation, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from ..models import CareAssignment, GlucoseReading, Meal
+
+# Days covered by the average and time in range
+OVERVIEW_DAYS = 14
+OVERVIEW_PAGE_SIZE = 50
+# Defaults of UserProfile, for patients without a profile
+DEFAULT_TARGET_MIN = 70
+DEFAULT_TARGET_MAX = 180
+
+
+def _latest(queryset, field, by=None):
+    """``field`` of the row of ``queryset`` with the highest ``by`` (default: ``field``)."""
+    return Subquery(queryset.order_by(f"-{by or field}").values(field)[:1])
+
+
+def patient_overview(clinician, after="", limit=OVERVIEW_PAGE_SIZE, now=None):
+    """
+    Up to ``limit`` of ``clinician``'s patients with usernames after
+    ``after``, in username order, and the username to continue from (None
+    on the last page).
+    """
+    now = now or timezone.now()
+    since = now - timedelta(days=OVERVIEW_DAYS)
+    readings = GlucoseReading.objects.filter(user=OuterRef("pk"))
+    in_range = Q(recent__glucose_level__gte=F("target_min"), recent__glucose_level__lte=F("target_max"))
+    # The page is picked first, so only its patients' readings are grouped
+    page = (
+        CareAssignment.objects.filter(clinician=clinician, patient__username__gt=after)
+        .order_by("patient__username")
+        .values("patient_id")[: limit + 1]
+    )
+    patients = list(
+        User.objects.filter(pk__in=page)
+        .annotate(
+            recent=FilteredRelation("glucose_readings", condition=Q(glucose_readings__timestamp__gte=since)),
+            target_min=Coalesce("profile__target_glucose_min", Value(DEFAULT_TARGET_MIN)),
+            target_max=Coalesce("profile__target_glucose_max", Value(DEFAULT_TARGET_MAX)),
+        )
+        .annotate(
+            average=Avg("recent__glucose_level"),
+            readings=Count("recent"),
+            in_range=Count("recent", filter=in_range),
+            last_level=_latest(readings, "glucose_level", by="timestamp"),
+            last_reading_at=_latest(readings, "timestamp"),
+            last_reading_upload=_latest(readings, "created_at"),
+            last_meal_upload=_latest(Meal.objects.filter(user=OuterRef("pk")), "created_at"),
+        )
+        .order_by("username")
+    )
+    for patient in patients:
+        patient.time_in_range = 100 * patient.in_range / patient.readings if patient.readings else None
+        uploads = [at for at in (patient.last_reading_upload, patient.last_meal_upload) if at]
+        patient.last_upload = max(uploads, default=None)
+        patient.upload_age = now - patient.last_upload if patient.last_upload else None
+    if len(patients) > limit:
+        return patients[:limit], patients[limit - 1].username
+    return patients, None
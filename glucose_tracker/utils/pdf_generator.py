@@ -1,18 +1,45 @@
+from datetime import timedelta
+from functools import lru_cache
+
+from django.contrib.staticfiles import finders
 from django.http import HttpResponse
 from django.template.loader import render_to_string
-from weasyprint import HTML
 from django.utils import timezone
 from ..models import GlucoseReading, Meal
 from django.db.models import Avg, Min, Max, StdDev
+from ..instrumentation import timed
+from .charts import report_charts
+from .lazy import lazy_import
 
+weasyprint = lazy_import("weasyprint")
+weasyprint_fonts = lazy_import("weasyprint.text.fonts")
 
-def generate_pdf_report(user):
-    response = HttpResponse(content_type="application/pdf")
-    response["Content-Disposition"] = 'attachment; filename="glucosnap_report.pdf"'
+REPORT_STYLESHEET = "css/pdf_report.css"
+
+
+@lru_cache(maxsize=None)
+def report_assets():
+    """
+    WeasyPrint options shared by every report a process renders: the
+    stylesheet, parsed once, the font configuration it loaded, and the
+    image cache.
+    """
+    font_config = weasyprint_fonts.FontConfiguration()
+    with open(finders.find(REPORT_STYLESHEET), encoding="utf-8") as f:
+        stylesheet = weasyprint.CSS(string=f.read(), font_config=font_config)
+    return {"stylesheets": [stylesheet], "font_config": font_config, "cache": {}}
 
-    # Gather Data
+
+def render_pdf(user, start=None, end=None, target=None):
+    """
+    Render the report for readings in [start, end), or the whole history.
+    Writes to ``target`` if given, otherwise returns the PDF bytes.
+    """
     readings = GlucoseReading.objects.filter(user=user).order_by("timestamp")
     meals = Meal.objects.filter(user=user).order_by("timestamp")
+    if start is not None:
+        readings = readings.filter(timestamp__gte=start, timestamp__lt=end)
+        meals = meals.filter(timestamp__gte=start, timestamp__lt=end)
 
     stats = readings.aggregate(
         avg=Avg("glucose_level"),
@@ -24,14 +51,23 @@ def generate_pdf_report(user):
     context = {
         "user": user,
         "generated_at": timezone.now(),
+        "period_start": start,
+        "period_end": end and end - timedelta(days=1),
         "readings": readings,
         "meals": meals,
         "stats": stats,
+        "charts": report_charts(user.id, start, end),
     }
 
     html_string = render_to_string("glucose_tracker/pdf_report.html", context)
 
-    html = HTML(string=html_string)
-    html.write_pdf(response)
+    html = weasyprint.HTML(string=html_string)
+    return html.write_pdf(target, **report_assets())
+
 
+@timed("pdf")
+def generate_pdf_report(user):
+    response = HttpResponse(content_type="application/pdf")
+    response["Content-Disposition"] = 'attachment; filename="glucosnap_report.pdf"'
+    render_pdf(user, target=response)
     return response
@@ -0,0 +1,155 @@
+"""
+Postprandial response: how glucose moved in the two hours after each meal.
+
+For every meal, relative to the baseline (the last reading in the 30
+minutes up to the meal):
+
+- peak rise: highest reading in the window minus the baseline (mg/dL);
+- time to peak: minutes from the meal to that reading;
+- 2h AUC: incremental area above the baseline (mg/dL x min), trapezoids
+  starting from the baseline at the meal time.
+
+A user's meals and readings are each fetched once, sorted by time. Both
+series are merged with searchsorted, which gives every meal its baseline
+and window bounds in one pass, and the windows are then evaluated together
+as a padded (meals x readings) matrix.
+"""
+from datetime import timedelta
+
+import numpy as np
+from django.db import connection, transaction
+from django.db.models import BigIntegerField, Func
+from django.utils import timezone
+
+from ..models import GlucoseReading, Meal
+
+WINDOW = timedelta(hours=2)
+BASELINE_LOOKBACK = timedelta(minutes=30)
+RESPONSE_FIELDS = ["glucose_baseline", "glucose_peak_rise", "glucose_time_to_peak", "glucose_auc_2h"]
+
+
+def compute_responses(meal_times, reading_times, levels):
+    """
+    meal_times and reading_times are sorted int64 epoch seconds. Returns
+    float arrays (baseline, peak_rise, time_to_peak in minutes, auc), one
+    value per meal, NaN where there is no baseline or no reading after the
+    meal.
+    """
+    meal_times = np.asarray(meal_times, dtype=np.int64)
+    reading_times = np.asarray(reading_times, dtype=np.int64)
+    levels = np.asarray(levels, dtype=np.float64)
+    nan = np.full(len(meal_times), np.nan)
+    if not len(meal_times) or not len(reading_times):
+        return nan, nan.copy(), nan.copy(), nan.copy()
+
+    window = int(WINDOW.total_seconds())
+    lookback = int(BASELINE_LOOKBACK.total_seconds())
+
+    # Merge: the last reading at or before each meal, and the readings after it
+    start = np.searchsorted(reading_times, meal_times, side="right")
+    end = np.searchsorted(reading_times, meal_times + window, side="right")
+    before = np.maximum(start - 1, 0)
+    has_baseline = (start > 0) & (reading_times[before] >= meal_times - lookback)
+    baseline = np.where(has_baseline, levels[before], np.nan)
+
+    counts = end - start
+    width = max(int(counts.max()), 1)
+    offsets = np.arange(width)
+    inside = offsets < counts[:, None]
+    index = np.minimum(start[:, None] + offsets, len(reading_times) - 1)
+    rise = np.where(inside, levels[index] - baseline[:, None], -np.inf)
+    minutes = (reading_times[index] - meal_times[:, None]) / 60.0
+
+    peak = rise.argmax(axis=1)
+    rows = np.arange(len(meal_times))
+    valid = has_baseline & (counts > 0)
+    peak_rise = np.where(valid, rise[rows, peak], np.nan)
+    time_to_peak = np.where(valid, minutes[rows, peak], np.nan)
+
+    # Trapezoids from (0, 0) through each reading above the baseline
+    above = np.where(inside, np.clip(rise, 0, None), 0.0)
+    heights = np.concatenate([np.zeros((len(rows), 1)), above], axis=1)
+    times = np.concatenate([np.zeros((len(rows), 1)), minutes], axis=1)
+    areas = (heights[:, 1:] + heights[:, :-1]) / 2 * np.diff(times, axis=1)
+    auc = np.where(valid, np.where(inside, areas, 0.0).sum(axis=1), np.nan)
+    return baseline, peak_rise, time_to_peak, auc
+
+
+class EpochSeconds(Func):
+    """Seconds since 1970 computed by the database, not a datetime per row."""
+
+    output_field = BigIntegerField()
+    template = "UNIX_TIMESTAMP(%(expressions)s)"
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, template="CAST(strftime('%%%%s', %(expressions)s) AS INTEGER)")
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, template="EXTRACT(EPOCH FROM %(expressions)s)::bigint")
+
+
+def _stored(value, digits=None):
+    if np.isnan(value):
+        return None
+    return round(float(value), digits) if digits else int(round(value))
+
+
+def refresh_responses(user_id, since=None, until=None):
+    """
+    Recompute and save the response of the user's meals taken between
+    since and until (all meals if omitted): two reads and one batched
+    UPDATE of the meals whose values changed, however many are in range.
+    Returns that number.
+    """
+    meals = Meal.objects.filter(user_id=user_id)
+    if since is not None:
+        meals = meals.filter(timestamp__gte=since)
+    if until is not None:
+        meals = meals.filter(timestamp__lte=until)
+    meals = meals.annotate(epoch=EpochSeconds("timestamp")).order_by("timestamp", "id")
+    meals = list(meals.values_list("id", "epoch", "timestamp", *RESPONSE_FIELDS))
+    if not meals:
+        return 0
+
+    readings = GlucoseReading.objects.filter(
+        user_id=user_id,
+        timestamp__gte=meals[0][2] - BASELINE_LOOKBACK,
+        timestamp__lte=meals[-1][2] + WINDOW,
+    ).annotate(epoch=EpochSeconds("timestamp"))
+    # Plain integer pairs: run the compiled query without per-row converters
+    sql, params = readings.order_by("timestamp").values_list("epoch", "glucose_level").query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        readings = np.array(cursor.fetchall(), dtype=np.int64).reshape(-1, 2)
+
+    results = compute_responses([meal[1] for meal in meals], readings[:, 0], readings[:, 1])
+    changed = []
+    for (meal_id, _epoch, _timestamp, *current), baseline, rise, peak, auc in zip(meals, *results):
+        values = [_stored(baseline), _stored(rise), _stored(peak), _stored(auc, 1)]
+        if values != current:
+            changed.append((*values, meal_id))
+    if changed:
+        # One prepared UPDATE per row: bulk_update's CASE expressions cost
+        # more to build than the whole computation. updated_at is set here
+        # since auto_now does not apply; sync clients rely on it.
+        table = connection.ops.quote_name(Meal._meta.db_table)
+        assignments = ", ".join(f"{connection.ops.quote_name(field)} = %s" for field in RESPONSE_FIELDS)
+        now = connection.ops.adapt_datetimefield_value(timezone.now())
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.executemany(
+                f"UPDATE {table} SET {assignments}, updated_at = %s WHERE id = %s",
+                [(*values[:-1], now, values[-1]) for values in changed],
+            )
+    return len(changed)
+
+
+def refresh_around(user_id, *moments):
+    """Refresh the meals whose baseline or window includes a reading at any of ``moments``."""
+    spans = []
+    for moment in sorted(moments):
+        since, until = moment - WINDOW, moment + BASELINE_LOOKBACK
+        if spans and since <= spans[-1][1]:
+            spans[-1][1] = until
+        else:
+            spans.append([since, until])
+    return sum(refresh_responses(user_id, since, until) for since, until in spans)
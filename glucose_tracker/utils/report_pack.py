@@ -0,0 +1,149 @@
+"""
+Report packs: one PDF per patient and month, rendered in parallel and
+streamed as a ZIP.
+
+WeasyPrint is single-threaded and CPU-bound, so the (patient, month) jobs
+fan out over a pool of worker processes. Workers are spawned rather than
+forked, so none inherits the server's database connections or pool; each
+sets Django up once and loads the report assets (stylesheet, fonts) once,
+then reuses them for every report it renders. PDFs enter the ZIP as they
+finish, so the download starts with the first one. Workers import this
+module before setting Django up, hence the imports inside functions.
+
+The report_pack command starts a pool for its run. Web requests share one
+long-lived pool per server process instead, started on first use, so its
+size (REPORT_PACK_WORKERS) caps the rendering processes however many
+downloads run at once; further reports queue for a free worker.
+"""
+import multiprocessing
+import os
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+
+import django
+from django.conf import settings
+from django.utils import timezone, translation
+
+
+def month_periods(months, today=None):
+    """[start, end) of the last ``months`` calendar months, current one included, oldest first."""
+    today = today or timezone.localdate()
+    year, month = today.year, today.month
+    periods = []
+    for _ in range(months):
+        start = timezone.make_aware(datetime(year, month, 1))
+        end = timezone.make_aware(datetime(year + month // 12, month % 12 + 1, 1))
+        periods.append((start, end))
+        year, month = (year, month - 1) if month > 1 else (year - 1, 12)
+    return periods[::-1]
+
+
+def pack_jobs(users, months, today=None):
+    language = translation.get_language()
+    return [
+        (user.pk, start, end, language)
+        for user in users
+        for start, end in month_periods(months, today)
+    ]
+
+
+def render_job(user_id, start, end, language):
+    """Render one month's report; returns (ZIP entry name, PDF bytes)."""
+    from django.contrib.auth.models import User
+
+    from .pdf_generator import render_pdf
+
+    user = User.objects.get(pk=user_id)
+    with translation.override(language):
+        pdf = render_pdf(user, start, end)
+    return f"{user.username}/{user.username}_{timezone.localtime(start):%Y-%m}.pdf", pdf
+
+
+def _init_worker():
+    django.setup()
+    from .pdf_generator import report_assets
+
+    report_assets()
+
+
+def _start_pool(workers):
+    return ProcessPoolExecutor(
+        workers, mp_context=multiprocessing.get_context("spawn"), initializer=_init_worker
+    )
+
+
+def _completed(executor, jobs):
+    """Yield (name, pdf) for ``jobs`` submitted to ``executor`` as they complete."""
+    futures = [executor.submit(render_job, *job) for job in jobs]
+    try:
+        for future in as_completed(futures):
+            yield future.result()
+    finally:
+        # Also reached when the client disconnects mid-download
+        for future in futures:
+            future.cancel()
+
+
+def render_jobs(jobs, workers):
+    """Yield (name, pdf) for ``jobs`` as they complete; ``workers`` <= 1 renders in this process."""
+    if workers <= 1 or len(jobs) <= 1:
+        for job in jobs:
+            yield render_job(*job)
+        return
+    executor = _start_pool(min(workers, len(jobs)))
+    try:
+        yield from _completed(executor, jobs)
+    finally:
+        executor.shutdown(cancel_futures=True)
+
+
+_shared_pool = None
+_shared_pool_lock = threading.Lock()
+
+
+def shared_pool():
+    """The pool web requests render with, started on first use."""
+    global _shared_pool
+    with _shared_pool_lock:
+        if _shared_pool is None:
+            _shared_pool = _start_pool(settings.REPORT_PACK_WORKERS or os.cpu_count())
+        return _shared_pool
+
+
+def render_shared(jobs):
+    """Like render_jobs, on the shared pool (in this process with REPORT_PACK_WORKERS=1)."""
+    global _shared_pool
+    if settings.REPORT_PACK_WORKERS == 1:
+        yield from render_jobs(jobs, 1)
+        return
+    executor = shared_pool()
+    try:
+        yield from _completed(executor, jobs)
+    except BrokenProcessPool:
+        # A worker died; the next request starts a new pool
+        with _shared_pool_lock:
+            if _shared_pool is executor:
+                _shared_pool = None
+        executor.shutdown(wait=False, cancel_futures=True)
+        raise
+
+
+def pack_chunks(jobs, workers=None):
+    """
+    The ZIP of the rendered reports, in chunks as each PDF is added. Without
+    ``workers`` the reports go to the shared pool, as for web requests.
+    """
+    from .export_utils import _ChunkSink, _zip_entry
+
+    reports = render_shared(jobs) if workers is None else render_jobs(jobs, workers)
+    sink = _ChunkSink()
+    now = timezone.localtime()
+    with zipfile.ZipFile(sink, "w") as archive:
+        for name, pdf in reports:
+            # PDF streams are already compressed
+            archive.writestr(_zip_entry(name, now, False), pdf)
+            yield sink.drain()
+    yield sink.drain()
@@ -0,0 +1,260 @@
+"""
+Full-text search over meal descriptions/notes and reading notes.
+
+SQLite keeps an FTS5 table per model, an external-content index over the
+model table maintained by triggers. PostgreSQL uses a GIN index on a
+tsvector expression holding both the English and the Italian stems, so a
+search in either language matches. Both indexes also carry the owner as a
+token, which makes "this user's rows matching X" a single index lookup.
+Only rows with some text are indexed.
+
+Results are ranked (bm25 / ts_rank, description above notes) and paginated
+with a keyset on (score, id): the cursor holds the last pair sent.
+"""
+import re
+
+from django.core import signing
+from django.db import connection
+
+from ..models import GlucoseReading, Meal
+
+CURSOR_SALT = "glucose_tracker.search"
+MAX_TERMS = 8
+
+# Model and searched columns, in ranking order
+SEARCHES = {
+    "meals": (Meal, ["description", "manual_notes"]),
+    "readings": (GlucoseReading, ["notes"]),
+}
+# Column weights for bm25 (user_id first, never ranked) and ts_rank labels
+BM25_WEIGHTS = {"meals": "0.0, 10.0, 5.0", "readings": "0.0, 1.0"}
+TSVECTOR_WEIGHTS = "ABCD"
+LANGUAGES = {"it": "italian", "en": "english"}
+DOCUMENT_COLUMN = "search_document"
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+def _has_text(columns, prefix=""):
+    return "(" + " OR ".join(f"{prefix}{column} <> ''" for column in columns) + ")"
+
+
+# SQLite FTS5
+
+def _fts_table(model):
+    return f"{model._meta.db_table}_fts"
+
+
+def _sqlite_statements(model, columns):
+    table, fts = model._meta.db_table, _fts_table(model)
+    names = ", ".join(["user_id", *columns])
+    old = ", ".join(f"old.{name}" for name in ["id", "user_id", *columns])
+    new = ", ".join(f"new.{name}" for name in ["id", "user_id", *columns])
+    delete_old = (
+        f"INSERT INTO {fts}({fts}, rowid, {names}) "
+        f"SELECT 'delete', {old} WHERE {_has_text(columns, 'old.')};"
+    )
+    insert_new = f"INSERT INTO {fts}(rowid, {names}) SELECT {new} WHERE {_has_text(columns, 'new.')};"
+    changed = " OR ".join(f"old.{name} IS NOT new.{name}" for name in ["user_id", *columns])
+    triggers = {
+        f"{fts}_insert": f"AFTER INSERT ON {table} BEGIN {insert_new} END",
+        f"{fts}_delete": f"AFTER DELETE ON {table} BEGIN {delete_old} END",
+        f"{fts}_update": f"AFTER UPDATE ON {table} WHEN {changed} BEGIN {delete_old} {insert_new} END",
+    }
+    create = (
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({names}, content='{table}', "
+        f"content_rowid='id', tokenize='unicode61 remove_diacritics 2')"
+    )
+    rebuild = [
+        f"INSERT INTO {fts}({fts}) VALUES ('delete-all')",
+        f"INSERT INTO {fts}(rowid, {names}) SELECT id, {names} FROM {table} WHERE {_has_text(columns)}",
+    ]
+    return create, triggers, rebuild
+
+
+# PostgreSQL tsvector
+
+def _document(columns):
+    parts = ["to_tsvector('simple', 'u' || user_id::text)"]
+    for weight, column in zip(TSVECTOR_WEIGHTS, columns):
+        for config in sorted(set(LANGUAGES.values())):
+            parts.append(f"setweight(to_tsvector('{config}', coalesce({column}, '')), '{weight}')")
+    return "(" + " || ".join(parts) + ")"
+
+
+def _postgres_document(model, columns):
+    """
+    Meals keep the tsvector in a stored generated column, so ranking a
+    match does not re-parse its text. Readings index the expression
+    instead: partition_readings copies that table with SELECT *, which a
+    generated column would refuse.
+    """
+    return DOCUMENT_COLUMN if model is Meal else _document(columns)
+
+
+def _postgres_statements(model, columns):
+    table = model._meta.db_table
+    statements = []
+    if model is Meal:
+        statements.append(
+            f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {DOCUMENT_COLUMN} tsvector "
+            f"GENERATED ALWAYS AS ({_document(columns)}) STORED"
+        )
+    statements.append(
+        f"CREATE INDEX IF NOT EXISTS {table}_search_idx ON {table} "
+        f"USING gin (({_postgres_document(model, columns)})) WHERE {_has_text(columns)}"
+    )
+    return statements
+
+
+def install(using_connection=connection):
+    """
+    Create any missing index structures. Idempotent: also run after every
+    migrate, since SQLite drops a table's triggers when a migration rebuilds it.
+    """
+    vendor = using_connection.vendor
+    with using_connection.cursor() as cursor:
+        for model, columns in SEARCHES.values():
+            if vendor == "sqlite":
+                create, triggers, rebuild = _sqlite_statements(model, columns)
+                cursor.execute(create)
+                cursor.execute(
+                    "SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = %s",
+                    [model._meta.db_table],
+                )
+                existing = {row[0] for row in cursor.fetchall()}
+                if existing >= triggers.keys():
+                    continue
+                for name, body in triggers.items():
+                    cursor.execute(f"CREATE TRIGGER IF NOT EXISTS {name} {body}")
+                for statement in rebuild:
+                    cursor.execute(statement)
+            elif vendor == "postgresql":
+                for statement in _postgres_statements(model, columns):
+                    cursor.execute(statement)
+
+
+def uninstall(using_connection=connection):
+    vendor = using_connection.vendor
+    with using_connection.cursor() as cursor:
+        for model, _columns in SEARCHES.values():
+            if vendor == "sqlite":
+                for suffix in ("insert", "delete", "update"):
+                    cursor.execute(f"DROP TRIGGER IF EXISTS {_fts_table(model)}_{suffix}")
+                cursor.execute(f"DROP TABLE IF EXISTS {_fts_table(model)}")
+            elif vendor == "postgresql":
+                cursor.execute(f"DROP INDEX IF EXISTS {model._meta.db_table}_search_idx")
+                cursor.execute(f"ALTER TABLE {model._meta.db_table} DROP COLUMN IF EXISTS {DOCUMENT_COLUMN}")
+
+
+# Queries
+
+def _stemmer(language):
+    import snowballstemmer
+
+    return snowballstemmer.stemmer(LANGUAGES.get(language[:2], "english"))
+
+
+def fts_query(user_id, kind, query, language):
+    """
+    FTS5 MATCH expression: the owner token AND every stemmed word as a
+    prefix within the searched columns. Words are reduced to their stem
+    and quoted, so "pizze" also finds "pizza" and no FTS5 syntax gets
+    through from the user.
+    """
+    stemmer = _stemmer(language)
+    terms = []
+    for word in re.findall(r"\w+", query.lower())[:MAX_TERMS]:
+        stem = stemmer.stemWord(word)
+        if len(stem) > 1:
+            terms.append(f'"{stem}"*')
+    if not terms:
+        return None
+    columns = " ".join(SEARCHES[kind][1])
+    return f'user_id:"{user_id}" AND {{{columns}}}: ({" ".join(terms)})'
+
+
+def _search_sqlite(user, kind, query, language, after, limit):
+    model, _columns = SEARCHES[kind]
+    match = fts_query(user.pk, kind, query, language)
+    if match is None:
+        return []
+    fts = _fts_table(model)
+    sql = (
+        f"SELECT id, score FROM (SELECT rowid AS id, bm25({fts}, {BM25_WEIGHTS[kind]}) AS score "
+        f"FROM {fts} WHERE {fts} MATCH %s) "
+        f"WHERE score > %s OR (score = %s AND id > %s) ORDER BY score, id LIMIT %s"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [match, after[0], after[0], after[1], limit])
+        return cursor.fetchall()
+
+
+def _search_postgres(user, kind, query, language, after, limit):
+    model, columns = SEARCHES[kind]
+    document = _postgres_document(model, columns)
+    terms = "websearch_to_tsquery(%(config)s::regconfig, %(query)s)"
+    tsquery = f"(to_tsquery('simple', %(owner)s) && {terms})"
+    # ts_rank is a float4; the cast keeps the cursor value exact
+    sql = (
+        f"SELECT id, score FROM (SELECT id, -ts_rank({document}, {tsquery})::float8 AS score "
+        f"FROM {model._meta.db_table} WHERE user_id = %(user_id)s AND {_has_text(columns)} "
+        f"AND {document} @@ {tsquery} AND numnode({terms}) > 0) hits "
+        f"WHERE score > %(score)s OR (score = %(score)s AND id > %(id)s) "
+        f"ORDER BY score, id LIMIT %(limit)s"
+    )
+    params = {
+        "config": LANGUAGES.get(language[:2], "english"),
+        "query": query,
+        "owner": f"u{user.pk}",
+        "user_id": user.pk,
+        "score": after[0],
+        "id": after[1],
+        "limit": limit,
+    }
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+def _search_like(user, kind, query, language, after, limit):
+    """Unranked fallback for other databases: substring match on every word."""
+    from django.db.models import Q
+
+    model, columns = SEARCHES[kind]
+    queryset = model.objects.filter(user=user, id__gt=after[1])
+    for word in query.split()[:MAX_TERMS]:
+        matches = Q()
+        for column in columns:
+            matches |= Q(**{f"{column}__icontains": word})
+        queryset = queryset.filter(matches)
+    return [(pk, 0.0) for pk in queryset.order_by("id").values_list("id", flat=True)[:limit]]
+
+
+def search(user, kind, query, language="en", cursor=None, limit=20):
+    """
+    Return (objects, next cursor) for one page of ``user``'s rows of
+    ``kind`` matching ``query``, best match first. The cursor is None on
+    the last page.
+    """
+    if cursor:
+        try:
+            after = signing.loads(cursor, salt=CURSOR_SALT)
+        except signing.BadSignature:
+            raise InvalidCursor("Invalid cursor.")
+    else:
+        after = [float("-inf"), 0]
+
+    run = {"sqlite": _search_sqlite, "postgresql": _search_postgres}.get(connection.vendor, _search_like)
+    hits = run(user, kind, query, language, after, limit + 1)
+    next_cursor = None
+    if len(hits) > limit:
+        last_id, last_score = hits[limit - 1]
+        next_cursor = signing.dumps([last_score, last_id], salt=CURSOR_SALT)
+    hits = hits[:limit]
+
+    model = SEARCHES[kind][0]
+    objects = model.objects.in_bulk([pk for pk, _score in hits])
+    return [objects[pk] for pk, _score in hits if pk in objects], next_cursor
@@ -0,0 +1,49 @@
+"""
+Streamed downloads under both WSGI and ASGI.
+
+Django sends a StreamingHttpResponse over a synchronous iterator under ASGI
+by first reading the iterator whole into a list, and one over an
+asynchronous iterator under WSGI the same way. Large downloads (the full
+archive, Parquet/Arrow exports, report packs) are written as synchronous
+generators, so under ASGI they are handed over as AsyncChunks: each chunk
+is produced on Django's sync thread for the request, where the database
+connection lives, when the server is ready to send it.
+"""
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+
+_DONE = object()
+
+
+class AsyncChunks:
+    """Asynchronous iterator over a synchronous one, advanced on the sync thread."""
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        chunk = await sync_to_async(next)(self.chunks, _DONE)
+        if chunk is _DONE:
+            raise StopAsyncIteration
+        return chunk
+
+    def close(self):
+        # Called by response.close(), on the sync thread
+        close = getattr(self.chunks, "close", None)
+        if close is not None:
+            close()
+
+
+def is_asgi(request):
+    return isinstance(request, ASGIRequest)
+
+
+def streaming_response(chunks, content_type, filename, asgi=False):
+    """An attachment streamed from the generator ``chunks``, as ``asgi`` or WSGI serves it best."""
+    response = StreamingHttpResponse(AsyncChunks(chunks) if asgi else chunks, content_type=content_type)
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
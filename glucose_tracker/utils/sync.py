@@ -0,0 +1,101 @@
+"""
+Delta sync: the readings, meals and deletions that changed since a cursor.
+
+The cursor is a signed token holding, per stream, the (updated_at, id) of
+the last row sent and the id of the last tombstone, so each call reads only
+new changes through the (user, updated_at) indexes. Rows changed in the last
+few seconds are held back until the next call: a transaction that started
+earlier may still commit a row with an older updated_at, and the cursor
+would otherwise skip past it.
+"""
+import json
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.core import signing
+from django.core.files.storage import default_storage
+from django.db.models import Q
+from django.utils import timezone
+
+from ..models import DeletedRecord, GlucoseReading, Meal
+
+CURSOR_SALT = "glucose_tracker.sync"
+SETTLE_SECONDS = 2
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+READING_FIELDS = ["id", "timestamp", "glucose_level", "measurement_type", "notes", "updated_at"]
+MEAL_FIELDS = [
+    "id", "timestamp", "meal_type", "description", "photo", "estimated_calories",
+    "carbs_estimate", "manual_notes", "updated_at",
+]
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+def encode_cursor(user, position):
+    return signing.dumps({"u": user.pk, **position}, salt=CURSOR_SALT, compress=True)
+
+
+def decode_cursor(user, cursor):
+    if not cursor:
+        return {"r": [EPOCH.isoformat(), 0], "m": [EPOCH.isoformat(), 0], "d": 0}
+    try:
+        position = signing.loads(cursor, salt=CURSOR_SALT)
+    except signing.BadSignature:
+        raise InvalidCursor("Invalid cursor.")
+    if position.pop("u", None) != user.pk:
+        raise InvalidCursor("Cursor belongs to another user.")
+    return position
+
+
+def _changed(model, fields, user, after, horizon, limit):
+    """Rows with (updated_at, id) after the cursor position, oldest first."""
+    updated_at, last_id = datetime.fromisoformat(after[0]), after[1]
+    return list(
+        model.objects.filter(user=user, updated_at__lt=horizon)
+        .filter(Q(updated_at__gt=updated_at) | Q(updated_at=updated_at, id__gt=last_id))
+        .order_by("updated_at", "id")
+        .values(*fields)[:limit]
+    )
+
+
+def _line(record):
+    return json.dumps(record, separators=(",", ":"), default=str) + "\n"
+
+
+def changes_since(user, cursor, limit):
+    """
+    Return (NDJSON body, next cursor, has_more). Each stream is capped at
+    limit rows; the last line carries the cursor to pass to the next call.
+    """
+    position = decode_cursor(user, cursor)
+    horizon = timezone.now() - timedelta(seconds=SETTLE_SECONDS)
+
+    readings = _changed(GlucoseReading, READING_FIELDS, user, position["r"], horizon, limit)
+    meals = _changed(Meal, MEAL_FIELDS, user, position["m"], horizon, limit)
+    deletions = list(
+        DeletedRecord.objects.filter(user=user, id__gt=position["d"], deleted_at__lt=horizon)
+        .order_by("id")
+        .values_list("id", "model", "object_id")[:limit]
+    )
+
+    lines = []
+    for row in readings:
+        lines.append(_line({"type": "reading", **row}))
+    for row in meals:
+        row["photo"] = default_storage.url(row["photo"]) if row["photo"] else None
+        lines.append(_line({"type": "meal", **row}))
+    for _tombstone_id, model, object_id in deletions:
+        lines.append(_line({"type": "deleted", "model": model, "id": object_id}))
+
+    if readings:
+        position["r"] = [readings[-1]["updated_at"].isoformat(), readings[-1]["id"]]
+    if meals:
+        position["m"] = [meals[-1]["updated_at"].isoformat(), meals[-1]["id"]]
+    if deletions:
+        position["d"] = deletions[-1][0]
+    has_more = limit in (len(readings), len(meals), len(deletions))
+    next_cursor = encode_cursor(user, position)
+    lines.append(_line({"type": "cursor", "cursor": next_cursor, "has_more": has_more}))
+    return "".join(lines), next_cursor, has_more
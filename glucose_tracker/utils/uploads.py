@@ -0,0 +1,213 @@
+"""
+Resumable meal photo uploads, after the tus protocol
+(https://tus.io/protocols/resumable-upload): the core protocol plus the
+creation, checksum and termination extensions.
+
+The client creates an upload with its length, then sends the bytes in one or
+more PATCH requests, each written straight to a partial file in storage at
+the upload's offset. After a dropped connection it asks for the offset and
+carries on from there. Once complete, the add meal form names the upload
+instead of carrying the photo, and finalize() moves the file into place.
+
+The partial file is written in place, so the default storage must be on the
+local file system (FileSystemStorage).
+"""
+
+import base64
+import binascii
+import hashlib
+import os
+from datetime import timedelta
+
+from django import forms
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+
+from ..models import Meal, PhotoUpload
+from .lazy import lazy_import
+
+try:
+    import fcntl
+except ImportError:  # Windows: concurrent PATCH requests are not detected
+    fcntl = None
+
+Image = lazy_import("PIL.Image")
+
+TUS_VERSION = "1.0.0"
+CHECKSUM_ALGORITHMS = {"md5": hashlib.md5, "sha1": hashlib.sha1, "sha256": hashlib.sha256}
+# Bytes read from the request per write
+READ_SIZE = 64 * 1024
+
+
+class UploadError(Exception):
+    """A request the upload cannot accept; ``status`` is the HTTP status to answer with."""
+
+    status = 400
+
+
+class OffsetMismatch(UploadError):
+    status = 409
+
+
+class UploadTooLarge(UploadError):
+    status = 413
+
+
+class UploadLocked(UploadError):
+    status = 423
+
+
+class ChecksumMismatch(UploadError):
+    # Status defined by the tus checksum extension
+    status = 460
+
+
+def parse_metadata(header):
+    """Decode an Upload-Metadata header: comma-separated "key base64-value" pairs."""
+    metadata = {}
+    for pair in filter(None, (pair.strip() for pair in header.split(","))):
+        key, _sep, value = pair.partition(" ")
+        try:
+            metadata[key] = base64.b64decode(value, validate=True).decode()
+        except (binascii.Error, UnicodeDecodeError):
+            raise UploadError(f"Invalid Upload-Metadata value for {key}.")
+    return metadata
+
+
+def create_upload(user, length, filename):
+    """Start an upload of ``length`` bytes, with an empty partial file."""
+    if length < 1:
+        raise UploadError("Upload-Length must be a positive integer.")
+    if length > settings.PHOTO_UPLOAD_MAX_BYTES:
+        raise UploadTooLarge(f"Photos are limited to {settings.PHOTO_UPLOAD_MAX_BYTES} bytes.")
+    purge_expired(user)
+    upload = PhotoUpload.objects.create(
+        user=user, length=length, filename=os.path.basename(filename)[-100:] or "photo.jpg"
+    )
+    path = default_storage.path(upload.path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path, "xb").close()
+    return upload
+
+
+def expires_at(upload):
+    return upload.created_at + timedelta(hours=settings.PHOTO_UPLOAD_EXPIRY_HOURS)
+
+
+def append_chunk(upload, offset, stream, checksum=""):
+    """
+    Write the bytes read from ``stream`` at ``offset`` and return the new
+    offset. ``checksum`` is an Upload-Checksum header value ("sha256
+    base64-digest"); a chunk that does not match it is discarded. Without
+    one, the bytes received before a dropped connection are kept, so the
+    client resumes after them.
+    """
+    hasher = expected = None
+    if checksum:
+        algorithm, _sep, digest = checksum.partition(" ")
+        if algorithm not in CHECKSUM_ALGORITHMS:
+            raise UploadError(f"Unsupported checksum algorithm {algorithm!r}.")
+        try:
+            expected = base64.b64decode(digest, validate=True)
+        except binascii.Error:
+            raise UploadError("Invalid Upload-Checksum digest.")
+        hasher = CHECKSUM_ALGORITHMS[algorithm]()
+
+    with open(default_storage.path(upload.path), "r+b") as f:
+        if fcntl:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                raise UploadLocked("Another request is writing to this upload.")
+        # Read under the lock, so a request that just finished is seen
+        upload.refresh_from_db(fields=["offset"])
+        if offset != upload.offset:
+            raise OffsetMismatch(f"Upload-Offset is {upload.offset}.")
+
+        f.seek(offset)
+        end = offset
+        try:
+            while chunk := stream.read(READ_SIZE):
+                end += len(chunk)
+                if end > upload.length:
+                    raise UploadTooLarge("The chunk goes past Upload-Length.")
+                f.write(chunk)
+                if hasher:
+                    hasher.update(chunk)
+        except OSError:
+            # The client went away; keep what arrived unless it must be verified
+            if hasher:
+                f.truncate(offset)
+                raise
+        except UploadError:
+            f.truncate(offset)
+            raise
+        if hasher and hasher.digest() != expected:
+            f.truncate(offset)
+            raise ChecksumMismatch("Upload-Checksum does not match the chunk.")
+        f.truncate(end)
+
+        PhotoUpload.objects.filter(pk=upload.pk).update(offset=end)
+        upload.offset = end
+    return end
+
+
+def finalize(user, upload_id):
+    """
+    Move ``user``'s complete upload to where Meal.photo would have saved it
+    and return that storage name. The file is renamed rather than copied,
+    and checked to be an image the way ImageField checks a form upload.
+    """
+    upload = PhotoUpload.objects.filter(user=user, pk=upload_id).first()
+    if upload is None:
+        raise ValidationError(_("The photo upload was not found. Please choose the photo again."))
+    if not upload.complete:
+        raise ValidationError(_("The photo upload is not complete."))
+
+    source = default_storage.path(upload.path)
+    try:
+        with Image.open(source) as image:
+            image.verify()
+    except Exception:
+        discard(upload)
+        raise ValidationError(forms.ImageField.default_error_messages["invalid_image"], code="invalid_image")
+
+    field = Meal._meta.get_field("photo")
+    name = field.generate_filename(None, upload.filename)
+    while True:
+        name = default_storage.get_available_name(name, max_length=field.max_length)
+        target = default_storage.path(name)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        try:
+            os.link(source, target)
+            break
+        except FileExistsError:
+            # Taken since get_available_name looked; pick another
+            continue
+    os.remove(source)
+    upload.delete()
+    return name
+
+
+def discard(upload):
+    default_storage.delete(upload.path)
+    upload.delete()
+
+
+def purge_expired(user=None):
+    """
+    Delete uploads started more than PHOTO_UPLOAD_EXPIRY_HOURS ago, with
+    their files, and return how many there were.
+    """
+    cutoff = timezone.now() - timedelta(hours=settings.PHOTO_UPLOAD_EXPIRY_HOURS)
+    expired = PhotoUpload.objects.filter(created_at__lt=cutoff)
+    if user is not None:
+        expired = expired.filter(user=user)
+    count = 0
+    for upload in expired:
+        discard(upload)
+        count += 1
+    return count
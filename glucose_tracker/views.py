@@ -1,50 +1,67 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.urls import reverse
 from django.utils import timezone
+from django.utils.http import http_date
 from django.db.models import Avg, Min, Max
 from django.core.paginator import Paginator
-from django.utils.translation import gettext_lazy as _
-import json
+from django.utils.translation import gettext_lazy as _, get_language
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, HttpResponseForbidden, JsonResponse
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.http import require_http_methods
+from asgiref.sync import sync_to_async
+import time
 from datetime import timedelta
 
-from .models import GlucoseReading, Meal, MeasurementSchedule
+from .models import GlucoseReading, Meal, MeasurementSchedule, PhotoUpload
 from .forms import GlucoseReadingForm, MealForm, MeasurementScheduleForm
-from .utils.ai_analyzer import analyze_meal_image
+from .utils.ai_analyzer import aanalyze_meal_image, apply_meal_analysis
+from .utils.food_index import complete_analysis, estimate_meal, get_index
+from .metrics import exposition, observe_export
 
+# Rows per page on the glucose and meal history lists
+HISTORY_PAGE_SIZE = 20
+# Changes per stream returned by one sync call, by default and at most
+SYNC_PAGE_SIZE = 1000
+SYNC_MAX_PAGE_SIZE = 10000
+# Monthly reports in a report pack, by default and at most
+REPORT_PACK_MONTHS = 12
+REPORT_PACK_MAX_MONTHS = 36
 
-@login_required
-def dashboard(request):
-    user = request.user
-    today = timezone.now().date()
-    last_7_days = today - timedelta(days=7)
 
-    # Recent Data
-    recent_readings = GlucoseReading.objects.filter(user=user)[:5]
-    recent_meals = Meal.objects.filter(user=user)[:5]
+def _dashboard_data(user):
+    # Loads numpy, so imported on the first dashboard rather than at startup
+    from .utils.charts import dashboard_charts
 
-    # Statistics (Last 7 Days)
-    readings_7d = GlucoseReading.objects.filter(
+    today = timezone.now().date()
+    last_7_days = today - timedelta(days=7)
+    avg_glucose = GlucoseReading.objects.filter(
         user=user, timestamp__date__gte=last_7_days
-    )
-    avg_glucose = readings_7d.aggregate(Avg("glucose_level"))["glucose_level__avg"]
-
-    # Chart Data Preparation
-    dates = []
-    values = []
-    # Simple aggregation for chart (this could be optimized)
-    chart_readings = readings_7d.order_by("timestamp")
-    for reading in chart_readings:
-        dates.append(reading.timestamp.strftime("%Y-%m-%d %H:%M"))
-        values.append(reading.glucose_level)
-
-    context = {
-        "recent_readings": recent_readings,
-        "recent_meals": recent_meals,
+    ).aggregate(Avg("glucose_level"))["glucose_level__avg"]
+    return {
+        # Recent Data
+        "recent_readings": list(GlucoseReading.objects.filter(user=user)[:5]),
+        "recent_meals": list(Meal.objects.filter(user=user)[:5]),
+        # Statistics (Last 7 Days)
         "avg_glucose": round(avg_glucose, 1) if avg_glucose else 0,
-        "chart_dates": json.dumps(dates),
-        "chart_values": json.dumps(values),
+        # Server-rendered SVG charts, cached until the data changes
+        "charts": dashboard_charts(user.id),
+        "measurement_schedule": MeasurementSchedule.objects.filter(user=user).first(),
     }
+
+
+@login_required
+async def dashboard(request):
+    # Set on the request too: base.html reads the user, and the lazy
+    # request.user would look it up synchronously
+    user = request.user = await request.auser()
+    # The async ORM runs every query on Django's one shared sync thread, so
+    # they could not overlap anyway; one hop there for all of them saves a
+    # thread switch per query while the event loop stays free.
+    context = await sync_to_async(_dashboard_data)(user)
     return render(request, "glucose_tracker/dashboard.html", context)
 
 
@@ -63,6 +80,8 @@ def add_glucose(request):
             reading.user = request.user
             reading.save()
             messages.success(request, _("Glucose reading added successfully."))
+            for alert in reading.alerts.all():
+                messages.warning(request, alert.message)
             return redirect("dashboard")
     else:
         form = GlucoseReadingForm(initial=initial_data)
@@ -70,32 +89,50 @@ def add_glucose(request):
     return render(request, "glucose_tracker/add_glucose.html", {"form": form})
 
 
+def _render_add_meal(request, form):
+    # The page shrinks photos to the size the analyzer would reduce them to
+    return render(request, "glucose_tracker/add_meal.html", {
+        "form": form,
+        "photo_max_megapixels": settings.PHOTO_MAX_MEGAPIXELS,
+        "photo_quality": settings.PHOTO_JPEG_QUALITY / 100,
+    })
+
+
 @login_required
-def add_meal(request):
+async def add_meal(request):
+    # Resolved here for base.html, as on the dashboard
+    request.user = await request.auser()
     if request.method == "POST":
         form = MealForm(request.POST, request.FILES)
         if form.is_valid():
             meal = form.save(commit=False)
             meal.user = request.user
+            language = get_language() or "en"
 
+            # Photo sent ahead through a resumable upload: move it into place
+            if not meal.photo and form.cleaned_data["upload"]:
+                from .utils.uploads import finalize
+
+                try:
+                    meal.photo = await sync_to_async(finalize)(meal.user, form.cleaned_data["upload"])
+                except ValidationError as e:
+                    form.add_error("photo", e)
+                    return _render_add_meal(request, form)
+
+            # A dish found in the local food table needs no AI round trip
+            dish = form.cleaned_data["dish"]
+            local = estimate_meal(dish, language) if dish else None
+            if local:
+                apply_meal_analysis(meal, local)
+                messages.info(
+                    request,
+                    _("Nutrition estimated from the food table. Please review the details."),
+                )
             # AI Analysis if photo is present
-            if meal.photo:
+            elif meal.photo:
                 try:
-                    analysis = analyze_meal_image(meal.photo)
-                    if "error" not in analysis:
-                        meal.description = analysis.get("description", "")
-                        # Validate and convert numeric fields safely
-                        try:
-                            meal.estimated_calories = int(analysis.get("calories", 0)) if analysis.get("calories") else None
-                        except (ValueError, TypeError):
-                            meal.estimated_calories = None
-        
-                        try:
-                            meal.carbs_estimate = float(analysis.get("carbs", 0)) if analysis.get("carbs") else None
-                        except (ValueError, TypeError):
-                            meal.carbs_estimate = None
-        
-                        meal.ai_response_raw = analysis
+                    analysis = complete_analysis(await aanalyze_meal_image(meal.photo), language)
+                    if apply_meal_analysis(meal, analysis):
                         messages.info(
                             request,
                             _("AI Analysis complete. Please review the details."),
@@ -107,19 +144,94 @@ def add_meal(request):
                 except Exception as e:
                     messages.error(request, f"Error during AI analysis: {str(e)}")
 
-            meal.save()
+            await meal.asave()
             messages.success(request, _("Meal added successfully."))
             return redirect("dashboard")
     else:
         form = MealForm(initial={"timestamp": timezone.now()})
 
-    return render(request, "glucose_tracker/add_meal.html", {"form": form})
+    return _render_add_meal(request, form)
+
+
+def _tus_response(status, **headers):
+    response = HttpResponse(status=status)
+    response["Tus-Resumable"] = "1.0.0"
+    response["Cache-Control"] = "no-store"
+    for name, value in headers.items():
+        response[name.replace("_", "-")] = value
+    return response
+
+
+@login_required
+@require_http_methods(["POST"])
+def photo_uploads(request):
+    """Start a resumable photo upload (tus creation) of Upload-Length bytes."""
+    from .utils import uploads
+
+    try:
+        metadata = uploads.parse_metadata(request.headers.get("Upload-Metadata", ""))
+        try:
+            length = int(request.headers.get("Upload-Length", ""))
+        except ValueError:
+            raise uploads.UploadError("Upload-Length must be a positive integer.")
+        upload = uploads.create_upload(request.user, length, metadata.get("filename", ""))
+    except uploads.UploadError as e:
+        return HttpResponse(str(e), status=e.status)
+    return _tus_response(
+        201,
+        Location=reverse("photo_upload", args=[upload.pk]),
+        Upload_Expires=http_date(uploads.expires_at(upload).timestamp()),
+    )
+
+
+@login_required
+@require_http_methods(["HEAD", "PATCH", "DELETE"])
+def photo_upload(request, upload_id):
+    """Offset of a resumable upload (HEAD), its next chunk (PATCH), or cancel it (DELETE)."""
+    from .utils import uploads
+
+    upload = get_object_or_404(PhotoUpload, pk=upload_id, user=request.user)
+    if request.method == "HEAD":
+        return _tus_response(200, Upload_Offset=upload.offset, Upload_Length=upload.length)
+    if request.method == "DELETE":
+        uploads.discard(upload)
+        return _tus_response(204)
+
+    if request.content_type != "application/offset+octet-stream":
+        return HttpResponse("Content-Type must be application/offset+octet-stream.", status=415)
+    try:
+        offset = int(request.headers.get("Upload-Offset", ""))
+    except ValueError:
+        return HttpResponseBadRequest("Upload-Offset must be an integer.")
+    try:
+        offset = uploads.append_chunk(upload, offset, request, request.headers.get("Upload-Checksum", ""))
+    except uploads.UploadError as e:
+        return HttpResponse(str(e), status=e.status)
+    return _tus_response(
+        204, Upload_Offset=offset, Upload_Expires=http_date(uploads.expires_at(upload).timestamp())
+    )
+
+
+@login_required
+def food_suggestions(request):
+    """Food table entries matching ?q= as you type, for the add meal form."""
+    language = get_language() or "en"
+    foods = get_index().suggest(request.GET.get("q", ""), limit=10)
+    return JsonResponse(
+        {
+            "results": [
+                {"name": food.name(language), "portion_g": food.portion_g,
+                 "calories": food.calories, "carbs": food.carbs}
+                for food in foods
+            ]
+        }
+    )
 
 
 @login_required
 def glucose_list(request):
     readings_list = GlucoseReading.objects.filter(user=request.user)
-    paginator = Paginator(readings_list, 20)
+    paginator = Paginator(readings_list, HISTORY_PAGE_SIZE)
     page_number = request.GET.get("page")
     page_obj = paginator.get_page(page_number)
     return render(request, "glucose_tracker/glucose_list.html", {"page_obj": page_obj})
@@ -128,23 +240,68 @@ def glucose_list(request):
 @login_required
 def meal_list(request):
     meals_list = Meal.objects.filter(user=request.user)
-    paginator = Paginator(meals_list, 20)
+    paginator = Paginator(meals_list, HISTORY_PAGE_SIZE)
     page_number = request.GET.get("page")
     page_obj = paginator.get_page(page_number)
     return render(request, "glucose_tracker/meal_list.html", {"page_obj": page_obj})
 
 
+@login_required
+def search(request):
+    """Full-text search over meal and reading notes, best match first."""
+    from .utils.search import SEARCHES, InvalidCursor, search as search_records
+
+    query = request.GET.get("q", "").strip()
+    kind = request.GET.get("kind", "meals")
+    if kind not in SEARCHES:
+        raise Http404
+    results, next_cursor = [], None
+    if query:
+        try:
+            results, next_cursor = search_records(
+                request.user, kind, query, get_language() or "en",
+                request.GET.get("cursor"), HISTORY_PAGE_SIZE,
+            )
+        except InvalidCursor as e:
+            return HttpResponseBadRequest(str(e))
+    return render(
+        request,
+        "glucose_tracker/search.html",
+        {"query": query, "kind": kind, "results": results, "next_cursor": next_cursor},
+    )
+
+
 @login_required
 def export_data(request):
     format_type = request.GET.get("format", "csv")
-    from .utils.export_utils import export_to_csv, export_to_excel, export_to_ods
+    from .utils.export_utils import (
+        COLUMNAR_TABLES,
+        export_to_arrow,
+        export_to_csv,
+        export_to_excel,
+        export_to_ods,
+        export_to_parquet,
+        export_to_zip,
+    )
+    from .utils.streaming import is_asgi
 
+    started = time.perf_counter()
     if format_type == "xlsx":
-        return export_to_excel(request.user)
+        response = export_to_excel(request.user)
     elif format_type == "ods":
-        return export_to_ods(request.user)
+        response = export_to_ods(request.user)
+    elif format_type == "zip":
+        response = export_to_zip(request.user, asgi=is_asgi(request))
+    elif format_type in ("parquet", "arrow"):
+        table = request.GET.get("table", "readings")
+        if table not in COLUMNAR_TABLES:
+            raise Http404
+        export = export_to_parquet if format_type == "parquet" else export_to_arrow
+        response = export(request.user, table, asgi=is_asgi(request))
     else:
-        return export_to_csv(request.user)
+        format_type = "csv"
+        response = export_to_csv(request.user)
+    return observe_export(format_type, response, started)
 
 
 @login_required
@@ -153,6 +310,58 @@ def generate_report(request):
 
     return generate_pdf_report(request.user)
 
+
+@login_required
+def report_pack(request):
+    """
+    One PDF report per month as a ZIP. Staff may add ?patient=<username>
+    (repeatable) to bundle several of their assigned patients; everyone
+    else gets their own.
+    """
+    from django.contrib.auth.models import User
+    from .utils.report_pack import pack_chunks, pack_jobs
+    from .utils.streaming import is_asgi, streaming_response
+
+    try:
+        months = min(max(int(request.GET.get("months", REPORT_PACK_MONTHS)), 1), REPORT_PACK_MAX_MONTHS)
+    except ValueError:
+        return HttpResponseBadRequest("months must be an integer")
+    patients = request.GET.getlist("patient")
+    if not patients:
+        users = [request.user]
+    elif not request.user.is_staff:
+        return HttpResponseForbidden()
+    else:
+        # Unassigned patients are indistinguishable from unknown usernames
+        users = list(
+            User.objects.filter(username__in=patients, care_team__clinician=request.user).order_by("username")
+        )
+        if len(users) != len(set(patients)):
+            raise Http404
+
+    return streaming_response(
+        pack_chunks(pack_jobs(users, months)), "application/zip", "glucosnap_reports.zip", is_asgi(request)
+    )
+
+
+@login_required
+def clinician_overview(request):
+    """
+    Staff's assigned patients at a glance, a page at a time in username
+    order; ?after=<username> continues after that patient.
+    """
+    from .utils.overview import OVERVIEW_DAYS, OVERVIEW_PAGE_SIZE, patient_overview
+
+    if not request.user.is_staff:
+        return HttpResponseForbidden()
+    patients, next_after = patient_overview(request.user, request.GET.get("after", ""), OVERVIEW_PAGE_SIZE)
+    return render(request, "glucose_tracker/clinician_overview.html", {
+        "patients": patients,
+        "next_after": next_after,
+        "first_page": not request.GET.get("after"),
+        "days": OVERVIEW_DAYS,
+    })
+
 from django.utils.translation import activate
 from django.contrib.auth.decorators import login_required
 from .models import UserProfile
@@ -194,3 +403,33 @@ def measurement_schedule(request):
         form = MeasurementScheduleForm(instance=schedule)
 
     return render(request, "glucose_tracker/measurement_schedule.html", {"form": form})
+
+
+@login_required
+def sync_changes(request):
+    """Readings, meals and deletions since ?cursor=, as NDJSON."""
+    from .utils.sync import InvalidCursor, changes_since
+
+    try:
+        limit = min(max(int(request.GET.get("limit", SYNC_PAGE_SIZE)), 1), SYNC_MAX_PAGE_SIZE)
+    except ValueError:
+        return HttpResponseBadRequest("limit must be an integer")
+    try:
+        body, cursor, has_more = changes_since(request.user, request.GET.get("cursor"), limit)
+    except InvalidCursor as e:
+        return HttpResponseBadRequest(str(e))
+    response = HttpResponse(body, content_type="application/x-ndjson")
+    response["X-Sync-Cursor"] = cursor
+    response["X-Sync-Has-More"] = "true" if has_more else "false"
+    return response
+
+
+def metrics(request):
+    """Prometheus scrape endpoint; hidden unless METRICS_ENABLED."""
+    if not settings.METRICS_ENABLED:
+        raise Http404
+    token = settings.METRICS_TOKEN
+    if token and not constant_time_compare(request.headers.get("Authorization", ""), f"Bearer {token}"):
+        return HttpResponseForbidden()
+    body, content_type = exposition()
+    return HttpResponse(body, content_type=content_type)
@@ -0,0 +1,70 @@
+// Shrinks a meal photo in the browser to the size the server analyzes
+// (PHOTO_MAX_MEGAPIXELS) before it is uploaded, so a 12-48 MP original is
+// not sent only to be reduced to 2 MP. The work runs in a worker with an
+// OffscreenCanvas where the browser has one, otherwise on a canvas in the
+// page. downscalePhoto() resolves to the file to upload: a JPEG named after
+// the original, or the original when it is already small enough, smaller
+// than the result, or cannot be decoded.
+
+function resizeInWorker(file, maxPixels, quality, workerUrl) {
+    return new Promise(function (resolve, reject) {
+        const worker = new Worker(workerUrl);
+        worker.onmessage = function (event) {
+            worker.terminate();
+            if (event.data.error) {
+                reject(new Error(event.data.error));
+            } else {
+                resolve(event.data.blob);
+            }
+        };
+        worker.onerror = function (event) {
+            worker.terminate();
+            reject(new Error(event.message));
+        };
+        worker.postMessage({ file, maxPixels, quality });
+    });
+}
+
+async function resizeInPage(file, maxPixels, quality) {
+    // Image elements apply the EXIF orientation when drawn
+    const url = URL.createObjectURL(file);
+    try {
+        const image = new Image();
+        image.src = url;
+        await image.decode();
+        const scale = Math.min(1, Math.sqrt(maxPixels / (image.naturalWidth * image.naturalHeight)));
+        if (scale === 1 && file.type === 'image/jpeg') {
+            return null;
+        }
+        const canvas = document.createElement('canvas');
+        canvas.width = Math.max(1, Math.floor(image.naturalWidth * scale));
+        canvas.height = Math.max(1, Math.floor(image.naturalHeight * scale));
+        const context = canvas.getContext('2d');
+        context.imageSmoothingQuality = 'high';
+        context.drawImage(image, 0, 0, canvas.width, canvas.height);
+        return await new Promise(resolve => canvas.toBlob(resolve, 'image/jpeg', quality));
+    } finally {
+        URL.revokeObjectURL(url);
+    }
+}
+
+async function downscalePhoto(file, { maxMegapixels, quality, workerUrl }) {
+    const maxPixels = maxMegapixels * 1e6;
+    let blob;
+    if (window.Worker && window.OffscreenCanvas && workerUrl) {
+        blob = await resizeInWorker(file, maxPixels, quality, workerUrl).catch(function (err) {
+            console.error("Photo resize in a worker failed: ", err);
+        });
+    }
+    if (blob === undefined) {
+        blob = await resizeInPage(file, maxPixels, quality).catch(function (err) {
+            console.error("Photo resize failed, sending the original: ", err);
+            return null;
+        });
+    }
+    if (!blob || blob.size >= file.size) {
+        return file;
+    }
+    const name = (file.name || 'photo').replace(/\.[^.]*$/, '') + '.jpg';
+    return new File([blob], name, { type: 'image/jpeg', lastModified: file.lastModified });
+}
@@ -0,0 +1,42 @@
+// Shrinks a meal photo off the main thread (see photo_resize.js). Receives
+// {file, maxPixels, quality} and posts back {blob}: a JPEG of at most
+// maxPixels, upright, or null when the photo is already a JPEG that small.
+
+async function halve(source, width, height) {
+    const canvas = new OffscreenCanvas(width, height);
+    const context = canvas.getContext('2d');
+    context.imageSmoothingQuality = 'high';
+    context.drawImage(source, 0, 0, width, height);
+    return canvas;
+}
+
+self.onmessage = async function (event) {
+    const { file, maxPixels, quality } = event.data;
+    try {
+        // from-image applies the EXIF orientation, so the pixels come out upright
+        const bitmap = await createImageBitmap(file, { imageOrientation: 'from-image' });
+        const scale = Math.min(1, Math.sqrt(maxPixels / (bitmap.width * bitmap.height)));
+        if (scale === 1 && file.type === 'image/jpeg') {
+            bitmap.close();
+            self.postMessage({ blob: null });
+            return;
+        }
+        const width = Math.max(1, Math.floor(bitmap.width * scale));
+        const height = Math.max(1, Math.floor(bitmap.height * scale));
+
+        // Halve until within twice the target: one big step would alias
+        let source = bitmap;
+        let sourceWidth = bitmap.width;
+        let sourceHeight = bitmap.height;
+        while (sourceWidth / 2 >= width * 2) {
+            sourceWidth = Math.floor(sourceWidth / 2);
+            sourceHeight = Math.floor(sourceHeight / 2);
+            source = await halve(source, sourceWidth, sourceHeight);
+        }
+        const canvas = await halve(source, width, height);
+        bitmap.close();
+        self.postMessage({ blob: await canvas.convertToBlob({ type: 'image/jpeg', quality }) });
+    } catch (err) {
+        self.postMessage({ error: String(err) });
+    }
+};
@@ -0,0 +1,79 @@
+// Resumable photo upload against the tus-style endpoint at /uploads/
+// (glucose_tracker/utils/uploads.py). The file goes in chunks, each with a
+// SHA-256 checksum when the page runs in a secure context; after a network
+// error or a rejected chunk the client asks the server for its offset and
+// resumes from there. uploadPhoto() resolves to the id of the finished upload.
+
+const UPLOAD_CHUNK_SIZE = 1024 * 1024;
+const UPLOAD_RETRY_DELAYS = [500, 1000, 3000, 5000, 10000];
+
+class UploadRejected extends Error {}
+
+function uploadSleep(ms) {
+    return new Promise(resolve => setTimeout(resolve, ms));
+}
+
+async function chunkChecksum(chunk) {
+    if (!window.crypto || !crypto.subtle) {
+        return null;
+    }
+    const digest = new Uint8Array(await crypto.subtle.digest('SHA-256', await chunk.arrayBuffer()));
+    return 'sha256 ' + btoa(String.fromCharCode(...digest));
+}
+
+async function uploadPhoto(file, { endpoint, csrfToken, chunkSize = UPLOAD_CHUNK_SIZE, onProgress = () => {} }) {
+    const send = (url, method, headers = {}, body = null) => fetch(url, {
+        method,
+        body,
+        credentials: 'same-origin',
+        headers: { 'Tus-Resumable': '1.0.0', 'X-CSRFToken': csrfToken, ...headers },
+    });
+
+    const filename = btoa(unescape(encodeURIComponent(file.name || 'photo.jpg')));
+    let response = await send(endpoint, 'POST', { 'Upload-Length': file.size, 'Upload-Metadata': `filename ${filename}` });
+    if (response.status !== 201) {
+        throw new UploadRejected(await response.text());
+    }
+    const url = response.headers.get('Location');
+
+    let offset = 0;
+    let attempt = 0;
+    while (offset < file.size) {
+        try {
+            const chunk = file.slice(offset, offset + chunkSize);
+            const headers = { 'Content-Type': 'application/offset+octet-stream', 'Upload-Offset': offset };
+            const checksum = await chunkChecksum(chunk);
+            if (checksum) {
+                headers['Upload-Checksum'] = checksum;
+            }
+            response = await send(url, 'PATCH', headers, chunk);
+            if (response.status === 204) {
+                offset = Number(response.headers.get('Upload-Offset'));
+                attempt = 0;
+                onProgress(offset / file.size);
+                continue;
+            }
+            // Offset conflict, concurrent write, bad checksum or server error: retry
+            if (![409, 423, 460].includes(response.status) && response.status < 500) {
+                throw new UploadRejected(await response.text());
+            }
+        } catch (err) {
+            if (err instanceof UploadRejected) {
+                throw err;
+            }
+        }
+        if (attempt === UPLOAD_RETRY_DELAYS.length) {
+            throw new Error('Photo upload failed after retries.');
+        }
+        await uploadSleep(UPLOAD_RETRY_DELAYS[attempt++]);
+        try {
+            response = await send(url, 'HEAD');
+            if (response.ok) {
+                offset = Number(response.headers.get('Upload-Offset'));
+            }
+        } catch (err) {
+            // Still offline; the next attempt asks again
+        }
+    }
+    return url.split('/').filter(Boolean).pop();
+}